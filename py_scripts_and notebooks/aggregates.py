@@ -0,0 +1,224 @@
+import datetime
+import time
+
+import job_database as db
+
+# Summary tables of the Power BI report (analysis/data_analysis.pbix), so it doesn't aggregate the raw tables on every refresh:
+#   weekly_technology_counts: jobs per technology by week, source, position and location (voivodship after cleaning)
+#   weekly_requirements: jobs and jobs that require Polish or a degree by week, source, position and location
+# Weeks start on Monday. The tables are refreshed incrementally, only the weeks of changed dates are recomputed
+# (a new scrape adds a new date, so usually only the current week). A date is changed if its jobs or technologies
+# were loaded by job_database.bulk_upsert (it marks them in loaded_dates), including updates of existing jobs.
+# aggregated_dates keeps the number of jobs of every aggregated date, so dates whose jobs were inserted or deleted
+# in another way are refreshed too. Run refresh after jobs and technologies are loaded.
+summary_tables = {
+    'weekly_technology_counts': '''
+        week DATE,
+        technology TEXT,
+        source VARCHAR(20),
+        position VARCHAR(30),
+        location VARCHAR(150),
+        job_count INTEGER''',
+    'weekly_requirements': '''
+        week DATE,
+        source VARCHAR(20),
+        position VARCHAR(30),
+        location VARCHAR(150),
+        job_count INTEGER,
+        polish_required_count INTEGER,
+        degree_required_count INTEGER,
+        polish_required_rate REAL,
+        degree_required_rate REAL'''
+}
+dates_table = 'aggregated_dates'
+
+
+def create_tables_if_not_exist(conn, cur, jobs_table='jobs_info'):
+    """Creates the summary tables, the table of aggregated dates and the index of jobs by scraped date."""
+    for table_name, columns in summary_tables.items():
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns});")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_week ON {table_name} (week);")
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {db.loaded_dates_table} (scraped_date DATE PRIMARY KEY);")
+    cur.execute(f'''
+    CREATE TABLE IF NOT EXISTS {dates_table} (
+        scraped_date DATE PRIMARY KEY,
+        job_count INTEGER NOT NULL
+    );''')
+    # the number of jobs per date is counted on every refresh, and jobs of a week are selected by their dates
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {jobs_table}_scraped_date ON {jobs_table} (scraped_date);")
+    conn.commit()
+
+def get_week(scraped_date):
+    """Returns the Monday of the week of the scraped date (a date or a "<year>-<month>-<day>" string)."""
+    if not isinstance(scraped_date, datetime.date):
+        scraped_date = datetime.date(*map(int, str(scraped_date)[:10].split('-')))
+    return scraped_date - datetime.timedelta(days=scraped_date.weekday())
+
+def is_true(column:str):
+    """Returns the SQL condition of a boolean column, SQLite keeps booleans loaded from CSV files as 'True' strings."""
+    return f"{column} IN (1, 'True', 'true')" if db.is_sqlite() else column
+
+def get_changed_dates(conn, cur, jobs_table='jobs_info'):
+    """
+    Returns {scraped date: number of jobs} of all dates and the dates that were loaded or whose number of jobs changed
+    since they were aggregated. The marks of loaded dates are taken (deleted) in the caller's transaction.
+    """
+    cur.execute(f"SELECT scraped_date, COUNT(*) FROM {jobs_table} WHERE scraped_date IS NOT NULL GROUP BY scraped_date;")
+    date_counts = dict(cur.fetchall())
+    cur.execute(f"SELECT scraped_date, job_count FROM {dates_table};")
+    aggregated = dict(cur.fetchall())
+    # a load that commits after the marks are deleted marks its dates again for the next refresh
+    cur.execute(f"DELETE FROM {db.loaded_dates_table} RETURNING scraped_date;")
+    changed = {row[0] for row in cur.fetchall()}
+    changed.update(date for date, count in date_counts.items() if aggregated.get(date) != count)
+    # dates whose jobs were deleted
+    changed.update(date for date in aggregated if date not in date_counts)
+    return date_counts, changed
+
+def refresh_week(cur, week:datetime.date, dates:list, jobs_table='jobs_info', technologies_table='technologies_per_job'):
+    """Recomputes the rows of the week in the summary tables from the jobs of its scraped dates."""
+    # sqlite3 has no adapter of dates that isn't deprecated, and dates of SQLite are ISO strings
+    week_param = week.isoformat() if db.is_sqlite() else week
+    for table_name in summary_tables:
+        cur.execute(db.sql(f"DELETE FROM {table_name} WHERE week = %s;"), (week_param,))
+    if not dates:
+        return
+    placeholders = ', '.join(['%s'] * len(dates))
+    # position is CHARACTER(30) in PostgreSQL, so it's padded with spaces
+    cur.execute(db.sql(f'''
+    INSERT INTO weekly_technology_counts (week, technology, source, position, location, job_count)
+    SELECT %s, t.technology, j.source, TRIM(j.position), j.location, COUNT(*)
+    FROM {technologies_table} t JOIN {jobs_table} j ON j.job_id = t.job_id
+    WHERE t.technology IS NOT NULL AND j.scraped_date IN ({placeholders})
+    GROUP BY t.technology, j.source, TRIM(j.position), j.location;'''), [week_param] + dates)
+    polish_required = f"SUM(CASE WHEN {is_true('is_polish_required')} THEN 1 ELSE 0 END)"
+    degree_required = f"SUM(CASE WHEN {is_true('is_degree_required')} THEN 1 ELSE 0 END)"
+    cur.execute(db.sql(f'''
+    INSERT INTO weekly_requirements (week, source, position, location, job_count, polish_required_count,
+                                     degree_required_count, polish_required_rate, degree_required_rate)
+    SELECT %s, source, TRIM(position), location, COUNT(*), {polish_required}, {degree_required},
+           1.0 * {polish_required} / COUNT(*), 1.0 * {degree_required} / COUNT(*)
+    FROM {jobs_table}
+    WHERE scraped_date IN ({placeholders})
+    GROUP BY source, TRIM(position), location;'''), [week_param] + dates)
+
+def refresh(conn, cur, rebuild:bool=False, jobs_table='jobs_info', technologies_table='technologies_per_job'):
+    """
+    Recomputes the weeks of the summary tables whose jobs changed since the last refresh (all weeks if rebuild is True)
+    in one transaction. Returns the refreshed weeks.
+    """
+    create_tables_if_not_exist(conn, cur, jobs_table)
+    try:
+        if rebuild:
+            for table_name in list(summary_tables) + [dates_table]:
+                cur.execute(f"DELETE FROM {table_name};")
+        date_counts, changed = get_changed_dates(conn, cur, jobs_table)
+        weeks = sorted({get_week(date) for date in changed})
+        dates_of_week = {week: [] for week in weeks}
+        for date in date_counts:
+            week = get_week(date)
+            if week in dates_of_week:
+                dates_of_week[week].append(date)
+        for week in weeks:
+            refresh_week(cur, week, dates_of_week[week], jobs_table, technologies_table)
+        for date in changed:
+            cur.execute(db.sql(f"DELETE FROM {dates_table} WHERE scraped_date = %s;"), (date,))
+            if date in date_counts:
+                cur.execute(db.sql(f"INSERT INTO {dates_table} (scraped_date, job_count) VALUES (%s, %s);"), (date, date_counts[date]))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return weeks
+
+
+def benchmark(num_rows:int=300000, num_days:int=90):
+    """
+    Loads synthetic jobs scraped on num_days days into a temporary SQLite database and compares the report's queries
+    over the raw tables with reading the summary tables, and a full rebuild with the incremental refresh of one new day.
+    Checks that the incremental refresh gives the same tables as the rebuild.
+    """
+    import os
+    import tempfile
+
+    import technologies
+    import transformation
+
+    jobs = transformation.make_synthetic_jobs(num_rows)
+    day = datetime.date(2024, 1, 1)
+    jobs['scraped_date'] = [str(day + datetime.timedelta(days=i * num_days // num_rows)) for i in range(num_rows)]
+    jobs['is_polish_required'] = jobs.index % 3 == 0
+    jobs['is_degree_required'] = jobs.index % 4 == 0
+    jobs['location'] = transformation.normalize_locations(jobs['location'])
+    last_day = jobs['scraped_date'] == jobs['scraped_date'].iloc[-1]
+    report_queries = [
+        '''SELECT t.technology, j.source, TRIM(j.position), j.location, COUNT(*) FROM technologies_per_job t
+        JOIN jobs_info j ON j.job_id = t.job_id WHERE t.technology IS NOT NULL GROUP BY t.technology, j.source, TRIM(j.position), j.location;''',
+        '''SELECT source, TRIM(position), location, COUNT(*), SUM(CASE WHEN {} THEN 1 ELSE 0 END),
+        SUM(CASE WHEN {} THEN 1 ELSE 0 END) FROM jobs_info GROUP BY source, TRIM(position), location;'''
+    ]
+    summary_queries = [
+        "SELECT technology, source, position, location, SUM(job_count) FROM weekly_technology_counts GROUP BY technology, source, position, location;",
+        "SELECT source, position, location, SUM(job_count), SUM(polish_required_count), SUM(degree_required_count) FROM weekly_requirements GROUP BY source, position, location;"
+    ]
+    database_url = db.database_url
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.configure(f"sqlite:{os.path.join(temp_dir, 'benchmark.db')}")
+        conn, cur = db.connect_to_db()
+        try:
+            db.create_table_if_not_exists(conn, cur)
+            db.bulk_upsert(conn, cur, jobs[~last_day])
+            technologies.load(conn, cur, technologies.unpivot(jobs[~last_day]))
+
+            start = time.perf_counter()
+            refresh(conn, cur, rebuild=True)
+            rebuild_time = time.perf_counter() - start
+
+            # the last day is loaded by a new scrape, and jobs of the first day are updated (their number doesn't change)
+            db.bulk_upsert(conn, cur, jobs[last_day])
+            technologies.load(conn, cur, technologies.unpivot(jobs[last_day]))
+            first_day = jobs[jobs['scraped_date'] == jobs['scraped_date'].iloc[0]]
+            db.bulk_upsert(conn, cur, first_day.assign(is_polish_required=~first_day['is_polish_required']))
+            start = time.perf_counter()
+            weeks = refresh(conn, cur)
+            refresh_time = time.perf_counter() - start
+            incremental = [sorted(cur.execute(f"SELECT * FROM {table_name};").fetchall(), key=str) for table_name in summary_tables]
+            refresh(conn, cur, rebuild=True)
+            rebuilt = [sorted(cur.execute(f"SELECT * FROM {table_name};").fetchall(), key=str) for table_name in summary_tables]
+
+            start = time.perf_counter()
+            for query in report_queries:
+                cur.execute(query.format(is_true('is_polish_required'), is_true('is_degree_required'))).fetchall()
+            raw_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for query in summary_queries:
+                cur.execute(query).fetchall()
+            summary_time = time.perf_counter() - start
+            summary_rows = sum(len(rows) for rows in rebuilt)
+        finally:
+            cur.close()
+            conn.close()
+            db.configure(database_url)
+    print(f"report queries: raw tables {raw_time:.2f} s, summary tables {summary_time:.3f} s ({summary_rows} rows), "
+          f"speed-up {raw_time / summary_time:.0f}x")
+    print(f"refresh: rebuild of {num_days} days {rebuild_time:.2f} s, one new day and one updated day {refresh_time:.2f} s "
+          f"({len(weeks)} weeks), {'same' if incremental == rebuilt else 'DIFFERENT'} tables")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refreshes the summary tables of the Power BI report after jobs and technologies are loaded")
+    parser.add_argument('--rebuild', action='store_true', help="recompute all weeks instead of the weeks with new jobs")
+    parser.add_argument('--database', default=db.database_url, help="'postgres' (db_credentials.txt) or 'sqlite:<path>'")
+    parser.add_argument('--benchmark', type=int, metavar='ROWS', help="compare with the queries over the raw tables on ROWS synthetic jobs instead")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        db.configure(args.database)
+        conn, cur = db.connect_to_db()
+        weeks = refresh(conn, cur, args.rebuild)
+        print(f"{len(weeks)} weeks are refreshed" + (f": {weeks[0]} - {weeks[-1]}" if weeks else ""))
+        cur.close()
+        conn.close()
@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+
+# Every parsed job and every processed list page is appended to the journal of its source as a JSON line,
+# so the results of a run that crashed or was interrupted can be replayed with --resume.
+# Jobs are saved in batches during the run, the IDs of every saved batch are appended too,
+# so a resumed run doesn't save them again. The journal is deleted after all results are saved.
+journal_dir = os.path.join(os.pardir, 'data', 'journal')
+
+# the journal is written to the disk (fsync) after this number of records or seconds, whichever comes first
+fsync_every = 20
+fsync_interval = 5
+
+# source -> {'file': file object, 'pending': number of records that are not synced yet, 'synced': time of the last sync}
+journals = {}
+journals_lock = threading.Lock()
+
+
+def get_path(source:str):
+    """Returns the path of the journal of the source."""
+    return os.path.join(journal_dir, f"{source}.jsonl")
+
+def open_journal(source:str, resume:bool=False):
+    """
+    Opens the journal of the source for appending.
+    If resume is False, the journal left by a previous run is discarded.
+    """
+    os.makedirs(journal_dir, exist_ok=True)
+    with journals_lock:
+        journals[source] = {
+            'file': open(get_path(source), 'a' if resume else 'w', encoding='utf-8'),
+            'pending': 0,
+            'synced': time.time()
+        }
+
+def sync(journal:dict):
+    """Writes the journal's buffered records to the disk."""
+    journal['file'].flush()
+    os.fsync(journal['file'].fileno())
+    journal['pending'] = 0
+    journal['synced'] = time.time()
+
+def write_record(source:str, record:dict):
+    """Appends the record to the journal of the source, if the journal is open."""
+    with journals_lock:
+        journal = journals.get(source)
+        if not journal:
+            return
+        journal['file'].write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        journal['pending'] += 1
+        if journal['pending'] >= fsync_every or time.time() - journal['synced'] >= fsync_interval:
+            sync(journal)
+
+def write_job(source:str, row:dict):
+    """Appends the parsed job (a row of jobs_info) to the journal."""
+    write_record(source, {'type': 'job', 'row': row})
+
+def write_page(source:str, url:str):
+    """Appends the list page whose jobs are all parsed to the journal."""
+    write_record(source, {'type': 'page', 'url': url})
+
+def write_saved(source:str, job_ids:list):
+    """
+    Appends the IDs of the jobs that are saved to the sink to the journal and syncs it at once.
+    The journal is appended even if it's closed already (the last batch is saved after the scraping is finished).
+    """
+    record = json.dumps({'type': 'saved', 'job_ids': job_ids}, ensure_ascii=False, default=str) + '\n'
+    with journals_lock:
+        journal = journals.get(source)
+        if journal:
+            journal['file'].write(record)
+            sync(journal)
+            return
+    if os.path.isfile(get_path(source)):
+        with open(get_path(source), 'a', encoding='utf-8') as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+
+def close_journal(source:str, clear:bool=False):
+    """Syncs and closes the journal of the source, the journal file is deleted if clear is True."""
+    with journals_lock:
+        journal = journals.pop(source, None)
+        if journal:
+            sync(journal)
+            journal['file'].close()
+    if clear and os.path.isfile(get_path(source)):
+        os.remove(get_path(source))
+
+def replay(source:str):
+    """
+    Reads the journal of the source left by a previous run. Returns the list of parsed jobs that weren't saved yet
+    (rows of jobs_info), the set of IDs of the jobs that were saved and the set of processed list page URLs.
+    """
+    rows, saved_ids, pages = [], set(), set()
+    try:
+        f = open(get_path(source), 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return rows, saved_ids, pages
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError: # the last line can be cut if the run crashed while writing it
+                continue
+            if record['type'] == 'job':
+                rows.append(record['row'])
+            elif record['type'] == 'saved':
+                saved_ids.update(record['job_ids'])
+            elif record['type'] == 'page':
+                pages.add(record['url'])
+    # a job can be saved before its own record is written, so saved jobs are removed after the whole journal is read
+    rows = [row for row in rows if row['job_id'] not in saved_ids]
+    return rows, saved_ids, pages
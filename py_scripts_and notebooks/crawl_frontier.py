@@ -0,0 +1,231 @@
+import datetime
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# Every job ID and list page URL of a crawl has a state in the frontier:
+# pending -> in_flight (leased by a worker until lease_expires) -> done.
+# Workers on different machines claim items before processing them, so they process disjoint sets of items.
+# A lease that is not completed in time (e.g. the worker crashed) expires and the item can be claimed again.
+# Every call changes all its items with one statement in one transaction, and completed jobs are written
+# in batches of complete_batch_size, so a shared frontier doesn't cost a round trip and a commit per job.
+
+# seconds a claimed item belongs to the worker
+default_lease_time = 600
+# number of completed items that are marked as done at once
+complete_batch_size = 50
+
+create_table_statement = '''
+CREATE TABLE IF NOT EXISTS crawl_frontier (
+    crawl_id VARCHAR(50),
+    item_key VARCHAR(500),
+    kind VARCHAR(20),
+    source VARCHAR(20),
+    state VARCHAR(10),
+    lease_owner VARCHAR(100),
+    lease_expires DOUBLE PRECISION,
+    attempts INTEGER,
+    PRIMARY KEY (crawl_id, item_key)
+);'''
+
+
+class FrontierStore:
+    """
+    Stores states of the crawl items in a database table.
+    Subclasses provide the connection and the parameter placeholder of their database driver.
+    """
+    placeholder = '%s'
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.execute(create_table_statement)
+
+    def sql(self, statement:str):
+        """Replaces %s placeholders with the placeholder of the database driver."""
+        return statement.replace('%s', self.placeholder)
+
+    def execute(self, statement:str, params:tuple=(), fetch:bool=False, many:bool=False):
+        """
+        Executes the statement in its own transaction and returns fetched rows if fetch is True.
+        If many is True, params is a list of parameter tuples and the statement is executed for each of them.
+        """
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                if many:
+                    cur.executemany(self.sql(statement), params)
+                else:
+                    cur.execute(self.sql(statement), params)
+                rows = cur.fetchall() if fetch else None
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            finally:
+                cur.close()
+        return rows
+
+    def add(self, crawl_id:str, kind:str, source:str, keys:list):
+        """Adds the items as pending, items that are already in the frontier are not changed."""
+        if not keys:
+            return
+        self.execute('''
+            INSERT INTO crawl_frontier (crawl_id, item_key, kind, source, state, attempts)
+            VALUES (%s, %s, %s, %s, 'pending', 0)
+            ON CONFLICT (crawl_id, item_key) DO NOTHING;''', [(crawl_id, key, kind, source) for key in keys], many=True)
+
+    def claim(self, crawl_id:str, keys:list, worker:str, lease_time:float):
+        """Leases the items that are pending or whose lease has expired, returns the leased keys."""
+        if not keys:
+            return []
+        now = time.time()
+        in_list = ', '.join(['%s'] * len(keys))
+        rows = self.execute(f'''
+            UPDATE crawl_frontier
+            SET state = 'in_flight', lease_owner = %s, lease_expires = %s, attempts = attempts + 1
+            WHERE crawl_id = %s AND item_key IN ({in_list})
+                AND (state = 'pending' OR (state = 'in_flight' AND lease_expires < %s))
+            RETURNING item_key;''', (worker, now + lease_time, crawl_id, *keys, now), fetch=True)
+        return [row[0] for row in rows]
+
+    def complete(self, crawl_id:str, keys:list):
+        """Marks the items as done. Completing an item that is already done changes nothing."""
+        if not keys:
+            return
+        in_list = ', '.join(['%s'] * len(keys))
+        self.execute(f'''
+            UPDATE crawl_frontier SET state = 'done', lease_owner = NULL, lease_expires = NULL
+            WHERE crawl_id = %s AND item_key IN ({in_list}) AND state != 'done';''', (crawl_id, *keys))
+
+    def release(self, crawl_id:str, keys:list, worker:str):
+        """Returns the items leased by the worker to pending, so other workers can claim them."""
+        if not keys:
+            return
+        in_list = ', '.join(['%s'] * len(keys))
+        self.execute(f'''
+            UPDATE crawl_frontier SET state = 'pending', lease_owner = NULL, lease_expires = NULL
+            WHERE crawl_id = %s AND item_key IN ({in_list}) AND state = 'in_flight' AND lease_owner = %s;''',
+            (crawl_id, *keys, worker))
+
+    def count_states(self, crawl_id:str):
+        """Returns the number of items in every state."""
+        rows = self.execute('''
+            SELECT state, COUNT(*) FROM crawl_frontier WHERE crawl_id = %s GROUP BY state;''', (crawl_id,), fetch=True)
+        return dict(rows)
+
+
+class SQLiteFrontierStore(FrontierStore):
+    """Frontier in a local SQLite file, for tests and single-machine runs."""
+    placeholder = '?'
+
+    def __init__(self, path:str):
+        super().__init__(sqlite3.connect(path, check_same_thread=False, timeout=30))
+
+
+class PostgresFrontierStore(FrontierStore):
+    """Frontier in the PostgreSQL database from db_credentials.txt, shared by all machines."""
+
+    def __init__(self):
+        import job_database as db
+        conn, cur = db.connect_to_db()
+        cur.close()
+        super().__init__(conn)
+
+
+# the frontier used by the scrapers, None means that the frontier is disabled and every item is processed
+store = None
+crawl_id = None
+worker_id = None
+lease_time = default_lease_time
+# (kind, source) -> keys of completed items that aren't marked as done yet
+completed = {}
+completed_lock = threading.Lock()
+
+def get_default_worker_id():
+    """Returns an id that is unique for this process on this machine."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def configure(frontier_store:FrontierStore, crawl:str=None, worker:str=None, lease_seconds:float=default_lease_time):
+    """
+    Enables the frontier for the scrapers.
+    All workers that split the same scrape must use the same crawl id (today's date by default).
+    """
+    global store, crawl_id, worker_id, lease_time
+    store = frontier_store
+    crawl_id = crawl or str(datetime.date.today())
+    worker_id = worker or get_default_worker_id()
+    lease_time = lease_seconds
+
+def create_store(url:str):
+    """Creates the store from its url: 'sqlite:<path>' or 'postgres'."""
+    if url.startswith('sqlite:'):
+        return SQLiteFrontierStore(url[len('sqlite:'):])
+    if url == 'postgres':
+        return PostgresFrontierStore()
+    raise ValueError(f"unknown frontier store: {url}")
+
+def get_item_key(kind:str, source:str, key:str):
+    """Returns the key of the item in the frontier."""
+    return f"{source}:{kind}:{key}"
+
+def claim(kind:str, source:str, keys:list):
+    """
+    Adds the items to the frontier and returns the ones that are leased by this worker.
+    If the frontier is disabled, all keys are returned.
+    """
+    if not store:
+        return list(keys)
+    item_keys = {get_item_key(kind, source, key): key for key in keys}
+    store.add(crawl_id, kind, source, list(item_keys))
+    return [item_keys[item_key] for item_key in store.claim(crawl_id, list(item_keys), worker_id, lease_time)]
+
+def complete(kind:str, source:str, keys:list):
+    """Marks the items as done, they are written in batches of complete_batch_size (see flush_completed)."""
+    if not store:
+        return
+    with completed_lock:
+        waiting = completed.setdefault((kind, source), [])
+        waiting.extend(keys)
+        if len(waiting) < complete_batch_size:
+            return
+        completed[kind, source] = []
+    store.complete(crawl_id, [get_item_key(kind, source, key) for key in waiting])
+
+def flush_completed():
+    """Marks all completed items that are still waiting for their batch as done, scrapers call it when they stop."""
+    if not store:
+        return
+    with completed_lock:
+        waiting = list(completed.items())
+        completed.clear()
+    for (kind, source), keys in waiting:
+        store.complete(crawl_id, [get_item_key(kind, source, key) for key in keys])
+
+def release(kind:str, source:str, keys:list):
+    """Gives the items back, so they can be processed by another worker."""
+    if store:
+        store.release(crawl_id, [get_item_key(kind, source, key) for key in keys], worker_id)
+
+def iterate_claimed(kind:str, source:str, keys):
+    """Yields only the keys that are claimed by this worker, keys can be an endless iterator."""
+    for key in keys:
+        if claim(kind, source, [key]):
+            yield key
+
+def get_page_callbacks(source:str, on_page_done=None):
+    """
+    Returns paginator.iterate_pages callbacks that complete processed list pages and release the other ones.
+    on_page_done(url) is also called for every processed page.
+    """
+    def page_done(url:str):
+        complete('list_page', source, [url])
+        if on_page_done:
+            on_page_done(url)
+
+    return {
+        'on_page_done': page_done,
+        'on_page_released': lambda url: release('list_page', source, [url])
+    }
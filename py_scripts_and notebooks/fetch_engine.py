@@ -0,0 +1,183 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import jobs_scraping
+
+# maximum number of requests that can be in flight at the same time for each source
+concurrency_limits = {
+    'linkedin': 5,
+    'indeed': 3,
+    'pracuj': 3
+}
+default_concurrency = 3
+
+# maximum number of requests that can be in flight at the same time for all sources together,
+# it's shared by all scrapers that run in the same process (see run_scrapers.py)
+global_concurrency = 10
+global_slots = threading.BoundedSemaphore(global_concurrency)
+
+# make_request is blocking, so every request is run in a worker thread
+# and the event loop only waits for the responses
+executor = ThreadPoolExecutor(max_workers=32)
+
+# semaphores are bound to the event loop they are used in,
+# so they are stored per (source, loop) pair
+semaphores = {}
+
+
+def set_concurrency(source:str, limit:int):
+    """Sets the maximum number of simultaneous requests for the source."""
+    concurrency_limits[source] = limit
+    for key in [key for key in semaphores if key[0] == source]:
+        del semaphores[key]
+
+def set_global_concurrency(limit:int):
+    """Sets the maximum number of simultaneous requests for all sources together."""
+    global global_concurrency, global_slots
+    global_concurrency = limit
+    global_slots = threading.BoundedSemaphore(limit)
+
+def run_request(request_func, url:str):
+    """Calls request_func(url) in the current (worker) thread without exceeding the global concurrency budget."""
+    with global_slots:
+        return request_func(url)
+
+def get_semaphore(source:str):
+    """Returns the semaphore that limits the number of simultaneous requests for the source."""
+    key = (source, asyncio.get_running_loop())
+    if key not in semaphores:
+        semaphores[key] = asyncio.Semaphore(concurrency_limits.get(source, default_concurrency))
+    return semaphores[key]
+
+async def fetch(url:str, source:str, request_func=None, delay:tuple=None):
+    """
+    Makes a request to url with request_func (jobs_scraping.make_request by default)
+    without exceeding the concurrency limit of the source.
+    Returns (url, response) pair, response is None if the request raised an exception.
+    """
+    request_func = request_func or jobs_scraping.make_request
+    async with get_semaphore(source):
+        if delay: # random pause before the request, like time.sleep(random.uniform(...)) in the scrapers
+            await asyncio.sleep(random.uniform(*delay))
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(executor, run_request, request_func, url)
+        except Exception:
+            print(f"request to {url} failed:\n{traceback.format_exc()}")
+            response = None
+    return url, response
+
+async def fetch_as_completed(urls, source:str, request_func=None, delay:tuple=None):
+    """Requests all urls concurrently and yields (url, response) pairs in the order they complete."""
+    tasks = [asyncio.create_task(fetch(url, source, request_func, delay)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # if the consumer stopped early, outstanding requests are not needed anymore
+        for task in tasks:
+            task.cancel()
+
+def iterate_all(urls, source:str, request_func=None, delay:tuple=None):
+    """
+    Blocking wrapper around fetch_as_completed for the synchronous scrapers.
+    The event loop runs in a background thread and passes the (url, response) pairs through a queue,
+    so they are yielded as soon as they complete and parsed while the other requests are still in flight.
+    """
+    results = queue.Queue()
+    done = object()
+    state = {}
+
+    async def produce():
+        state['loop'] = asyncio.get_running_loop()
+        state['task'] = asyncio.current_task()
+        try:
+            async for pair in fetch_as_completed(urls, source, request_func, delay):
+                results.put(pair)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            state['error'] = e
+        finally:
+            results.put(done)
+
+    thread = threading.Thread(target=asyncio.run, args=(produce(),), daemon=True)
+    thread.start()
+    try:
+        while True:
+            pair = results.get()
+            if pair is done:
+                break
+            yield pair
+    finally:
+        # if the caller stopped early, outstanding requests are cancelled
+        if thread.is_alive() and 'task' in state:
+            state['loop'].call_soon_threadsafe(state['task'].cancel)
+        thread.join()
+    if 'error' in state:
+        raise state['error']
+
+def fetch_all(urls, source:str, request_func=None, delay:tuple=None):
+    """Returns the list of (url, response) pairs of all urls in the order they completed."""
+    return list(iterate_all(urls, source, request_func, delay))
+
+
+def start_replay_server(pages_dir:str, latency:float):
+    """
+    Starts a local HTTP server in a background thread that serves recorded pages from pages_dir
+    and waits latency seconds before every response. Returns the server and its base url.
+    """
+    import functools
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    class ReplayHandler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.path = self.path.split('?')[0]
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(ReplayHandler, directory=pages_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/"
+
+def benchmark(pages_dir:str, num_requests:int=100, latency:float=0.5, concurrency:int=5):
+    """Compares sequential fetching with the fetch engine against the local replay server."""
+    pages = sorted(os.listdir(pages_dir))
+    server, base_url = start_replay_server(pages_dir, latency)
+    urls = [base_url + pages[i % len(pages)] + f"?n={i}" for i in range(num_requests)]
+    try:
+        start = time.perf_counter()
+        for url in urls:
+            requests.get(url)
+        sequential = time.perf_counter() - start
+
+        set_concurrency('benchmark', concurrency)
+        start = time.perf_counter()
+        fetch_all(urls, 'benchmark', request_func=requests.get)
+        concurrent = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    print(f"sequential: {sequential:.2f} s, fetch engine: {concurrent:.2f} s, speed-up: {sequential / concurrent:.1f}x")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measures the fetch engine speed-up against a local replay server")
+    parser.add_argument('pages_dir', help="directory with recorded pages")
+    parser.add_argument('-n', '--num-requests', type=int, default=100)
+    parser.add_argument('-l', '--latency', type=float, default=0.5, help="seconds before every response")
+    parser.add_argument('-c', '--concurrency', type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.pages_dir, args.num_requests, args.latency, args.concurrency)
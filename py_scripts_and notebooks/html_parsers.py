@@ -0,0 +1,378 @@
+import abc
+import os
+import re
+import time
+import tracemalloc
+
+# The extraction functions of the scrapers (job cards, descriptions, identify_polish) parse and search HTML
+# only through the functions of this module, so the parsing library can be changed without changing them.
+# Backends from the slowest to the fastest: bs4 with 'html.parser', bs4 with 'lxml', selectolax (lexbor engine).
+# lxml and selectolax are optional, 'html.parser' is used by default and the faster backends are chosen explicitly
+# (run_scrapers.py --html-parser) after check_parity has shown they extract the same fields.
+# Elements are matched by class tokens (classes=('base-card', 'job-search-card')) rather than by whole class strings,
+# because sites add and reorder utility classes. A page can be parsed partially (only=(tag, classes)):
+# BeautifulSoup then builds only the subtrees of the matching elements.
+
+
+class Parser(abc.ABC):
+    """Parses HTML into a tree and finds its elements. Subclasses wrap a particular parsing library."""
+    name = None
+
+    @abc.abstractmethod
+    def parse(self, html, only:tuple=None):
+        """
+        Returns the root of the tree of html (str or bytes).
+        If only is a (tag, classes) pair, the tree may contain only the tag elements with the classes and their subtrees.
+        """
+
+    @abc.abstractmethod
+    def find_all(self, node, tag:str, attrs:dict=None, classes:tuple=()):
+        """
+        Returns all tag elements under node whose attributes have the given values and that have all the classes.
+        An attribute value must match the whole attribute string (as in BeautifulSoup), True means any value.
+        """
+
+    def find(self, node, tag:str, attrs:dict=None, classes:tuple=()):
+        """Returns the first tag element under node with the attributes and the classes or None."""
+        found = self.find_all(node, tag, attrs, classes)
+        return found[0] if found else None
+
+    @abc.abstractmethod
+    def get_text(self, node):
+        """Returns the text of node and all its descendants."""
+
+    @abc.abstractmethod
+    def get_attr(self, node, name:str):
+        """Returns the value of the attribute of node or None."""
+
+
+class BS4Parser(Parser):
+    """BeautifulSoup with one of its tree builders ('html.parser' or 'lxml')."""
+
+    def __init__(self, features:str):
+        from bs4 import BeautifulSoup, SoupStrainer
+        if features == 'lxml':
+            import lxml # BeautifulSoup silently falls back to another builder if lxml isn't installed
+        self.BeautifulSoup = BeautifulSoup
+        self.SoupStrainer = SoupStrainer
+        self.name = features
+        self.features = features
+
+    def get_search_attrs(self, attrs:dict, classes:tuple):
+        """Returns the attrs that BeautifulSoup can search by, it matches a single class token itself."""
+        attrs = dict(attrs or {})
+        if classes:
+            attrs['class'] = classes[0]
+        return attrs
+
+    def parse(self, html, only:tuple=None):
+        if not only:
+            return self.BeautifulSoup(html, self.features)
+        tag, classes = only
+        # since bs4 4.13 the strainer gets the whole class string, so the class token is matched by a pattern
+        strainer = self.SoupStrainer(tag, {'class': re.compile(r'(^|\s)' + re.escape(classes[0]) + r'(\s|$)')})
+        return self.BeautifulSoup(html, self.features, parse_only=strainer)
+
+    def find_all(self, node, tag:str, attrs:dict=None, classes:tuple=()):
+        found = node.find_all(tag, self.get_search_attrs(attrs, classes))
+        if len(classes) > 1:
+            found = [element for element in found if set(classes) <= set(element.get('class', ()))]
+        return found
+
+    def find(self, node, tag:str, attrs:dict=None, classes:tuple=()):
+        if len(classes) > 1:
+            return super().find(node, tag, attrs, classes)
+        return node.find(tag, self.get_search_attrs(attrs, classes))
+
+    def get_text(self, node):
+        return node.get_text()
+
+    def get_attr(self, node, name:str):
+        value = node.get(name)
+        # BeautifulSoup splits multi-valued attributes (class, rel, ...) into lists
+        return ' '.join(value) if isinstance(value, list) else value
+
+
+class SelectolaxParser(Parser):
+    """
+    selectolax with the lexbor engine, elements are found with CSS selectors.
+    It always builds the whole tree: its full parse is faster than BeautifulSoup's partial one.
+    """
+    name = 'selectolax'
+    skipped_text_tags = {'script', 'style', 'template'}
+    whitespace_tags = {'pre', 'textarea'}
+    ascii_spaces = ' \n\t\f\r'
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self.LexborHTMLParser = LexborHTMLParser
+        self.selectors = {} # (tag, attrs) -> CSS selector
+
+    def get_selector(self, tag:str, attrs:dict=None, classes:tuple=()):
+        """Translates BeautifulSoup-like search arguments into a CSS selector."""
+        key = (tag, tuple(sorted((attrs or {}).items())), tuple(classes))
+        if key not in self.selectors:
+            selector = tag
+            for name, value in key[1]:
+                if value is True:
+                    selector += f'[{name}]'
+                else:
+                    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+                    selector += f'[{name}="{escaped}"]'
+            for class_name in classes:
+                selector += '.' + re.sub(r'([^\w-])', r'\\\1', class_name)
+            self.selectors[key] = selector
+        return self.selectors[key]
+
+    def parse(self, html, only:tuple=None):
+        if isinstance(html, bytes):
+            html = html.decode('utf-8', errors='replace')
+        return self.LexborHTMLParser(html)
+
+    def find_all(self, node, tag:str, attrs:dict=None, classes:tuple=()):
+        return node.css(self.get_selector(tag, attrs, classes))
+
+    def find(self, node, tag:str, attrs:dict=None, classes:tuple=()):
+        return node.css_first(self.get_selector(tag, attrs, classes))
+
+    def get_text(self, node):
+        # the text is joined like BeautifulSoup's get_text: without scripts and styles,
+        # and a whitespace-only string is a single '\n' (if it has one) or ' ', except in <pre> and <textarea>
+        if isinstance(node, self.LexborHTMLParser):
+            node = node.root
+        if not node:
+            return ''
+        texts = []
+        for child in node.traverse(include_text=True):
+            if child.tag != '-text' or child.parent.tag in self.skipped_text_tags:
+                continue
+            text = child.text_content
+            if not text.strip(self.ascii_spaces) and child.parent.tag not in self.whitespace_tags:
+                text = '\n' if '\n' in text else ' '
+            texts.append(text)
+        return ''.join(texts)
+
+    def get_attr(self, node, name:str):
+        return node.attributes.get(name)
+
+
+backend_classes = {
+    'html.parser': lambda: BS4Parser('html.parser'),
+    'lxml': lambda: BS4Parser('lxml'),
+    'selectolax': SelectolaxParser
+}
+# the backend the scrapers use unless another one is set
+default_backend = 'html.parser'
+
+parser = None # the backend used by the scrapers
+
+
+def create_parser(backend:str):
+    """Creates the parser of the backend, raises ImportError if its library isn't installed."""
+    if backend not in backend_classes:
+        raise ValueError(f"unknown html parser backend: {backend}")
+    return backend_classes[backend]()
+
+def get_available_backends():
+    """Returns the names of the backends whose libraries are installed."""
+    available = []
+    for backend in backend_classes:
+        try:
+            create_parser(backend)
+        except ImportError:
+            continue
+        available.append(backend)
+    return available
+
+def set_backend(backend:str):
+    """Makes the scrapers use the backend."""
+    global parser
+    parser = create_parser(backend)
+
+def get_parser():
+    """Returns the parser used by the scrapers, the default backend is created on the first call."""
+    global parser
+    if parser is None:
+        parser = create_parser(default_backend)
+    return parser
+
+def parse(html, only:tuple=None):
+    """Parses html (str or bytes) with the current backend, only=(tag, classes) limits the tree to these elements."""
+    return get_parser().parse(html, only)
+
+def find_all(node, tag:str, attrs:dict=None, classes:tuple=()):
+    """Returns all tag elements under node with the attributes and the classes."""
+    return get_parser().find_all(node, tag, attrs, classes)
+
+def find(node, tag:str, attrs:dict=None, classes:tuple=()):
+    """Returns the first tag element under node with the attributes and the classes or None."""
+    return get_parser().find(node, tag, attrs, classes)
+
+def get_text(node):
+    """Returns the text of node and all its descendants."""
+    return get_parser().get_text(node)
+
+def get_attr(node, name:str):
+    """Returns the value of the attribute of node or None."""
+    return get_parser().get_attr(node, name)
+
+
+# Recorded pages for the parity check and the benchmark are kept in subdirectories of pages_dir:
+# linkedin_list/*.html, linkedin_description/*.html, indeed_list/*.html, indeed_description/*.json
+# (the JSON answers of the Indeed description API), pracuj_list/*.html and pracuj_description/*.html.
+# A small set of them is committed in tests/recorded_pages, tests/test_html_parsers.py checks the parity on it.
+
+def load_recorded_pages(pages_dir:str, kind:str):
+    """Returns (file name, content) pairs of the recorded pages of the kind."""
+    kind_dir = os.path.join(pages_dir, kind)
+    if not os.path.isdir(kind_dir):
+        return []
+    pages = []
+    for name in sorted(os.listdir(kind_dir)):
+        with open(os.path.join(kind_dir, name), 'rb') as f:
+            pages.append((name, f.read()))
+    return pages
+
+def get_extractors():
+    """Returns the extraction function of every kind of page, it returns all fields the scrapers take from the page."""
+    import json_payloads
+    import jobs_scraping
+    import linkedin_scraping
+    import indeed_scraping
+    import pracuj_http
+
+    def linkedin_list(content:bytes):
+        list_soup = linkedin_scraping.parse_list_page(content)
+        return [linkedin_scraping.get_card_info(card) for card in linkedin_scraping.get_job_cards(list_soup)]
+
+    def linkedin_description(content:bytes):
+        return linkedin_scraping.parse_description(content)
+
+    def indeed_list(content:bytes):
+        return indeed_scraping.get_job_ids(indeed_scraping.parse_list_page(content))
+
+    def indeed_description(content:bytes):
+        fields = json_payloads.extract(json_payloads.decode(content), 'indeed description', indeed_scraping.description_schema)
+        return jobs_scraping.parse_description(fields['description_html'], text=fields['description_text'])
+
+    # Pracuj pages are read from their embedded JSON and their descriptions are plain text,
+    # so they don't depend on the backend, they are checked with the other pages anyway
+    def pracuj_list(content:bytes):
+        return pracuj_http.parse_list_page(content.decode('utf-8'))
+
+    def pracuj_description(content:bytes):
+        offer = pracuj_http.parse_offer(content.decode('utf-8'))
+        if offer:
+            offer['is_polish_required'] = jobs_scraping.identify_languages(
+                [offer['description']], jobs_scraping.identify_polish_description(offer['description']))[0]
+        return offer
+
+    return {
+        'linkedin_list': linkedin_list,
+        'linkedin_description': linkedin_description,
+        'indeed_list': indeed_list,
+        'indeed_description': indeed_description,
+        'pracuj_list': pracuj_list,
+        'pracuj_description': pracuj_description
+    }
+
+def extract_all(backend:str, pages:dict, extractors:dict):
+    """Extracts the fields of all recorded pages with the backend, returns (kind, file name) -> fields."""
+    set_backend(backend)
+    results = {}
+    for kind, kind_pages in pages.items():
+        for name, content in kind_pages:
+            try:
+                results[kind, name] = extractors[kind](content)
+            except Exception as e:
+                results[kind, name] = f"error: {e!r}"
+    return results
+
+def check_parity(pages_dir:str, reference:str='html.parser'):
+    """
+    Checks that every installed backend extracts exactly the same fields from the recorded pages
+    as the reference backend. Prints the differences and returns True if there are none.
+    """
+    extractors = get_extractors()
+    pages = {kind: load_recorded_pages(pages_dir, kind) for kind in extractors}
+    expected = extract_all(reference, pages, extractors)
+    identical = True
+    for backend in get_available_backends():
+        if backend == reference:
+            continue
+        different = [key for key, fields in extract_all(backend, pages, extractors).items() if fields != expected[key]]
+        for kind, name in different:
+            print(f"{backend}: fields of {kind}/{name} are different from {reference}")
+        print(f"{backend}: {len(expected) - len(different)}/{len(expected)} pages are identical to {reference}")
+        identical = identical and not different
+    return identical
+
+def benchmark(pages_dir:str, repeat:int=5):
+    """Prints the number of recorded pages every installed backend parses and extracts per second."""
+    extractors = get_extractors()
+    pages = {kind: load_recorded_pages(pages_dir, kind) for kind in extractors}
+    for backend in get_available_backends():
+        set_backend(backend)
+        for kind, kind_pages in pages.items():
+            if not kind_pages:
+                continue
+            start = time.perf_counter()
+            for i in range(repeat):
+                for name, content in kind_pages:
+                    extractors[kind](content)
+            elapsed = time.perf_counter() - start
+            print(f"{backend:12} {kind:22} {len(kind_pages) * repeat / elapsed:8.1f} pages/s")
+
+def benchmark_partial_parsing(pages_dir:str, repeat:int=5):
+    """
+    Compares parsing of whole list pages with parsing of their job cards only (time and peak memory per page)
+    for every installed backend, and checks that both ways give the same job IDs.
+    """
+    import linkedin_scraping
+    import indeed_scraping
+
+    list_pages = {
+        'linkedin_list': (linkedin_scraping.job_card_filter, linkedin_scraping.get_page_job_ids),
+        'indeed_list': (indeed_scraping.job_title_filter, indeed_scraping.get_job_ids)
+    }
+    for backend in get_available_backends():
+        set_backend(backend)
+        for kind, (only, get_ids) in list_pages.items():
+            kind_pages = load_recorded_pages(pages_dir, kind)
+            if not kind_pages:
+                continue
+            for way, way_only in (('full', None), ('partial', only)):
+                start = time.perf_counter()
+                for i in range(repeat):
+                    for name, content in kind_pages:
+                        get_ids(parse(content, way_only))
+                elapsed = (time.perf_counter() - start) / (len(kind_pages) * repeat)
+
+                peak = 0
+                for name, content in kind_pages:
+                    tracemalloc.start()
+                    tree = parse(content, way_only)
+                    peak = max(peak, tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+                    del tree
+                print(f"{backend:12} {kind:14} {way:8} {elapsed * 1000:8.2f} ms/page {peak / 1024:10.0f} KiB peak")
+            different = [name for name, content in kind_pages if get_ids(parse(content)) != get_ids(parse(content, only))]
+            for name in different:
+                print(f"{backend}: job IDs of {kind}/{name} are different when only job cards are parsed")
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    arg_parser = argparse.ArgumentParser(description="Checks that all html parser backends extract the same fields and compares their speed")
+    arg_parser.add_argument('pages_dir', help="directory with recorded pages")
+    arg_parser.add_argument('-r', '--repeat', type=int, default=5, help="number of times every page is parsed in the benchmark")
+    arg_parser.add_argument('--reference', default='html.parser', help="backend whose results are considered correct")
+    args = arg_parser.parse_args()
+    # the scrapers use the imported module, not __main__, so the backend must be set in it
+    import html_parsers
+    is_identical = html_parsers.check_parity(args.pages_dir, args.reference)
+    html_parsers.benchmark(args.pages_dir, args.repeat)
+    html_parsers.benchmark_partial_parsing(args.pages_dir, args.repeat)
+    sys.exit(0 if is_identical else 1)
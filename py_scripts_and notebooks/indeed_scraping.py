@@ -1,42 +1,24 @@
 import os
-import time
-import random
-from bs4 import BeautifulSoup
+import argparse
 import datetime
 
-import requests
 import jobs_scraping
+import html_parsers
+import json_payloads
+import fetch_engine
+import paginator
+import progress
+import crawl_frontier
+import checkpoint_journal
+import proxy_manager
+import response_cache
 import job_database as db
+import job_id_index
 import pandas_csv
 
 
-# Configure socket options for HTTP connections to keep them alive longer
-import socket
-from urllib3.connection import HTTPConnection
-
-HTTPConnection.default_socket_options = (
-    HTTPConnection.default_socket_options + [
-        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
-        (socket.SOL_TCP, socket.TCP_KEEPIDLE, 45),
-        (socket.SOL_TCP, socket.TCP_KEEPINTVL, 10),
-        (socket.SOL_TCP, socket.TCP_KEEPCNT, 6)
-    ]
-)
-
-# Dictionary to store job information
-# from jobs_info dictionary DataFrame will be created
-jobs_info = {
-        'job_id': [],
-        'job_title': [],
-        'company_name': [],
-        'location': [],
-        'published_date': [],
-        'scraped_date': [],
-        'is_polish_required':  [],
-        'position': [],
-        'source' : [],
-        'description': []
-    }
+# Scraped jobs, they are saved to the sink in batches (see jobs_scraping.JobBuffer)
+jobs_info = jobs_scraping.JobBuffer('indeed')
 
 
 
@@ -48,28 +30,10 @@ def make_request(url:str):
     """Makes an HTTP GET request to the specified URL using random proxies and user agents.
     Retries up to 10 times if the request fails."""
     # headers are important here to avoid getting blocked
-    for i in range(10):
-        response = requests.get(url=url, 
-                                proxies={'http':jobs_scraping.get_random_proxy()},
-                                headers={
-                                    'User-Agent': jobs_scraping.get_random_user_agent(),
-                                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-                                    'Accept-Language': 'pl-PL,pl;q=0.9',
-                                    'Referer': 'https://www.google.com/',
-                                    'Connection': 'keep-alive',
-                                    'Upgrade-Insecure-Requests': '1',
-                                    'DNT': '1',
-                                    #'Host': 'www.indeed.com',
-                                    'Cache-Control': 'max-age=0',
-                                    'Pragma': 'no-cache'})
-        if response.status_code == 200:
-            break
-    else:
-        print(f"status code {response.status_code}: {response.url}")
-    return response
+    return jobs_scraping.make_request(url, profile='indeed')
 
 def parse_interval(interval:str):
-    """Parses the interval string to calculate the job's published date."""
+    """Parses the interval string to calculate the job's published date, raises ValueError if it has no number of days."""
     if interval in ('Dzisiaj', 'Dodano przed chwilą'):
         return datetime.timedelta(days=0)
     elif interval == 'wczoraj':
@@ -132,85 +96,125 @@ def choose_time_period():
         return None
     
 
-start = 0
+# if a list page contains one of these strings, there are no more results
+no_results_markers = ('jobsearch-NoResult',)
 
-def get_next_list(time_period:str, job_title:str, location:str):
-    """Generates the URL for the next page of job listings and makes a request to retrieve it."""
-    global time_periods
-    global start
-    
+def get_list_url(time_period:str, job_title:str, location:str, start:int):
+    """Generates the URL of the job listings page that starts from the start-th job."""
     if not time_period: # If time_period is None or an empty string, jobs in the list will be from any time.
-        list_url = f"https://pl.indeed.com/jobs?q={job_title}&l={location}&start={str(start)}"
-    else: # jobs in the list will be filtered by the passed time_period.
-        list_url = f"https://pl.indeed.com/jobs?q={job_title}&l={location}&start={str(start)}&fromage={time_periods[time_period]}"
-    response = make_request(list_url)
-    start += 10
-    return None if response.status_code != 200 else response.text
-
-def get_job_description_request(job_id):
-    """Generates the URL for the job description and makes a request to retrieve it."""
-    descr_url = f"https://pl.indeed.com/viewjob?jk={job_id}&from=vjs&viewtype=embedded&spa=1&hidecmpheader=0"
-    return make_request(descr_url)
+        return f"https://pl.indeed.com/jobs?q={job_title}&l={location}&start={str(start)}"
+    # jobs in the list will be filtered by the passed time_period.
+    return f"https://pl.indeed.com/jobs?q={job_title}&l={location}&start={str(start)}&fromage={time_periods[time_period]}"
+
+def get_job_description_url(job_id):
+    """Generates the URL for the job description."""
+    return f"https://pl.indeed.com/viewjob?jk={job_id}&from=vjs&viewtype=embedded&spa=1&hidecmpheader=0"
     
 
     
     
-def parse_json_description(descr_response):
-    """Parses the job description JSON data and updates the jobs_info dictionary."""
-    descr_json = descr_response.json()
+# paths of the fields of the job description JSON
+job_path = ('body', 'hostQueryExecutionResult', 'data', 'jobData', 'results', 0, 'job')
+description_schema = {
+    'title': job_path + ('title',),
+    'key': job_path + ('key',),
+    'company_name': job_path + ('sourceEmployerName',),
+    'city': job_path + ('location', 'city'),
+    'description_html': job_path + ('description', 'html'),
+    'description_text': job_path + ('description', 'text'),
+    'age': ('body', 'hiringInsightsModel', 'age')
+}
+
+def parse_json_description(descr_json:dict):
+    """
+    Parses the decoded job description JSON and returns the job's row of jobs_info,
+    or None if the job can't be identified (its key is missing).
+    """
+    schema_name = 'indeed description'
+    fields = json_payloads.extract(descr_json, schema_name, description_schema)
+    if not fields['key']:
+        return None
 
-    dict1 = descr_json['body']['hostQueryExecutionResult']['data']['jobData']['results'][0]['job']
-        
-    string_interval  = descr_json['body']['hiringInsightsModel']['age']
-    delta = parse_interval(string_interval)
     cur_date_str = get_current_date()
     cur_date = datetime.date(*[int(s) for s in cur_date_str.split('-')])
-    published_date = cur_date - delta
-
-    description_html = dict1['description']['html']
-    is_polish_required = jobs_scraping.identify_polish(description_html)
-    position = jobs_scraping.identify_position(dict1['title'])
-
-    # jobs info's lists must have the same lengths because the DataFrame object will be created from it
-    # so if some data can't be retrieved, None value is appended to a jobs_info's list
-    jobs_info['job_title'].append(dict1['title'][:100] if dict1['title'] else None)
-    jobs_info['job_id'].append(dict1['key'])
-    jobs_info['company_name'].append(dict1['sourceEmployerName'][:100] if dict1['sourceEmployerName'] else None)
-    jobs_info['location'].append(dict1['location']['city'][:100] if dict1['location']['city'] else None)
-    jobs_info['published_date'].append(published_date)
-    jobs_info['scraped_date'].append(cur_date)
-    jobs_info['position'].append(position[:30] if position else position)
-    jobs_info['is_polish_required'].append(is_polish_required)
-    jobs_info['description'].append(dict1['description']['text'].strip())
-    jobs_info['source'].append('indeed')
-
-
-def parse_jobs(list_soup : BeautifulSoup, scraped_ids:list):
-    """Parses job listings and extracts job IDs."""
-    jobs_ids = list(map(lambda tag: tag['data-jk'], list_soup.find_all('a', {'class': "jcs-JobTitle css-jspxzf eu4oa1w0"})))
-
-    for job_id in jobs_ids:
-        if job_id in scraped_ids: # if job_id is already in database, then skip it
-            continue
-        # get description json
-        time.sleep(random.uniform(2, 7))
-        descr_response = get_job_description_request(job_id)
-        if descr_response.status_code != 200 or descr_response.json() == None:
+    # values in an unexpected format (e.g. an age without a number of days) are counted as schema drift and become None
+    published_date = json_payloads.convert(fields, schema_name, 'age', lambda age: cur_date - parse_interval(json_payloads.text(age)))
+    title, company_name, city, description_html, description_text = [
+        json_payloads.convert(fields, schema_name, field, json_payloads.text)
+        for field in ('title', 'company_name', 'city', 'description_html', 'description_text')]
+
+    if description_html:
+        description = jobs_scraping.parse_description(description_html, text=description_text)
+    else:
+        description = jobs_scraping.DescriptionRecord(text=description_text.strip() if description_text else None)
+    position = jobs_scraping.identify_position(title)
+
+    # if some data can't be retrieved, None value is appended to a jobs_info's list
+    return {
+        'job_title': title[:100] if title else None,
+        'job_id': fields['key'],
+        'company_name': company_name[:100] if company_name else None,
+        'location': city[:100] if city else None,
+        'published_date': published_date,
+        'scraped_date': cur_date,
+        'position': position[:30] if position else position,
+        'is_polish_required': description.is_polish_required,
+        'description': description.text,
+        'source': 'indeed'
+    }
+
+
+# job title links are matched by their class token, the other (css-*) classes are generated and change often
+job_title_filter = ('a', ('jcs-JobTitle',))
+
+def parse_list_page(list_html):
+    """Parses only the job title links of the job listings page."""
+    return html_parsers.parse(list_html, only=job_title_filter)
+
+def get_job_ids(list_soup):
+    """Returns job IDs of all jobs of the job listings page."""
+    return [html_parsers.get_attr(tag, 'data-jk') for tag in html_parsers.find_all(list_soup, job_title_filter[0], classes=job_title_filter[1])]
+
+def parse_jobs(list_soup, scraped_ids:job_id_index.JobIdIndex):
+    """Parses job listings, extracts job IDs and requests their descriptions concurrently."""
+    jobs_ids = get_job_ids(list_soup)
+
+    # if job_id is already in database, then skip it
+    new_ids = scraped_ids.filter_new(jobs_ids)
+    # if several workers split the scrape, only the jobs claimed by this worker are processed
+    claimed_ids = crawl_frontier.claim('job', 'indeed', new_ids)
+    descr_urls = {get_job_description_url(job_id): job_id for job_id in claimed_ids}
+    progress.add_found('indeed', len(descr_urls))
+    # get description jsons, they are processed as soon as they arrive
+    for descr_url, descr_response in fetch_engine.iterate_all(descr_urls, 'indeed', make_request):
+        progress.add_done('indeed')
+        job_id = descr_urls[descr_url]
+        # the payload is decoded only once
+        descr_json = json_payloads.decode(descr_response.content) if descr_response is not None and descr_response.status_code == 200 else None
+        row = parse_json_description(descr_json) if descr_json else None
+        if row is None:
+            crawl_frontier.release('job', 'indeed', [job_id]) # another worker can try it
             continue
-        parse_json_description(descr_response)
+        jobs_scraping.append_job(jobs_info, row)
+        checkpoint_journal.write_job('indeed', row)
         scraped_ids.append(job_id)
+        crawl_frontier.complete('job', 'indeed', [job_id])
         
             
 
-def main():
-    """Main function to run the scraping process and save the data."""
+def on_page_done(list_url:str):
+    """Writes the list page whose jobs are all parsed to the journal."""
+    checkpoint_journal.write_page('indeed', list_url)
 
-    conn, cur = db.connect_to_db()
-    db.create_table_if_not_exists(conn, cur)
-    # get ids of already scraped jobs from a database to avoid duplicating data
-    scraped_ids = db.select_job_ids(conn, cur, "indeed")
-    cur.close()
-    conn.close()
+def scrape(scraped_ids:job_id_index.JobIdIndex, resume:bool=False):
+    """
+    Scrapes new jobs (the ones that are not in scraped_ids) into jobs_info and returns it.
+    Every parsed job is written to the journal, if resume is True, the journal of the previous run is replayed first.
+    """
+    done_pages = set()
+    if resume:
+        done_pages = jobs_info.restore(scraped_ids)
+    checkpoint_journal.open_journal('indeed', resume)
 
     time_period = choose_time_period()
 
@@ -224,20 +228,51 @@ def main():
         location = '+'.join(splitted_location)
 
     print("indeed scraping is started\n")
-    for i in range(100):
-        list_html = get_next_list(time_period, job_title, location)
-        time.sleep(2)
-        if not list_html:
-            continue
-        list_soup = BeautifulSoup(list_html, 'html.parser')
-        parse_jobs(list_soup, scraped_ids)
+    # next pages are requested while the current one is being parsed, until the results are exhausted
+    list_urls = (get_list_url(time_period, job_title, location, start) for start in range(0, 1000, 10))
+    list_urls = (url for url in list_urls if url not in done_pages) # pages processed before the resumed run crashed
+    # if several workers split the scrape, only the pages claimed by this worker are requested
+    list_urls = crawl_frontier.iterate_claimed('list_page', 'indeed', list_urls)
+    list_soups = paginator.iterate_pages(list_urls, parse_list_page, get_job_ids,
+                                         make_request, end_markers=no_results_markers,
+                                         **crawl_frontier.get_page_callbacks('indeed', on_page_done))
+    try:
+        for list_soup in list_soups:
+            parse_jobs(list_soup, scraped_ids)
+    finally:
+        crawl_frontier.flush_completed()
+        checkpoint_journal.close_journal('indeed')
 
     cur_date = get_current_date()
     # writing current date of scraping to a file
     with open(get_prev_dir(os.getcwd()) + r'\scraping_dates\indeed_last_scraping_date.txt', 'w') as f:
         f.write(cur_date) 
     print("indeed scraping is finished\n")
-    pandas_csv.save_data(jobs_info) # transforms jobs_info to a DataFrame object, then save it as csv file
+    return jobs_info
+
+def main():
+    """Main function to run the scraping process and save the data."""
+    parser = argparse.ArgumentParser(description="Scrapes jobs from Indeed")
+    parser.add_argument('--resume', action='store_true', help="continue the run that crashed or was interrupted")
+    args = parser.parse_args()
+
+    conn, cur = db.connect_to_db()
+    db.create_table_if_not_exists(conn, cur)
+    # get ids of already scraped jobs from a database to avoid duplicating data
+    scraped_ids = job_id_index.load(conn, cur, "indeed")
+    cur.close()
+    conn.close()
+
+    # jobs are appended to the csv file in batches while scraping
+    jobs_info.set_sink(pandas_csv)
+    scrape(scraped_ids, args.resume)
+    proxy_manager.print_summary()
+    response_cache.print_stats()
+    json_payloads.print_stats()
+    jobs_info.flush() # saves the jobs that aren't saved yet
+    # the jobs are saved, so the journal isn't needed anymore
+    checkpoint_journal.close_journal('indeed', clear=True)
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
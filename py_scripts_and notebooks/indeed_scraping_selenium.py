@@ -1,9 +1,13 @@
-import time
-import random 
+import argparse
 import datetime
 import pandas_csv as p_c 
 import job_database as db
+import job_id_index
 import jobs_scraping
+import keyword_classifier
+import rate_limiter
+import checkpoint_journal
+import webdriver_pool
 import os
 import traceback
 
@@ -15,20 +19,8 @@ from selenium.common import exceptions
 
 from typing import Tuple, Union
 
-# Dictionary to store job information
-# from jobs_info dictionary DataFrame will be created
-jobs_info = {
-    'job_id': [],
-    'job_title': [],
-    'company_name': [],
-    'location': [],
-    'published_date': [],
-    'scraped_date': [],
-    'is_polish_required':  [],
-    'position': [],
-    'source' : [],
-    'description': []
-}
+# Scraped jobs, they are saved to the sink in batches (see jobs_scraping.JobBuffer)
+jobs_info = jobs_scraping.JobBuffer('indeed_selenium')
 # Locators for various elements on the job listing pages
 reject_cookies_loc = (By.CSS_SELECTOR, 'button[id="onetrust-reject-all-handler"]')
 job_card_loc = (By.CSS_SELECTOR, 'div[data-testid="slider_item"]')
@@ -54,8 +46,10 @@ def reject_cookies(driver:webdriver):
     
 def close_pop_up(driver:webdriver):
     """Clicks close window button if pop-up window is present"""
+    # the pop-up is rendered by a script that can still be running when an eagerly loaded page is returned,
+    # so it's waited for a short time
     try:
-        button = wait_presence(driver, close_pop_up_loc, 2, all=False)
+        button = wait_presence(driver, close_pop_up_loc, 1, all=False)
     except exceptions.TimeoutException:
         return None
     button.click()
@@ -69,9 +63,6 @@ def go_next_page(driver:webdriver):
     button = wait_presence(driver, next_page_loc, all=False)
     button.click()
 
-def rand_sleep(start:int, end:int):
-    time.sleep(random.uniform(start, end))
-
 def get_job_title(card):
     return card.find_element(By.CSS_SELECTOR, "span[title]").text
 
@@ -101,15 +92,6 @@ def get_date(card):
 def get_job_id(card):
     return card.find_element(By.CSS_SELECTOR, "a[id]").get_attribute('id')
 
-def get_description(driver, card):
-    card.click()
-    try:
-        description_elem = wait_presence(driver, description_loc, sec=5, all=False)
-    except exceptions.TimeoutException:
-        return None
-    else:
-        return description_elem
-
 def get_description_link(card):
     return card.find_element(By.CSS_SELECTOR, 'a[id]').get_attribute('href')
 
@@ -117,18 +99,7 @@ def identify_position(job_title:str):
     '''
     if position name is mentioned in job_title, return position, None otherwise
     '''
-    d = dict(
-        junior = ['junior', 'entry'],
-        intern = ['intern', 'staż', 'train'],
-        middle = ['assosiate', 'mid', 'intermediate'],
-        senior = ['senior', 'executive', 'starszy']
-    )
-    for key in d:
-        for position in d[key]:
-            if position in job_title.lower():
-                return key
-    else:
-        return None
+    return jobs_scraping.identify_position(job_title)
     
 def identify_prior_experience(position:str):
 
@@ -142,43 +113,76 @@ def identify_polish(desc_element):
     bullet_points = li_bullet_points if len(li_bullet_points) != 0 else p_bullet_points
     if len(bullet_points) == 0:
         return False
-    for bullet in bullet_points:
-        bullet = bullet.text
-        if 'Polish' in bullet  \
-            or 'język polski' in bullet.lower() or 'polskiego' in bullet.lower():
-            return True
-    else:
-        return False
+    # only the bullet points are checked, this scraper has no rule for descriptions written in Polish
+    bullets_text = '\n'.join(bullet.text for bullet in bullet_points)
+    return keyword_classifier.polish_name.contains(bullets_text) or keyword_classifier.polish_requirement.contains(bullets_text)
     
-def parse_job(driver:webdriver, card, scraped_ids:list):
-    global jobs_info
-    job_id = get_job_id(card)
-    jobs_info["job_id"].append(job_id)
+def get_card_row(card):
+    """Returns the fields of the job that are shown in its card."""
     job_title = get_job_title(card)
-    position = identify_position(job_title)
-    jobs_info["job_title"].append(job_title)
-    jobs_info['position'].append(position)
-    jobs_info['company_name'].append(get_company_name(card))
-    jobs_info['location'].append(get_location(card))
-    jobs_info['published_date'].append(get_date(card))
-    jobs_info['scraped_date'].append(get_current_date())
-    desc_element = get_description(driver, card)
-    is_polish_required = identify_polish(desc_element) if desc_element else None
-    jobs_info['description'].append(desc_element.text if desc_element else None)
-    jobs_info['is_polish_required'].append(is_polish_required)
-    jobs_info['source'].append('indeed')
-
-    scraped_ids.append(job_id)
-
-def make_lists_same_length():
+    return {
+        'job_id': get_job_id(card),
+        'job_title': job_title,
+        'position': identify_position(job_title),
+        'company_name': get_company_name(card),
+        'location': get_location(card),
+        'published_date': get_date(card),
+        'scraped_date': get_current_date()
+    }
+
+def read_description(driver:webdriver, description_url:str):
+    """
+    Opens the job's page in the browser and returns is_polish_required and description fields,
+    they are None if the description doesn't appear in time.
+    """
+    rate_limiter.acquire(description_url) # wait until the site allows the next request
+    try:
+        driver.get(description_url)
+        desc_element = wait_presence(driver, description_loc, sec=5, all=False)
+    except exceptions.TimeoutException:
+        # a page that didn't load in time is a sign of throttling
+        rate_limiter.report(description_url, timeout=True)
+        return {'is_polish_required': None, 'description': None}
+    except Exception:
+        rate_limiter.report(description_url)
+        raise
+    rate_limiter.report(description_url, 200)
+    return {'is_polish_required': identify_polish(desc_element), 'description': desc_element.text}
+
+def get_new_cards(driver:webdriver, scraped_ids:job_id_index.JobIdIndex):
+    """Returns {description_url: card_row} of the new jobs from all list pages."""
+    new_cards = {}
+    while True:
+        while close_pop_up(driver):
+            pass
+        job_cards = get_job_cards(driver)
+        # all cards of the page are checked at once
+        new_ids = set(scraped_ids.filter_new([get_job_id(card) for card in job_cards]))
+        for card in job_cards:
+            if get_job_id(card) not in new_ids:
+                continue
+            new_cards[get_description_link(card)] = get_card_row(card)
+        list_url = driver.current_url
+        rate_limiter.acquire(list_url)
+        try:
+            go_next_page(driver)
+        except exceptions.TimeoutException:
+            # the last page has no next page button, it isn't reported as throttling
+            break
+        rate_limiter.report(list_url, 200)
+    return new_cards
+
+def parse_jobs(new_cards:dict, scraped_ids:job_id_index.JobIdIndex, num_workers:int=None):
+    """Reads descriptions of the new jobs in a pool of headless browsers and appends the jobs to jobs_info."""
     global jobs_info
-    lens = []
-    for key in jobs_info:
-        lens.append(len(jobs_info[key]))
-    min_len = min(lens)
-    for key in jobs_info:
-        jobs_info[key] = jobs_info[key][:min_len]
-    
+    for description_url, description in webdriver_pool.map_items(list(new_cards), read_description, num_workers, browser='edge'):
+        row = new_cards[description_url]
+        row.update(description or {'is_polish_required': None, 'description': None})
+        row['source'] = 'indeed'
+        jobs_scraping.append_job(jobs_info, row)
+        checkpoint_journal.write_job('indeed_selenium', row)
+        scraped_ids.append(row['job_id'])
+
 def get_prev_dir(dir:str):
     '''Returns previous directory path relatively to dir path'''
     prev_dir = dir[:dir.rfind("\\")+1]
@@ -230,12 +234,27 @@ def choose_base_url(job_title:str, location:str, time_period:str):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Scrapes jobs from Indeed with Selenium")
+    parser.add_argument('--resume', action='store_true', help="continue the run that crashed or was interrupted")
+    parser.add_argument('--workers', type=int, default=webdriver_pool.default_workers,
+                        help="number of headless browsers that open job pages at the same time")
+    parser.add_argument('--full-page-load', action='store_true',
+                        help="load pages with all images, fonts and third-party scripts (the fast profile is used by default)")
+    args = parser.parse_args()
+    webdriver_pool.set_fast_profile(not args.full_page_load)
+    # jobs are appended to the csv file in batches while scraping
+    jobs_info.set_sink(p_c)
+
     with open('indeed_last_scraping_date.txt', 'w') as f:
         f.write(str(get_current_date()))
 
     conn, cur = db.connect_to_db()
     db.create_table_if_not_exists(conn, cur)
-    scraped_ids = db.select_job_ids(conn, cur, "indeed")
+    scraped_ids = job_id_index.load(conn, cur, "indeed")
+
+    if args.resume:
+        jobs_info.restore(scraped_ids)
+    checkpoint_journal.open_journal('indeed_selenium', args.resume)
     
     last_date_str = load_last_scraping_date()
     time_period = choose_time_period(last_date_str)
@@ -251,37 +270,30 @@ def main():
 
     base_url = choose_base_url(job_title, location, time_period)
 
-    driver = webdriver.Edge()
-    driver.maximize_window()
+    # the list pages are read by one browser, job pages are opened in a pool of browsers
+    driver = webdriver_pool.start_driver('edge')
     driver.get(base_url)
 
     reject_cookies(driver)
     print("indeed scraping is started\n")
     try:
-        while True:
-            while close_pop_up(driver):
-                pass
-            job_cards = get_job_cards(driver)
-            for card in job_cards:
-                id = get_job_id(card)
-                if id in scraped_ids:
-                    continue
-                rand_sleep(2, 7)
-                card.click()
-                parse_job(driver, card, scraped_ids)
-            try:
-                go_next_page(driver)
-            except exceptions.TimeoutException:
-                break
+        try:
+            new_cards = get_new_cards(driver, scraped_ids)
+        finally:
+            driver.quit()
+        parse_jobs(new_cards, scraped_ids, args.workers)
     except:
-        make_lists_same_length()
         print("Indeed scraping was ended because of error\n")
         print(traceback.format_exc())
     finally:
+        checkpoint_journal.close_journal('indeed_selenium')
         with open(get_prev_dir(os.getcwd()) + r'\scraping_dates\indeed_last_scraping_date.txt', 'w') as f:
             f.write(str(datetime.date.today())) 
         print('indeed scraping is finished\n')
-        p_c.save_data(jobs_info)
+        jobs_info.flush()
+        # the jobs are saved, so the journal isn't needed anymore
+        checkpoint_journal.close_journal('indeed_selenium', clear=True)
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
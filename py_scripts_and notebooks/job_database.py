@@ -1,4 +1,29 @@
-import psycopg2
+import io
+import itertools
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+# psycopg2 is needed only for PostgreSQL, the SQLite database works without it
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+# The pipeline works with PostgreSQL (credentials in db_credentials.txt) or with a local SQLite file,
+# so it can be tested and benchmarked without a server: configure('sqlite:<path>') or --database sqlite:<path>.
+# Connections are taken from a pool shared by all threads, connect_to_db() doesn't open a new connection every time,
+# and conn.close() returns the connection to the pool. Statements are parameterized (%s placeholders for both databases).
+credentials_path = "db_credentials.txt"
+
+# 'postgres' or 'sqlite:<path>'
+database_url = 'postgres'
+# maximum number of connections in the pool, connect_to_db() waits for a free one when all are taken
+pool_size = 10
 
 
 def get_conn_params():
@@ -6,27 +31,142 @@ def get_conn_params():
     Reads "db_credentials.txt" file
     and returns data base credentials as dict object
     '''
-    with open("db_credentials.txt") as f:
+    with open(credentials_path) as f:
         conn_params = {}
         for line in f.readlines():
             key, value = line.strip().split("=")
-            conn_params[key.strip()] = value.strip() 
+            conn_params[key.strip()] = value.strip()
     return conn_params
 
 
-conn_params = get_conn_params()
+# the credentials are read once
+conn_params = get_conn_params() if os.path.isfile(credentials_path) else {}
+
+
+class PooledConnection:
+    '''
+    Connection of the pool. It's used as the connection of the database driver,
+    but close() returns it to the pool. Names of the statements prepared in the connection are remembered
+    '''
+
+    def __init__(self, conn, pool):
+        self.conn = conn
+        self.pool = pool
+        self.closed = False
+        self.prepared = set()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.pool.put(self)
+
+
+class ConnectionPool:
+    '''
+    Opens up to max_size connections with connect() when they are needed and reuses the returned ones
+    '''
+
+    def __init__(self, connect, max_size:int):
+        self.connect = connect
+        self.free = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(max_size)
+
+    def get(self):
+        self.slots.acquire()
+        try:
+            conn = self.free.get_nowait()
+        except queue.Empty:
+            try:
+                conn = PooledConnection(self.connect(), self)
+            except Exception:
+                self.slots.release()
+                raise
+        conn.closed = False
+        return conn
+
+    def put(self, conn:PooledConnection):
+        try:
+            # an unfinished transaction isn't passed to the next user of the connection
+            conn.conn.rollback()
+        except Exception:
+            # a broken connection is dropped, a new one is opened instead of it
+            pass
+        else:
+            if not getattr(conn.conn, 'closed', 0):
+                self.free.put(conn)
+        self.slots.release()
+
+
+pool = None
+pool_lock = threading.Lock()
+
+
+def is_sqlite():
+    return database_url.startswith('sqlite:')
+
+
+def open_connection():
+    '''
+    Opens a new connection to the configured database
+    '''
+    if is_sqlite():
+        return sqlite3.connect(database_url[len('sqlite:'):], check_same_thread=False, timeout=30)
+    return psycopg2.connect(**conn_params)
+
+
+def configure(url:str, size:int=None):
+    '''
+    Chooses the database ('postgres' or 'sqlite:<path>') and the pool size, connections of the previous pool are not reused
+    '''
+    global database_url, pool_size, pool
+    if url != 'postgres' and not url.startswith('sqlite:'):
+        raise ValueError(f"unknown database: {url}")
+    with pool_lock:
+        database_url = url
+        pool_size = size or pool_size
+        pool = None
+
 
 def connect_to_db():
     '''
-    Connects to a data base with credentials that are specified in the "db_credentials.txt" file
-    and returns connector and cursor objects
-    ''' 
-    conn_params = get_conn_params()
-    conn = psycopg2.connect(**conn_params)
+    Takes a connection to the data base from the pool (it's opened the first time)
+    and returns connector and cursor objects, conn.close() returns the connection to the pool
+    '''
+    global pool
+    with pool_lock:
+        if pool is None:
+            pool = ConnectionPool(open_connection, pool_size)
+    conn = pool.get()
     cur = conn.cursor()
     return conn, cur
 
 
+def sql(statement:str):
+    '''
+    Replaces %s placeholders with the placeholder of the database driver
+    '''
+    return statement.replace('%s', '?') if is_sqlite() else statement
+
+
+def execute(conn, cur, statement:str, params:tuple=(), prepared_name:str=None):
+    '''
+    Executes the parameterized statement. If prepared_name is given, in PostgreSQL the statement
+    is prepared once per connection and executed by its name after that (SQLite caches prepared statements itself)
+    '''
+    if prepared_name is None or is_sqlite() or not isinstance(conn, PooledConnection):
+        cur.execute(sql(statement), params)
+        return
+    if prepared_name not in conn.prepared:
+        numbers = itertools.count(1)
+        cur.execute(f"PREPARE {prepared_name} AS " + ''.join(
+            part if i == 0 else f"${next(numbers)}{part}" for i, part in enumerate(statement.split('%s'))))
+        conn.prepared.add(prepared_name)
+    cur.execute(f"EXECUTE {prepared_name} ({', '.join(['%s'] * len(params))});", params)
+
+
 def create_table_if_not_exists(conn, cur, table_name = 'jobs_info'):
     sql_statement = f'''
     CREATE TABLE IF NOT EXISTS  {table_name} (
@@ -46,6 +186,39 @@ def create_table_if_not_exists(conn, cur, table_name = 'jobs_info'):
     cur.execute(sql_statement)
     conn.commit()
 
+def create_technologies_table_if_not_exists(conn, cur, table_name='technologies_per_job'):
+    '''
+    Creates the table of unpivoted technologies. A job without technologies has one row with NULL technology,
+    so uniqueness of (job_id, technology) is enforced by an index that treats NULL as an empty string.
+    Duplicates of a table created without the index are deleted before the index is created
+    '''
+    cur.execute(f'''
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        job_id VARCHAR(20),
+        technology TEXT
+    );''')
+    index_name = f"{table_name}_job_technology"
+    if is_sqlite():
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?;", (index_name,))
+    else:
+        cur.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s;", (index_name.lower(),))
+    if not cur.fetchone():
+        # the notebook dropped duplicates before it replaced the aliases, so a job can have the same technology twice
+        if is_sqlite():
+            cur.execute(f'''
+            DELETE FROM {table_name} WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM {table_name} GROUP BY job_id, COALESCE(technology, ''));''')
+        else:
+            cur.execute(f'''
+            DELETE FROM {table_name} a USING {table_name} b
+            WHERE a.ctid > b.ctid AND a.job_id = b.job_id AND COALESCE(a.technology, '') = COALESCE(b.technology, '');''')
+        if cur.rowcount > 0:
+            print(f"{cur.rowcount} duplicate rows are deleted from {table_name}")
+    cur.execute(f'''
+    CREATE UNIQUE INDEX IF NOT EXISTS {index_name}
+    ON {table_name} (job_id, (COALESCE(technology, '')));''')
+    conn.commit()
+
 def clear_table(conn, cur, table_name='jobs_info'):
     '''
     Deletes all rows from specified table
@@ -53,8 +226,8 @@ def clear_table(conn, cur, table_name='jobs_info'):
     # if we connector is closed, then open it, delete all rows and close it again
     close_needed = 0
     if conn.closed:
-        close_needed = 1 
-        conn, cur = connect_to_db(conn_params)
+        close_needed = 1
+        conn, cur = connect_to_db()
     cur.execute(f'DELETE  FROM {table_name};')
     conn.commit()
     if close_needed:
@@ -62,14 +235,281 @@ def clear_table(conn, cur, table_name='jobs_info'):
         conn.close()
 
 
-def get_headers(conn, cur):
-    cur.execute("SELECT * FROM jobs_info LIMIT 1;")
+def get_headers(conn, cur, table_name='jobs_info'):
+    cur.execute(f"SELECT * FROM {table_name} LIMIT 1;")
     conn.commit()
     return [d[0] for d in cur.description]
 
 
 def select_job_ids(conn, cur, source:str, table_name = 'jobs_info'):
-    cur.execute(f"SELECT job_id FROM {table_name} WHERE source = '{source}';")
+    return list(iterate_job_ids(conn, cur, source, table_name=table_name))
+
+
+def iterate_job_ids(conn, cur, source:str, since=None, table_name='jobs_info', batch_size=10000):
+    '''
+    Yields job ids of the source (scraped since the date, if it's given) in batches,
+    so all of them are never held in memory as one list.
+    In PostgreSQL the result is streamed by a server-side (named) cursor
+    '''
+    statement = f"SELECT job_id FROM {table_name} WHERE source = %s"
+    params = (source,)
+    if since is not None:
+        statement += " AND scraped_date >= %s"
+        params += (since,)
+    if is_sqlite():
+        stream = cur
+    else:
+        stream = conn.cursor(name=f"{table_name}_ids_{threading.get_ident()}")
+        stream.itersize = batch_size
+    stream.execute(sql(statement), params)
+    try:
+        while True:
+            rows = stream.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0]
+    finally:
+        if stream is not cur:
+            stream.close()
+        conn.commit()
+
+
+def select_existing_ids(conn, cur, job_ids:list, source:str, table_name='jobs_info'):
+    '''
+    Returns the job ids from job_ids that are in the table as jobs of the source (one query for all of them)
+    '''
+    job_ids = list(job_ids)
+    if is_sqlite():
+        placeholders = ', '.join(['%s'] * len(job_ids))
+        execute(conn, cur, f"SELECT job_id FROM {table_name} WHERE job_id IN ({placeholders}) AND source = %s;",
+                job_ids + [source])
+    else:
+        execute(conn, cur, f"SELECT job_id FROM {table_name} WHERE job_id = ANY(%s) AND source = %s;", (job_ids, source),
+                prepared_name=f"select_existing_{table_name}")
+    rows = cur.fetchall()
     conn.commit()
-    return list(map(lambda tup: tup[0], cur.fetchall()))
+    return [row[0] for row in rows]
+
+
+
+# Bulk loading: records are streamed into a temporary staging table with COPY and merged into the table
+# with one INSERT ... ON CONFLICT per batch, so a duplicate job_id updates (or skips) the row instead of aborting the load.
+# SQLite has no COPY, records are inserted into its staging table with executemany.
+# unique keys of the tables, (expression) is a column of a unique index
+conflict_keys = {
+    'jobs_info': ['job_id'],
+    'technologies_per_job': ['job_id', "(COALESCE(technology, ''))"]
+}
+# number of records in one COPY and merge
+bulk_batch_size = 50000
+
+# Every batch loaded into these tables marks the scraped dates of its jobs in loaded_dates (in the same transaction),
+# so aggregates.py refreshes the summary tables of these dates, even if the batch only updated existing jobs.
+loaded_dates_table = 'loaded_dates'
+loaded_dates_queries = {
+    'jobs_info': "SELECT DISTINCT scraped_date FROM {staging_name} WHERE scraped_date IS NOT NULL",
+    'technologies_per_job': '''SELECT DISTINCT j.scraped_date FROM {staging_name} s JOIN jobs_info j ON j.job_id = s.job_id
+    WHERE j.scraped_date IS NOT NULL'''
+}
+
+
+def copy_to_staging(cur, staging_name:str, df:pd.DataFrame):
+    '''
+    Streams the DataFrame into the staging table with COPY
+    '''
+    columns = ', '.join(df.columns)
+    if is_sqlite():
+        placeholders = ', '.join(['?'] * len(df.columns))
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        cur.executemany(f"INSERT INTO {staging_name} ({columns}) VALUES ({placeholders});", rows)
+        return
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {staging_name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def mark_loaded_dates(cur, staging_name:str, table_name:str):
+    '''
+    Adds the scraped dates of the staged jobs to loaded_dates, if the table is one of the tables of the summary tables
+    '''
+    if table_name not in loaded_dates_queries:
+        return
+    cur.execute(f'''
+    INSERT INTO {loaded_dates_table} (scraped_date)
+    {loaded_dates_queries[table_name].format(staging_name=staging_name)}
+    ON CONFLICT (scraped_date) DO NOTHING;''')
+
+
+def merge_staging(cur, staging_name:str, table_name:str, columns:list, update:bool=True, returning:str=None):
+    '''
+    Inserts the staged rows into the table, rows that conflict with existing ones update them (or are skipped).
+    Returns the number of inserted or updated rows, or the rows of the returning columns of them if returning is given
+    '''
+    key = ', '.join(conflict_keys[table_name])
+    column_list = ', '.join(columns)
+    updated = [column for column in columns if column not in conflict_keys[table_name]]
+    if update and updated:
+        action = 'DO UPDATE SET ' + ', '.join(f"{column} = EXCLUDED.{column}" for column in updated)
+    else:
+        action = 'DO NOTHING'
+    if is_sqlite():
+        # SQLite applies the rows one by one, so duplicates within the batch are allowed
+        # ("WHERE true" separates the SELECT from ON CONFLICT for its parser)
+        select = f"SELECT {column_list} FROM {staging_name} WHERE true"
+    else:
+        # a row can be updated only once by one statement, so duplicates within the batch are dropped by DISTINCT ON
+        select = f"SELECT DISTINCT ON ({key}) {column_list} FROM {staging_name}"
+    cur.execute(f'''
+    INSERT INTO {table_name} ({column_list})
+    {select}
+    ON CONFLICT ({key}) {action}{f" RETURNING {returning}" if returning else ""};''')
+    return cur.fetchall() if returning else cur.rowcount
+
 
+def bulk_upsert(conn, cur, records, table_name='jobs_info', update:bool=True, batch_size:int=bulk_batch_size,
+                returning:str=None, on_merged=None):
+    '''
+    Loads records (a DataFrame or an iterable of DataFrames, e.g. CSV chunks) into the table in batches.
+    Only the columns of the table are loaded. Existing jobs are updated if update is True, skipped otherwise.
+    If returning is given, on_merged(conn, cur, rows) gets the returning columns of the inserted or updated rows
+    of every batch before the batch is committed (in the same transaction).
+    Returns the number of inserted or updated rows
+    '''
+    if isinstance(records, pd.DataFrame):
+        records = [records]
+    headers = get_headers(conn, cur, table_name)
+    staging_name = f"{table_name}_staging"
+    if is_sqlite():
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging_name} AS SELECT * FROM {table_name} WHERE 0;")
+    else:
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging_name} (LIKE {table_name} INCLUDING DEFAULTS);")
+    if table_name in loaded_dates_queries:
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {loaded_dates_table} (scraped_date DATE PRIMARY KEY);")
+    loaded = 0
+    try:
+        for df in records:
+            df = df[[column for column in headers if column in df.columns]]
+            for start in range(0, len(df), batch_size):
+                cur.execute(f"DELETE FROM {staging_name};" if is_sqlite() else f"TRUNCATE {staging_name};")
+                copy_to_staging(cur, staging_name, df.iloc[start:start + batch_size])
+                merged = merge_staging(cur, staging_name, table_name, list(df.columns), update, returning)
+                mark_loaded_dates(cur, staging_name, table_name)
+                if returning:
+                    on_merged(conn, cur, merged)
+                    merged = len(merged)
+                loaded += merged
+                conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return loaded
+
+
+def load_csv(conn, cur, filepath:str, table_name='jobs_info', update:bool=True, chunksize:int=bulk_batch_size):
+    '''
+    Loads the cleaned CSV file into the table chunk by chunk, returns the number of inserted or updated rows
+    '''
+    chunks = pd.read_csv(filepath, index_col=None, chunksize=chunksize, dtype={'job_id': str})
+    # the scrapers write missing values as 'None'
+    chunks = (chunk.where(chunk != 'None') for chunk in chunks)
+    return bulk_upsert(conn, cur, chunks, table_name, update, chunksize)
+
+
+def benchmark(num_rows:int=100000):
+    '''
+    Compares row-by-row INSERTs (what DataFrame.to_sql does) with bulk_upsert on synthetic jobs
+    in benchmark tables of the configured database, prints rows per second.
+    Then compares job id lookups with new connections and f-string SQL against pooled connections
+    and parameterized (prepared) statements
+    '''
+    df = pd.DataFrame({
+        'job_id': [str(i) for i in range(num_rows)],
+        'job_title': 'Data Analyst',
+        'company_name': 'Acme',
+        'location': 'mazowieckie',
+        'published_date': '2024-5-1',
+        'scraped_date': '2024-5-2',
+        'is_polish_required': [i % 2 == 0 for i in range(num_rows)],
+        'position': 'junior',
+        'source': 'linkedin',
+        'description': 'SQL, Excel and Power BI ' * 20
+    })
+    tables = ('jobs_info_rows', 'jobs_info_bulk')
+    conn, cur = connect_to_db()
+    try:
+        for table_name in tables:
+            create_table_if_not_exists(conn, cur, table_name)
+            clear_table(conn, cur, table_name)
+        conflict_keys['jobs_info_bulk'] = conflict_keys['jobs_info']
+
+        columns = ', '.join(df.columns)
+        placeholders = ', '.join(['%s'] * len(df.columns))
+        start = time.perf_counter()
+        cur.executemany(sql(f"INSERT INTO jobs_info_rows ({columns}) VALUES ({placeholders});"),
+                        list(df.itertuples(index=False, name=None)))
+        conn.commit()
+        rows_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bulk_upsert(conn, cur, df, 'jobs_info_bulk', update=False)
+        bulk_time = time.perf_counter() - start
+
+        # the second load consists only of duplicates, it must not fail
+        start = time.perf_counter()
+        updated = bulk_upsert(conn, cur, df, 'jobs_info_bulk')
+        upsert_time = time.perf_counter() - start
+
+        # a scraper checks a few dozen job ids at a time
+        batches = [df['job_id'].iloc[i:i + 25].tolist() for i in range(0, min(num_rows, 25000), 25)]
+        start = time.perf_counter()
+        for batch in batches:
+            new_conn = open_connection()
+            new_cur = new_conn.cursor()
+            in_list = ', '.join(f"'{job_id}'" for job_id in batch)
+            new_cur.execute(f"SELECT job_id FROM jobs_info_bulk WHERE job_id IN ({in_list}) AND source = 'linkedin';")
+            new_cur.fetchall()
+            new_cur.close()
+            new_conn.close()
+        unpooled_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for batch in batches:
+            pooled_conn, pooled_cur = connect_to_db()
+            select_existing_ids(pooled_conn, pooled_cur, batch, 'linkedin', 'jobs_info_bulk')
+            pooled_cur.close()
+            pooled_conn.close()
+        pooled_time = time.perf_counter() - start
+    finally:
+        for table_name in tables:
+            cur.execute(f"DROP TABLE IF EXISTS {table_name};")
+        conn.commit()
+        cur.close()
+        conn.close()
+    print(f"row-by-row INSERT: {num_rows / rows_time:.0f} rows/s")
+    print(f"bulk load: {num_rows / bulk_time:.0f} rows/s")
+    print(f"bulk load of duplicates: {num_rows / upsert_time:.0f} rows/s, {updated} rows updated")
+    print(f"{len(batches)} id lookups: new connections {unpooled_time:.2f} s, pooled and parameterized {pooled_time:.2f} s")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # unpivoted technologies are loaded by technologies.py, it also updates the counts of jobs per technology
+    parser = argparse.ArgumentParser(description="Loads cleaned jobs into the database")
+    parser.add_argument('jobs_csv', nargs='?', help="CSV file with cleaned jobs")
+    parser.add_argument('--skip-existing', action='store_true', help="keep existing jobs instead of updating them")
+    parser.add_argument('--database', default=database_url, help="'postgres' (db_credentials.txt) or 'sqlite:<path>'")
+    parser.add_argument('--benchmark', type=int, metavar='ROWS', help="compare with row-by-row INSERTs on ROWS synthetic jobs instead")
+    args = parser.parse_args()
+    configure(args.database)
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        conn, cur = connect_to_db()
+        create_table_if_not_exists(conn, cur)
+        if args.jobs_csv:
+            print(f"{load_csv(conn, cur, args.jobs_csv, update=not args.skip_existing)} jobs are loaded")
+        cur.close()
+        conn.close()
@@ -0,0 +1,221 @@
+import datetime
+import hashlib
+import math
+import os
+import struct
+import threading
+
+import job_database as db
+
+# IDs of already scraped jobs of one source. The scrapers check every job card against it,
+# so membership costs O(1) instead of a scan of the list returned by the database.
+# By default all IDs of the source are loaded into a set. With bloom=True only a Bloom filter is kept in memory
+# (about 1.2 MB for a million IDs): it's saved to data/job_ids/<source>.bloom and shared between runs and processes.
+# A Bloom filter has no false negatives, so an ID that isn't in it is new. An ID that is in it
+# is checked in the database (in batches), and the results of the checks are remembered.
+bloom_dir = os.path.join(os.pardir, 'data', 'job_ids')
+
+# the filter is sized for this number of IDs with this rate of false positives
+bloom_capacity = 1000000
+bloom_error_rate = 0.01
+# a saved filter is synced with the jobs that were scraped this number of days before it was saved,
+# so jobs that were loaded into the database later (by other machines) are added too
+sync_margin = 30
+
+# the number of IDs in one database check
+check_batch_size = 500
+
+# size of bits, number of hashes, date of the last sync (ordinal)
+header_format = '<QIQ'
+
+
+class BloomFilter:
+    """A bit array where every item sets num_hashes bits, an item is possibly present if all its bits are set."""
+
+    def __init__(self, num_bits:int, num_hashes:int, bits:bytearray=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity:int, error_rate:float):
+        """Returns an empty filter sized for capacity items with error_rate false positives."""
+        num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def get_positions(self, item:str):
+        """Returns the bits of the item (double hashing of one 128-bit digest)."""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item:str):
+        for position in self.get_positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item:str):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.get_positions(item))
+
+    def merge(self, other):
+        """Adds all items of the other filter of the same size."""
+        merged = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        self.bits = bytearray(merged.to_bytes(len(self.bits), 'little'))
+
+
+def get_bloom_path(source:str):
+    """Returns the path of the saved Bloom filter of the source."""
+    return os.path.join(bloom_dir, f"{source}.bloom")
+
+def load_bloom(source:str):
+    """Returns (filter, date of its last sync) saved for the source, (None, None) if there is no saved filter."""
+    try:
+        with open(get_bloom_path(source), 'rb') as f:
+            num_bits, num_hashes, synced = struct.unpack(header_format, f.read(struct.calcsize(header_format)))
+            bits = bytearray(f.read())
+    except (FileNotFoundError, struct.error):
+        return None, None
+    if len(bits) != (num_bits + 7) // 8:
+        return None, None
+    return BloomFilter(num_bits, num_hashes, bits), datetime.date.fromordinal(synced)
+
+def save_bloom(source:str, bloom:BloomFilter, synced:datetime.date):
+    """
+    Saves the filter of the source. Items that other processes saved since it was loaded are kept:
+    the saved filter is merged into this one. The file is replaced atomically.
+    """
+    os.makedirs(bloom_dir, exist_ok=True)
+    saved, saved_synced = load_bloom(source)
+    if saved and (saved.num_bits, saved.num_hashes) == (bloom.num_bits, bloom.num_hashes):
+        bloom.merge(saved)
+        synced = min(synced, saved_synced)
+    path = get_bloom_path(source)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(struct.pack(header_format, bloom.num_bits, bloom.num_hashes, synced.toordinal()))
+        f.write(bloom.bits)
+    os.replace(temp_path, path)
+
+
+class JobIdIndex:
+    """
+    IDs of already scraped jobs of the source. It's used like the list it replaced:
+    `job_id in index` and `index.append(job_id)`, filter_new checks many IDs at once.
+    """
+
+    def __init__(self, source:str, ids=(), bloom:BloomFilter=None):
+        self.source = source
+        # exact answers: all IDs in the set mode, IDs scraped in this run and checked in the database in the Bloom mode
+        self.known = set(ids)
+        self.checked_new = set()
+        self.bloom = bloom
+        self.lock = threading.Lock()
+
+    def __contains__(self, job_id:str):
+        return not self.filter_new([job_id])
+
+    def __len__(self):
+        return len(self.known)
+
+    def append(self, job_id:str):
+        """Adds the scraped job's ID."""
+        with self.lock:
+            self.known.add(job_id)
+            self.checked_new.discard(job_id)
+            if self.bloom is not None:
+                self.bloom.add(job_id)
+
+    def filter_new(self, job_ids:list):
+        """Returns the IDs (in the same order) that aren't scraped yet."""
+        with self.lock:
+            if self.bloom is None:
+                return [job_id for job_id in job_ids if job_id not in self.known]
+            # Bloom positives that weren't checked before are checked in the database
+            to_check = {job_id for job_id in job_ids
+                        if job_id not in self.known and job_id not in self.checked_new and job_id in self.bloom}
+            if to_check:
+                self.known.update(check_in_db(list(to_check), self.source))
+                self.checked_new.update(to_check - self.known)
+            return [job_id for job_id in job_ids if job_id not in self.known]
+
+    def save(self):
+        """Saves the Bloom filter with the IDs scraped in this run, so other runs and processes skip them."""
+        if self.bloom is not None:
+            save_bloom(self.source, self.bloom, datetime.date.today())
+
+
+def check_in_db(job_ids:list, source:str):
+    """Returns the IDs that are in the database as jobs of the source, they are checked in batches."""
+    conn, cur = db.connect_to_db()
+    try:
+        existing = []
+        for i in range(0, len(job_ids), check_batch_size):
+            existing += db.select_existing_ids(conn, cur, job_ids[i:i + check_batch_size], source)
+        return existing
+    finally:
+        cur.close()
+        conn.close()
+
+def load(conn, cur, source:str, bloom:bool=False):
+    """
+    Returns the index of already scraped jobs of the source.
+    In the Bloom mode the saved filter is synced with the recently scraped jobs, or built from all jobs if there is none.
+    """
+    if not bloom:
+        return JobIdIndex(source, db.iterate_job_ids(conn, cur, source))
+    bloom_filter, synced = load_bloom(source)
+    since = synced - datetime.timedelta(days=sync_margin) if bloom_filter else None
+    if bloom_filter is None:
+        bloom_filter = BloomFilter.for_capacity(bloom_capacity, bloom_error_rate)
+    for job_id in db.iterate_job_ids(conn, cur, source, since):
+        bloom_filter.add(job_id)
+    index = JobIdIndex(source, bloom=bloom_filter)
+    index.save()
+    return index
+
+
+def benchmark(num_ids:int=300000, num_checks:int=20000):
+    """Compares membership checks of the list, the set and the Bloom filter on synthetic IDs."""
+    import random
+    import sys
+    import time
+
+    random.seed(0)
+    ids = [str(random.randrange(10**12)) for i in range(num_ids)]
+    # half of the checked cards are already scraped, like on the list pages of an incremental run
+    checks = random.sample(ids, num_checks // 2) + [str(random.randrange(10**12)) for i in range(num_checks // 2)]
+
+    start = time.perf_counter()
+    list_result = [job_id not in ids for job_id in checks[:1000]]
+    list_time = (time.perf_counter() - start) / 1000 * num_checks
+
+    index = JobIdIndex('benchmark', ids)
+    start = time.perf_counter()
+    new_ids = set(index.filter_new(checks))
+    set_time = time.perf_counter() - start
+    set_result = [job_id in new_ids for job_id in checks]
+
+    bloom_filter = BloomFilter.for_capacity(max(bloom_capacity, num_ids), bloom_error_rate)
+    for job_id in ids:
+        bloom_filter.add(job_id)
+    start = time.perf_counter()
+    positives = [job_id for job_id in checks if job_id in bloom_filter]
+    bloom_time = time.perf_counter() - start
+    false_positives = len(positives) - num_checks // 2
+
+    print(f"list: {list_time:.2f} s for {num_checks} checks (estimated from 1000), {sys.getsizeof(ids) / 2**20:.1f} MB of pointers")
+    print(f"set: {set_time:.3f} s, {sys.getsizeof(index.known) / 2**20:.1f} MB of pointers, "
+          f"{sum(a != b for a, b in zip(list_result, set_result))} results differ from the list")
+    print(f"bloom: {bloom_time:.3f} s, {len(bloom_filter.bits) / 2**20:.1f} MB, "
+          f"{false_positives} false positives of {num_checks // 2} new IDs are checked in the database")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compares the job ID index with list membership checks on synthetic IDs")
+    parser.add_argument('-n', '--num-ids', type=int, default=300000)
+    parser.add_argument('--num-checks', type=int, default=20000)
+    args = parser.parse_args()
+    benchmark(args.num_ids, args.num_checks)
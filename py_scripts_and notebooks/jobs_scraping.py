@@ -1,7 +1,15 @@
-from fake_useragent import UserAgent
+import threading
+import time
+from dataclasses import dataclass, field, fields
 import requests
-import random
-from bs4 import BeautifulSoup
+
+import session_pool
+import proxy_manager
+import rate_limiter
+import response_cache
+import html_parsers
+import keyword_classifier
+import checkpoint_journal
 
 def get_proxies():
     """Reads proxy addresses from proxies.txt and returns them as a list."""
@@ -12,91 +20,241 @@ def get_proxies():
         return None 
     return proxies
 
+def get_searching_parameters():
+    """Reads job title and location from searching_parameters.txt and returns them."""
+    with open('searching_parameters.txt', 'r') as f:
+        params = {}
+        for line in f.readlines():
+            if not line.strip():
+                continue
+            key, value = line.strip().split('=')
+            params[key.strip()] = value.strip()
+    return params['job_title'], params['location']
+
 proxies_list = get_proxies()
+proxy_manager.load_stats(proxies_list)
 
+# seconds to wait for a response before the attempt is considered failed
+request_timeout = 30
 
-def get_random_proxy():
-    """Returns a random proxy from the proxies list."""
-    return random.choice(proxies_list)
+def get_random_proxy(url:str=None):
+    """Returns a random proxy from the proxies list, healthier proxies for the url's domain are chosen more often."""
+    return proxy_manager.choose_proxy(url)
 
 def get_random_user_agent():
     """Returns a random user agent string."""
-    ua = UserAgent()
-    return ua.random
+    return session_pool.get_random_user_agent()
 
-def make_request(url:str):
+def make_request(url:str, profile:str='default'):
     """Makes an HTTP GET request to the specified URL using random proxies and user agents.
-    Retries up to 10 times if the request fails."""
-    for i in range(10):
-        response = requests.get(url=url,
-                                proxies={
-                                    'http':get_random_proxy(),
-                                    'https':get_random_proxy()
-                                },
-                                headers={'User-Agent': get_random_user_agent()})
-        if response.status_code == 200:
+    Connections to every proxy are kept alive and reused by session_pool.
+    profile is the kind of headers that are sent (see session_pool.profile_headers).
+    Requests are paced by rate_limiter, which adapts to the site's responses.
+    Retries up to 10 times with growing pauses if the request fails, every result is reported to proxy_manager.
+    Successful responses are cached on disk by response_cache, a fresh cached response is returned without a request
+    and an expired one is revalidated with the server if it supports ETag/Last-Modified.
+    Returns None if all attempts raised an exception."""
+    cached_response, stale_entry = response_cache.get(url)
+    if cached_response:
+        return cached_response
+    conditional_headers = response_cache.get_conditional_headers(stale_entry)
+    response = None
+    for attempt in range(10):
+        proxy = get_random_proxy(url)
+        rate_limiter.acquire(url, proxy) # wait until the site allows the next request
+        start = time.perf_counter()
+        try:
+            # the session isn't closed while the request is being made, even if it's evicted from the pool
+            with session_pool.use_session(proxy) as session:
+                response = session.get(url=url, headers={**session_pool.get_headers(profile), **conditional_headers}, timeout=request_timeout)
+        except requests.RequestException as e: # dead or too slow proxy
+            rate_limiter.report(url, timeout=isinstance(e, requests.Timeout), proxy=proxy)
+            proxy_manager.report_failure(proxy, url)
+            time.sleep(proxy_manager.get_backoff(attempt))
+            continue
+        latency = time.perf_counter() - start
+        # a captcha page served with 200 means the site is blocking us, so it slows the requests down
+        is_captcha = response.status_code == 200 and proxy_manager.is_captcha(response)
+        rate_limiter.report(url, response.status_code, proxy=proxy, throttled=is_captcha)
+        if response.status_code == 304 and stale_entry: # cached response is still valid
+            proxy_manager.report_success(proxy, url, latency)
+            return response_cache.revalidated(stale_entry)
+        if response.status_code == 200 and not is_captcha:
+            proxy_manager.report_success(proxy, url, latency)
+            response_cache.put(url, response)
             break
-    else:
+        if response.status_code in (404, 410): # the page doesn't exist, there is no sense to retry
+            proxy_manager.report_success(proxy, url, latency)
+            break
+        proxy_manager.report_failure(proxy, url, ban=proxy_manager.is_ban(response), latency=latency)
+        time.sleep(proxy_manager.get_backoff(attempt))
+    if response is None:
+        print(f"all attempts to request {url} failed")
+    elif response.status_code != 200:
         print(f"status code {response.status_code}: {response.url}")
     return response
 
+@dataclass(slots=True)
+class JobRecord:
+    """A scraped job, the fields are the columns of the scrapers' output."""
+    job_id: str
+    job_title: str = None
+    company_name: str = None
+    location: str = None
+    published_date: object = None # a date or "<year>-<month>-<day>" string
+    scraped_date: object = None
+    is_polish_required: bool = None
+    position: str = None
+    source: str = None
+    description: str = None
+
+
+job_columns = [f.name for f in fields(JobRecord)]
+# all scrapers of a process save their jobs to the same files
+sink_lock = threading.Lock()
+
+
+class JobBuffer:
+    """
+    Scraped jobs of a scraper that aren't saved yet. When a sink (pandas_csv or parquet_sink) is set,
+    the jobs are saved to it every flush_every jobs, so the memory doesn't grow with the number of scraped jobs.
+    Without a sink all jobs are kept until they are saved by flush.
+    IDs of saved jobs are written to the journal, so a resumed run restores only the jobs that weren't saved.
+    """
+
+    def __init__(self, journal:str, flush_every:int=500):
+        self.journal = journal
+        self.flush_every = flush_every
+        self.sink = None
+        self.records = []
+        self.saved = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.saved + len(self.records)
+
+    def set_sink(self, sink):
+        """Sets the module whose save_data(jobs_info) saves the jobs."""
+        self.sink = sink
+
+    def append(self, record:JobRecord):
+        with self.lock:
+            self.records.append(record)
+            full = self.sink is not None and len(self.records) >= self.flush_every
+        if full:
+            self.flush()
+
+    def to_dict(self):
+        """Returns the jobs that aren't saved yet as a dictionary of lists (columns)."""
+        with self.lock:
+            return {column: [getattr(record, column) for record in self.records] for column in job_columns}
+
+    def flush(self, sink=None):
+        """Saves the jobs to the sink (the buffer's sink by default) and removes them from the buffer."""
+        sink = sink or self.sink
+        if sink is None:
+            return
+        with self.lock:
+            records, self.records = self.records, []
+        if not records:
+            return
+        with sink_lock:
+            sink.save_data({column: [getattr(record, column) for record in records] for column in job_columns})
+        # a job is marked right after it's saved (a crash between the two is the only way to save it twice),
+        # marking it before saving could lose it instead
+        checkpoint_journal.write_saved(self.journal, [record.job_id for record in records])
+        with self.lock:
+            self.saved += len(records)
+
+    def restore(self, scraped_ids):
+        """
+        Appends the jobs of the journal left by a crashed run that weren't saved, all jobs of the journal
+        are added to scraped_ids. Returns the set of list pages that were processed.
+        """
+        rows, saved_ids, pages = checkpoint_journal.replay(self.journal)
+        for row in rows:
+            append_job(self, row)
+            scraped_ids.append(row['job_id'])
+        for job_id in saved_ids:
+            scraped_ids.append(job_id)
+        print(f"{len(rows)} {self.journal} jobs are restored from the journal, {len(saved_ids)} were saved before the crash")
+        return pages
+
+
+def append_job(jobs_info:JobBuffer, row:dict):
+    """Appends the job to jobs_info, missing fields are None and a field that isn't a column raises TypeError."""
+    jobs_info.append(JobRecord(**row))
+
 def identify_analyst_job(job_title:str):
     """Identifies if the job title corresponds to a data analyst position."""
-    sub_strings = ['anal', 'sql', 'bi', "excel" ]
-    # if there are some words from sub_strings in job_title, then it's Data Analyst job
-    for sub in sub_strings:
-        if sub in job_title.lower():
-            return True
-    else:
-        return False
+    # if there are some keywords of data analyst jobs in job_title, then it's Data Analyst job
+    return keyword_classifier.analyst_job.contains(job_title)
     
 def identify_position(job_title:str):
     """Identifies the job position (e.g., Junior, Senior) from the job title."""
-    d = dict(
-        junior = ['junior', 'entry'],
-        intern = ['intern', 'staż', 'train'],
-        middle = ['assosiate', 'mid', 'intermediate'],
-        senior = ['senior', 'executive', 'starszy', 'lead']
-    )
-    for key in d:
-        for position in d[key]:
-            if position in job_title.lower():
-                return key
-    else:
-        return None
+    return keyword_classifier.positions.classify(job_title)
     
 
 def identify_polish_description(desc_text:str):
     """Identifies if the job description contains Polish letters."""
-    polish_letters = "żśćźóąęłń"
-    for letter in polish_letters: # if there are some polish letters, then description is written in Polish
-        if letter in desc_text.lower():
-            return True
-    else:
-        return False
+    # if there are some polish letters, then description is written in Polish
+    return keyword_classifier.polish_letters.contains(desc_text)
     
 
+def identify_languages(bullets:list, is_polish_description:bool):
+    """
+    Identifies if the job requires Polish and English language skills from the bullet points of its description.
+    Returns (is_polish_required, is_english_required), both are None if there are no bullet points.
+    """
+    if len(bullets) == 0:
+        return None, None
+    bullets_text = '\n'.join(bullets)
+    is_polish_required = (keyword_classifier.polish_name.contains(bullets_text)
+                          or keyword_classifier.polish_requirement.contains(bullets_text))
+    is_english_required = (keyword_classifier.english_name.contains(bullets_text)
+                           or keyword_classifier.english_requirement.contains(bullets_text))
+    # If the description is written in Polish and English is not mentioned, it implies that Polish is required.
+    if is_polish_description and not is_english_required:
+        is_polish_required = True
+    return is_polish_required, is_english_required
+
+
+@dataclass
+class DescriptionRecord:
+    """Everything the scrapers take from a job description."""
+    text: str = None # text of the description, None if it can't be found
+    bullets: list = field(default_factory=list) # texts of the bullet points of the document
+    is_polish_description: bool = False # the document is written in Polish
+    is_polish_required: bool = None # None if there are no bullet points
+    is_english_required: bool = None # None if there are no bullet points
+
+
+def parse_description(desc_html, container:tuple=None, text:str=None):
+    """
+    Parses the description document once and returns its DescriptionRecord.
+    The text is taken from the container (a (tag, attrs) pair) or from the whole document,
+    unless it's passed as text (e.g. Indeed's JSON has the text of the description).
+    """
+    soup = html_parsers.parse(desc_html)
+    # bullet points in job postings are often represented as either <li> or <p> tags
+    bullet_points = html_parsers.find_all(soup, 'li')
+    if len(bullet_points) == 0:
+        bullet_points = html_parsers.find_all(soup, 'p')
+    bullets = [html_parsers.get_text(bullet) for bullet in bullet_points]
+    is_polish_description = identify_polish_description(html_parsers.get_text(soup))
+    is_polish_required, is_english_required = identify_languages(bullets, is_polish_description)
+
+    if text is None:
+        text_element = html_parsers.find(soup, *container) if container else soup
+        text = html_parsers.get_text(text_element) if text_element else None
+    return DescriptionRecord(
+        text=text.strip() if text is not None else None,
+        bullets=bullets,
+        is_polish_description=is_polish_description,
+        is_polish_required=is_polish_required,
+        is_english_required=is_english_required
+    )
+
 def identify_polish(desc_html:str):
     """Identifies if the job requires Polish language skills."""
-    # bullet points in job postings are often represented as either <li> or <p> tags
-    soup = BeautifulSoup(desc_html, 'html.parser')
-    bullet_points = soup.find_all('li') # find all <li> tags 
-    is_english_required = False
-    is_polish_description = identify_polish_description(soup.text)
-    if len(bullet_points) == 0: # if there are no <li> tags, then find all <p> tags
-        bullet_points = soup.find_all('p')
-        if len(bullet_points) == 0: # if there are no <p> tags (hence no bullet points at all) then return None
-            return None
-    for bullet in bullet_points:
-        bullet = bullet.text
-        if 'Polish' in bullet  \
-            or 'język polski' in bullet.lower() or 'polskiego' in bullet.lower():
-            return True
-        if "English" in bullet or "angielski" in bullet.lower():
-            is_english_required = True
-    else:
-        # If the description is written in Polish and English is not mentioned, it implies that Polish is required.
-        if is_polish_description and not is_english_required:
-            return True
-        else:
-            return False
\ No newline at end of file
+    return parse_description(desc_html).is_polish_required
\ No newline at end of file
@@ -0,0 +1,92 @@
+import threading
+
+# orjson decodes large payloads several times faster than the standard json module, it's optional
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    import json
+    loads = json.loads
+
+# Payloads are decoded once and only the fields of their schema are taken from them.
+# A schema maps field names to their paths in the payload (keys and list indexes).
+# A path that isn't in a payload means that the site changed its format (schema drift):
+# it's counted per schema and field, and the field gets None instead of raising KeyError.
+# A value that is there but can't be converted (see convert) is counted and replaced with None the same way.
+
+stats = {'decoded': 0, 'invalid': 0}
+# schema name -> {field: number of payloads where the field's path is missing or its value is invalid}
+drift = {}
+stats_lock = threading.Lock()
+
+missing = object()
+
+
+def decode(content):
+    """Decodes the JSON payload (bytes or str), returns None if it isn't valid JSON."""
+    try:
+        payload = loads(content)
+    except ValueError: # both orjson and json decode errors are ValueErrors
+        with stats_lock:
+            stats['invalid'] += 1
+        return None
+    with stats_lock:
+        stats['decoded'] += 1
+    return payload
+
+def get_path(payload, path:tuple, default=None):
+    """Returns the value at the path in the payload or default if there is no such path."""
+    value = payload
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return default
+    return value
+
+def count_drift(schema_name:str, field:str):
+    """Counts the field of the schema as missing or invalid in one more payload."""
+    with stats_lock:
+        schema_drift = drift.setdefault(schema_name, {})
+        schema_drift[field] = schema_drift.get(field, 0) + 1
+
+def extract(payload, schema_name:str, schema:dict):
+    """
+    Returns the fields of the schema ({field: path}) taken from the payload.
+    Fields whose paths are missing get None and are counted as schema drift.
+    """
+    fields = {}
+    for field, path in schema.items():
+        value = get_path(payload, path, missing)
+        if value is missing:
+            count_drift(schema_name, field)
+            value = None
+        fields[field] = value
+    return fields
+
+def convert(fields:dict, schema_name:str, field:str, func):
+    """
+    Returns func(value) of the extracted field, None if the field is None.
+    If func raises ValueError or TypeError (the value has an unexpected format), it's counted as schema drift and None is returned.
+    """
+    value = fields[field]
+    if value is None:
+        return None
+    try:
+        return func(value)
+    except (ValueError, TypeError):
+        count_drift(schema_name, field)
+        return None
+
+def text(value):
+    """Returns the value if it's a string, raises TypeError otherwise (a converter for convert)."""
+    if not isinstance(value, str):
+        raise TypeError(f"expected a string, got {type(value).__name__}")
+    return value
+
+def print_stats():
+    """Prints the number of decoded payloads and schema drift counters."""
+    print(f"json payloads: {stats['decoded']} decoded, {stats['invalid']} invalid")
+    for schema_name, schema_drift in drift.items():
+        fields = ', '.join(f"{field} ({count})" for field, count in schema_drift.items())
+        print(f"schema drift in {schema_name}: missing or invalid {fields}")
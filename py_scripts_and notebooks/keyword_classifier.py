@@ -0,0 +1,173 @@
+import pandas as pd
+
+# Keyword tables of all sources are prepared once: keywords are lowercased and folded (Polish diacritics are removed:
+# "Staż" -> "staz"), so a keyword matches with or without diacritics. A text is folded once per check
+# instead of once per keyword. The tables are small, so plain substring checks are used:
+# they are several times faster than a regular expression with all keywords (see benchmark).
+
+fold_table = str.maketrans('ąćęłńóśźż', 'acelnoszz')
+
+
+def fold(text:str):
+    """Lowercases the text and removes Polish diacritics."""
+    text = text.lower()
+    # most texts are ASCII, translate is much slower than this check
+    return text if text.isascii() else text.translate(fold_table)
+
+
+class KeywordClassifier:
+    """
+    Assigns labels to texts by keywords. The table maps labels to their keywords, the order of the table
+    is the priority: a text gets the first label that has a keyword in the text (as a substring).
+    Texts and keywords are folded, only lowercased if fold_text is False, and compared as they are if lowercase is False.
+    """
+
+    def __init__(self, table:dict, fold_text:bool=True, lowercase:bool=True):
+        self.fold_text = fold_text
+        self.lowercase = lowercase
+        self.table = [(label, tuple(self.prepare(keyword) for keyword in keywords)) for label, keywords in table.items()]
+        self.keywords = tuple(keyword for label, keywords in self.table for keyword in keywords)
+
+    def prepare(self, text:str):
+        """Returns the text in the form keywords are matched in."""
+        if not self.lowercase:
+            return text
+        return fold(text) if self.fold_text else text.lower()
+
+    def classify(self, text:str, default=None):
+        """Returns the label of the text or default if the text has no keywords."""
+        if not text:
+            return default
+        text = self.prepare(text)
+        for label, keywords in self.table:
+            for keyword in keywords:
+                if keyword in text:
+                    return label
+        return default
+
+    def contains(self, text:str):
+        """Identifies if the text has a keyword of any label."""
+        if not text:
+            return False
+        text = self.prepare(text)
+        for keyword in self.keywords:
+            if keyword in text:
+                return True
+        return False
+
+    def classify_series(self, series:pd.Series, default=None):
+        """
+        Returns the Series of labels of the texts, texts without keywords (and missing texts) get default.
+        Tables repeat the same texts a lot, so every distinct text is classified once.
+        """
+        labels = {text: self.classify(text, default) for text in series.dropna().unique()}
+        return pd.Series([labels.get(text, default) for text in series], index=series.index, dtype=object)
+
+    def contains_series(self, series:pd.Series):
+        """Returns the boolean Series that shows which texts have a keyword of any label."""
+        found = {text: self.contains(text) for text in series.dropna().unique()}
+        return pd.Series([found.get(text, False) for text in series], index=series.index, dtype=bool)
+
+
+# titles of data analyst jobs contain one of these keywords
+analyst_job = KeywordClassifier({True: ['anal', 'sql', 'bi', 'excel']})
+
+# position in the job title
+positions = KeywordClassifier({
+    'junior': ['junior', 'entry'],
+    'intern': ['intern', 'staż', 'train'],
+    'middle': ['assosiate', 'mid', 'intermediate'],
+    'senior': ['senior', 'executive', 'starszy', 'lead']
+})
+
+# position from the "position level" field of Pracuj offers
+pracuj_positions = KeywordClassifier({
+    'intern': ['praktykant', 'stażysta', 'trainee'],
+    'junior': ['junior', 'asystent'],
+    'middle': ['mid'],
+    'senior': ['senior', 'expert', 'ekspert', 'kierownik', 'koordynator', 'menedżer', 'manager', 'dyrektor', 'director']
+})
+
+# a text with Polish letters is written in Polish, so these keywords are not folded
+polish_letters = KeywordClassifier({True: list('żśćźóąęłń')}, fold_text=False)
+
+# mentions of the languages in the requirements of a job: the English names are case-sensitive
+# ("polished" or "polish your skills" isn't a language), the Polish phrases are lowercased but not folded
+polish_name = KeywordClassifier({True: ['Polish']}, lowercase=False)
+polish_requirement = KeywordClassifier({True: ['język polski', 'polskiego']}, fold_text=False)
+english_name = KeywordClassifier({True: ['English']}, lowercase=False)
+english_requirement = KeywordClassifier({True: ['angielski']}, fold_text=False)
+
+
+def benchmark(num_titles:int=200000):
+    """Compares the classifiers (scalar and Series) with the keyword loops they replaced on synthetic job titles."""
+    import random
+    import re
+    import time
+
+    def loop_identify_position(job_title:str):
+        d = dict(
+            junior = ['junior', 'entry'],
+            intern = ['intern', 'staż', 'train'],
+            middle = ['assosiate', 'mid', 'intermediate'],
+            senior = ['senior', 'executive', 'starszy', 'lead']
+        )
+        for key in d:
+            for position in d[key]:
+                if position in job_title.lower():
+                    return key
+        return None
+
+    def loop_identify_analyst_job(job_title:str):
+        return any(sub in job_title.lower() for sub in ['anal', 'sql', 'bi', "excel"])
+
+    words = ['Data', 'Analyst', 'Senior', 'Junior', 'Staż', 'Mid', 'BI', 'Developer', 'SQL', 'Specjalista',
+             'Lead', 'Excel', 'Intern', 'Manager', 'Reporting', 'Engineer', 'Starszy', 'ds.', 'Analityk', 'Entry']
+    random.seed(0)
+    # job titles repeat a lot in the scraped data
+    distinct_titles = [' '.join(random.choices(words, k=random.randint(2, 5))) for i in range(5000)]
+    titles = random.choices(distinct_titles, k=num_titles)
+    series = pd.Series(titles)
+
+    # the same tables as regular expressions (one per label, in the order of priority)
+    position_patterns = [(label, re.compile('|'.join(map(re.escape, keywords)))) for label, keywords in positions.table]
+    analyst_pattern = re.compile('|'.join(map(re.escape, analyst_job.keywords)))
+
+    def regex_identify_position(job_title:str):
+        job_title = fold(job_title)
+        return next((label for label, pattern in position_patterns if pattern.search(job_title)), None)
+
+    def regex_identify_analyst_job(job_title:str):
+        return analyst_pattern.search(fold(job_title)) is not None
+
+    for name, loop_func, regex_func, scalar_func, series_func in (
+            ('position', loop_identify_position, regex_identify_position, positions.classify, positions.classify_series),
+            ('analyst job', loop_identify_analyst_job, regex_identify_analyst_job, analyst_job.contains, analyst_job.contains_series)):
+        start = time.perf_counter()
+        expected = [loop_func(title) for title in titles]
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        [regex_func(title) for title in titles]
+        regex_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scalar = [scalar_func(title) for title in titles]
+        scalar_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorized = series_func(series).tolist()
+        series_time = time.perf_counter() - start
+
+        print(f"{name}: loops {loop_time:.2f} s, regex {regex_time:.2f} s, classifier {scalar_time:.2f} s, Series {series_time:.2f} s")
+        print(f"{name}: {sum(a != b for a, b in zip(expected, scalar))} scalar and "
+              f"{sum(a != b for a, b in zip(expected, vectorized))} Series results differ from the loops")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compares the keyword classifiers with keyword loops on synthetic job titles")
+    parser.add_argument('-n', '--num-titles', type=int, default=200000)
+    args = parser.parse_args()
+    benchmark(args.num_titles)
@@ -1,41 +1,23 @@
-import time
 import os
-import random
-from bs4 import BeautifulSoup
+import argparse
 import datetime
 
 
 import jobs_scraping
+import html_parsers
+import fetch_engine
+import paginator
+import progress
+import crawl_frontier
+import checkpoint_journal
+import proxy_manager
+import response_cache
 import job_database as db
+import job_id_index
 import pandas_csv
 
-# Configure socket options for HTTP connections to keep them alive longer
-import socket
-from urllib3.connection import HTTPConnection
-
-HTTPConnection.default_socket_options = (
-    HTTPConnection.default_socket_options + [
-        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
-        (socket.SOL_TCP, socket.TCP_KEEPIDLE, 45),
-        (socket.SOL_TCP, socket.TCP_KEEPINTVL, 10),
-        (socket.SOL_TCP, socket.TCP_KEEPCNT, 6)
-    ]
-)
-
-# Dictionary to store job information
-# from jobs_info dictionary DataFrame will be created
-jobs_info = {
-            'job_id': [],
-            'job_title': [],
-            'company_name': [],
-            'location': [],
-            'published_date': [],
-            'scraped_date': [],
-            'is_polish_required':  [],
-            'position': [],
-            'source' : [],
-            'description': []
-}
+# Scraped jobs, they are saved to the sink in batches (see jobs_scraping.JobBuffer)
+jobs_info = jobs_scraping.JobBuffer('linkedin')
 
 def get_current_date():
     """Returns the current date as a string."""
@@ -85,8 +67,13 @@ def choose_time_period():
 
 
 
-def get_next_list(time_period:str, num_lists:int):
-    """Generates the URL for the next page of job listings and makes a request to retrieve it."""
+def get_next_list(time_period:str, num_lists:int=100, done_pages:set=()):
+    """
+    Generates the URLs of the job listing pages and yields their soups.
+    Next pages are requested while the current one is being parsed, and
+    no more pages are requested when the results are exhausted (or after num_lists pages).
+    Pages from done_pages (processed before the resumed run crashed) are skipped.
+    """
     time_periods = {
         'past_month' : 'r2592000',
         'any_time' : '',
@@ -102,29 +89,74 @@ def get_next_list(time_period:str, num_lists:int):
     if len(splitted_location) >= 2:
         location = '%20'.join(splitted_location)
 
-    for start in range(0, num_lists*10, 10):
-        list_url = f'https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords={job_title}&f_TPR={time_periods[time_period]}&location={location}&start='
-        current_url = list_url + str(start) # adding 10 to the "start" parameter of list url to get the next list of jobs
-        response = jobs_scraping.make_request(current_url)
-        # yield None if can't access a page, otherwise return text of the page
-        yield None if response.status_code != 200 else response.text 
+    list_url = f'https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?keywords={job_title}&f_TPR={time_periods[time_period]}&location={location}&start='
+    # adding 10 to the "start" parameter of list url to get the next list of jobs
+    list_urls = (list_url + str(start) for start in range(0, num_lists*10, 10))
+    list_urls = (url for url in list_urls if url not in done_pages)
+    # if several workers split the scrape, only the pages claimed by this worker are requested
+    list_urls = crawl_frontier.iterate_claimed('list_page', 'linkedin', list_urls)
+    yield from paginator.iterate_pages(list_urls, parse_list_page, get_page_job_ids,
+                                       **crawl_frontier.get_page_callbacks('linkedin', on_page_done))
+
+def on_page_done(list_url:str):
+    """Writes the list page whose jobs are all parsed to the journal."""
+    checkpoint_journal.write_page('linkedin', list_url)
 
 def get_job_id(job_url:str):
     """Extracts and returns the job ID from the job URL."""
     splitted = job_url.split('?')
     return splitted[0].split('-')[-1]
 
-def get_job_description_request(job_id):
-    """Generates the URL for the job description and makes a request to retrieve it."""
+# job cards are matched by their class tokens, the other classes of a card change with the site's styling
+job_card_filter = ('div', ('base-card', 'job-search-card'))
+
+def parse_list_page(list_html):
+    """Parses only the job cards of the job listings page."""
+    return html_parsers.parse(list_html, only=job_card_filter)
+
+def get_job_cards(list_soup):
+    """Returns all job cards of the job listings page."""
+    return html_parsers.find_all(list_soup, job_card_filter[0], classes=job_card_filter[1])
+
+def get_card_job_id(card):
+    """Returns the job ID of the job card."""
+    card_url = html_parsers.get_attr(html_parsers.find(card, 'a', {'data-tracking-control-name' : 'public_jobs_jserp-result_search-card'}), 'href')
+    return get_job_id(card_url)
+
+def get_page_job_ids(list_soup):
+    """Returns job IDs of all job cards of the job listings page."""
+    return [get_card_job_id(card) for card in get_job_cards(list_soup)]
+
+def get_card_info(card):
+    """
+    Returns the fields of the job card: job_id, job_title, company_name, location (as written on the card)
+    and published_date. A field that can't be retrieved is None.
+    """
+    def get_card_text(tag:str, attrs:dict=None, classes:tuple=()):
+        element = html_parsers.find(card, tag, attrs, classes)
+        return html_parsers.get_text(element).strip() if element else None
+
+    time_element = html_parsers.find(card, 'time')
+    published_date = html_parsers.get_attr(time_element, 'datetime') if time_element else None
+    return {
+        'job_id': get_card_job_id(card),
+        'job_title': get_card_text('span', classes=('sr-only',)),
+        'company_name': get_card_text('a', {'data-tracking-control-name':"public_jobs_jserp-result_job-search-card-subtitle"}),
+        'location': get_card_text('span', classes=('job-search-card__location',)),
+        'published_date': published_date.strip() if published_date else None
+    }
+
+def get_job_description_url(job_id):
+    """Generates the URL for the job description."""
     descr_url = 'https://www.linkedin.com/jobs-guest/jobs/api/jobPosting/'
-    return jobs_scraping.make_request(descr_url+job_id)
+    return descr_url + job_id
+
+# the element of the description page that contains the text of the description
+description_container = ("div", {"class":"show-more-less-html__markup show-more-less-html__markup--clamp-after-5 relative overflow-hidden"})
 
-def scrape_description(descr_response):
-    """Extracts the job description from the response."""
-    descr_html = descr_response.text
-    descr_soup = BeautifulSoup(descr_html, 'html.parser')
-    description = descr_soup.find("div", {"class":"show-more-less-html__markup show-more-less-html__markup--clamp-after-5 relative overflow-hidden"}).text
-    return description
+def parse_description(descr_html):
+    """Parses the description page once and returns its jobs_scraping.DescriptionRecord."""
+    return jobs_scraping.parse_description(descr_html, description_container)
 
 def parse_location(location:str):
     """Parses the location string to get the voivodship."""
@@ -135,103 +167,116 @@ def parse_location(location:str):
         return location
     
     
-def parse_jobs(list_soup : BeautifulSoup, scraped_ids:list, jobs_info:dict):
-    """Parses job listings and extracts job details."""
+def parse_jobs(list_soup, scraped_ids:job_id_index.JobIdIndex, jobs_info:jobs_scraping.JobBuffer):
+    """Parses job listings, requests their descriptions concurrently and extracts job details."""
 
-    # jobs info's lists must have the same lengths because the DataFrame object will be created from it
-    # so if some data can't be retrieved, None value is appended to a jobs_info's list
-    job_cards = list_soup.find_all('div', {'class':"base-card relative w-full hover:no-underline focus:no-underline base-card--link base-search-card base-search-card--link job-search-card"})
+    # if some data can't be retrieved, None value is appended to a jobs_info's list
+    job_cards = get_job_cards(list_soup)
     cur_date = get_current_date()
-    for card in job_cards:
-        # get job_id
-        card_url =  card.find('a', {'data-tracking-control-name' : 'public_jobs_jserp-result_search-card'})['href']
-        job_id = get_job_id(card_url)
-        if job_id in scraped_ids: # if this job_id is already in database, then skip it
+    cards_info = {} # job_id -> fields retrieved from the job card
+    card_infos = [get_card_info(card) for card in job_cards]
+    # all cards of the page are checked at once
+    new_ids = set(scraped_ids.filter_new([card_info['job_id'] for card_info in card_infos]))
+    for card_info in card_infos:
+        job_id = card_info['job_id']
+        if job_id not in new_ids or job_id in cards_info: # if this job_id is already in database, then skip it
+            continue
+        job_title = card_info['job_title']
+        if job_title and not jobs_scraping.identify_analyst_job(job_title): # if this is not data job, skip it
             continue
-        # get job_title
-        try:
-            job_title = card.find('span', {"class":"sr-only"}).get_text().strip()
-        except AttributeError:
-            job_title = None
-        else:
-            if not jobs_scraping.identify_analyst_job(job_title): # if this is not data job, skip it
-                continue
-        jobs_info['job_id'].append(job_id)
-        
-        position =  jobs_scraping.identify_position(job_title)
-        jobs_info['position'].append(position)
-
-        job_title = job_title[:99]
-        jobs_info['job_title'].append(job_title)
-
-        # get company_name
-        try:
-            company_name = card.find('a', {'data-tracking-control-name':"public_jobs_jserp-result_job-search-card-subtitle"}).get_text().strip()
-        except AttributeError:
-            company_name = None 
-        company_name = company_name[:99]
-        jobs_info['company_name'].append(company_name)
-
-        # get location
-        try:
-            location = card.find('span', {'class':"job-search-card__location"}).get_text().strip()
-        except AttributeError:
-            location = None 
-        parsed_location = parse_location(location)
-        jobs_info['location'].append( parsed_location[:99])
-
-        #get published_time
-        try:
-            published_date = card.find('time')['datetime'].strip()
-        except AttributeError:
-            published_date = None
-
-        jobs_info['published_date'].append(published_date)
-        jobs_info['scraped_date'].append(cur_date)
-
-        # parse job descriptions
-
-        # get description page
-        time.sleep(random.uniform(0.5, 1.5))
-        descr_response = get_job_description_request(job_id)
-        if descr_response.status_code != 200: # if description can't be accessed, append None
-            jobs_info['description'].append(None)
-        else:
-            jobs_info['is_polish_required'].append(jobs_scraping.identify_polish(descr_response.content))
 
-            description = scrape_description(descr_response)
-            jobs_info['description'].append(description.strip())
+        position = jobs_scraping.identify_position(job_title) if job_title else None
+        company_name = card_info['company_name']
+        location = parse_location(card_info['location']) if card_info['location'] else None
+
+        cards_info[job_id] = {
+            'job_id': job_id,
+            'job_title': job_title[:99] if job_title else None,
+            'company_name': company_name[:99] if company_name else None,
+            'location': location[:99] if location else None,
+            'published_date': card_info['published_date'],
+            'scraped_date': cur_date,
+            'position': position
+        }
+    # if several workers split the scrape, only the jobs claimed by this worker are processed
+    claimed_ids = crawl_frontier.claim('job', 'linkedin', list(cards_info))
+    cards_info = {job_id: cards_info[job_id] for job_id in claimed_ids}
+    progress.add_found('linkedin', len(cards_info))
+
+    # parse job descriptions
+
+    # get description pages, they are requested concurrently and processed as soon as they arrive
+    descr_urls = {get_job_description_url(job_id): job_id for job_id in cards_info}
+    for descr_url, descr_response in fetch_engine.iterate_all(descr_urls, 'linkedin'):
+        job_id = descr_urls[descr_url]
+        row = dict(cards_info[job_id])
+
+        if descr_response is None or descr_response.status_code != 200: # if description can't be accessed, append None
+            row['is_polish_required'] = None
+            row['description'] = None
+        else:
+            description = parse_description(descr_response.content)
+            row['is_polish_required'] = description.is_polish_required
+            row['description'] = description.text
         
-        jobs_info['source'].append('linkedin')
+        row['source'] = 'linkedin'
+        jobs_scraping.append_job(jobs_info, row)
+        checkpoint_journal.write_job('linkedin', row)
         scraped_ids.append(job_id)
+        crawl_frontier.complete('job', 'linkedin', [job_id])
+        progress.add_done('linkedin')
         
         
-def main():
-    """Main function to run the scraping process and save the data."""
-    
-    conn, cur = db.connect_to_db()
-    db.create_table_if_not_exists(conn, cur)
-    # get ids of already scraped jobs from a database to avoid duplicating data
-    scraped_ids = db.select_job_ids(conn, cur, 'linkedin')
-    cur.close()
-    conn.close()
+def scrape(scraped_ids:job_id_index.JobIdIndex, resume:bool=False):
+    """
+    Scrapes new jobs (the ones that are not in scraped_ids) into jobs_info and returns it.
+    Every parsed job is written to the journal, if resume is True, the journal of the previous run is replayed first.
+    """
+    done_pages = set()
+    if resume:
+        done_pages = jobs_info.restore(scraped_ids)
+    checkpoint_journal.open_journal('linkedin', resume)
 
     time_period = choose_time_period()
  
-    lists_generator = get_next_list(time_period, 1) # creating  generator that yields lists of jobs
+    lists_generator = get_next_list(time_period, done_pages=done_pages) # creating  generator that yields lists of jobs
     print("linkedin scraping is started\n")
-    for list_html in lists_generator:
-        if not list_html:
-            continue
-        list_soup = BeautifulSoup(list_html, 'html.parser')
-        parse_jobs(list_soup, scraped_ids, jobs_info)
+    try:
+        for list_soup in lists_generator:
+            parse_jobs(list_soup, scraped_ids, jobs_info)
+    finally:
+        crawl_frontier.flush_completed()
+        checkpoint_journal.close_journal('linkedin')
 
     cur_date = get_current_date()
     # writing current date of scraping to a file
     with open(get_prev_dir(os.getcwd()) + "scraping_dates\\" + 'linkedin_last_scraping_date.txt', 'w') as f:
         f.write(cur_date)
     print("linkedin scraping is finished")
-    # transforms jobs_info to a DataFrame object, then save it as csv file
-    pandas_csv.save_data(jobs_info) 
+    return jobs_info
+
+def main():
+    """Main function to run the scraping process and save the data."""
+    parser = argparse.ArgumentParser(description="Scrapes jobs from LinkedIn")
+    parser.add_argument('--resume', action='store_true', help="continue the run that crashed or was interrupted")
+    args = parser.parse_args()
+    
+    conn, cur = db.connect_to_db()
+    db.create_table_if_not_exists(conn, cur)
+    # get ids of already scraped jobs from a database to avoid duplicating data
+    scraped_ids = job_id_index.load(conn, cur, 'linkedin')
+    cur.close()
+    conn.close()
 
-main()
+    # jobs are appended to the csv file in batches while scraping
+    jobs_info.set_sink(pandas_csv)
+    scrape(scraped_ids, args.resume)
+    proxy_manager.print_summary()
+    response_cache.print_stats()
+    # saves the jobs that aren't saved yet to the csv file
+    jobs_info.flush()
+    # the jobs are saved, so the journal isn't needed anymore
+    checkpoint_journal.close_journal('linkedin', clear=True)
+
+if __name__ == '__main__':
+    main()
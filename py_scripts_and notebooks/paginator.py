@@ -0,0 +1,78 @@
+from collections import deque
+
+import jobs_scraping
+import fetch_engine
+
+# number of list pages that are requested ahead of the page being parsed
+default_prefetch = 3
+# results are considered exhausted after this number of list pages in a row that can't be accessed
+max_failed_pages = 3
+
+
+def is_exhausted(page_ids:set, seen_ids:set, html:str, end_markers:tuple):
+    """
+    Identifies if the page means the end of results:
+    it has no jobs, all its jobs were on previous pages (sites repeat the last page) or it has a "no more results" marker.
+    """
+    if not page_ids or page_ids <= seen_ids:
+        return True
+    return any(marker in html for marker in end_markers)
+
+def iterate_pages(page_urls, parse_page, get_ids, request_func=None, prefetch:int=default_prefetch, end_markers:tuple=(),
+                  on_page_done=None, on_page_released=None):
+    """
+    Yields parsed list pages in order, while the next prefetch pages are being requested in the background.
+    parse_page(html) returns the parsed page, get_ids(parsed_page) returns job IDs of the page.
+    page_urls can be endless, pages are requested until the end of results is detected,
+    then the pages that are not requested yet are cancelled.
+    on_page_done(url) is called after the page is processed by the caller (or it's the end of results),
+    on_page_released(url) is called for pages that can't be accessed or are cancelled.
+    """
+    request_func = request_func or jobs_scraping.make_request
+    page_urls = iter(page_urls)
+    futures = deque()
+
+    def request_next_page():
+        url = next(page_urls, None)
+        if url:
+            futures.append((url, fetch_engine.executor.submit(fetch_engine.run_request, request_func, url)))
+
+    for i in range(prefetch + 1):
+        request_next_page()
+
+    seen_ids = set()
+    failed_pages = 0
+    try:
+        while futures:
+            url, future = futures.popleft()
+            request_next_page()
+            try:
+                response = future.result()
+            except Exception as e:
+                print(f"list page request failed: {e}")
+                response = None
+            if response is None or response.status_code != 200:
+                if on_page_released:
+                    on_page_released(url)
+                failed_pages += 1
+                if failed_pages >= max_failed_pages:
+                    break
+                continue
+            failed_pages = 0
+
+            parsed_page = parse_page(response.text)
+            page_ids = set(get_ids(parsed_page))
+            if is_exhausted(page_ids, seen_ids, response.text, end_markers):
+                if on_page_done:
+                    on_page_done(url)
+                break
+            seen_ids.update(page_ids)
+            yield parsed_page
+            if on_page_done:
+                on_page_done(url)
+    finally:
+        # requests that are already running can't be stopped, but they are not waited for
+        for url, future in futures:
+            future.cancel()
+            if on_page_released:
+                on_page_released(url)
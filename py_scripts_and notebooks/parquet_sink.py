@@ -0,0 +1,238 @@
+import datetime
+import os
+import re
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Scraped jobs are written as a Parquet dataset partitioned by source and scraped date:
+# data/jobs/source=<source>/scraped_date=<date>/<fragment>.parquet. Every save adds a fragment with typed columns,
+# so readers load only the columns they need and skip the partitions that don't match their filters.
+# Small fragments of the same partition are merged by compact().
+# Fragment names start with their write sequence (nanoseconds since the epoch, increasing within a process),
+# so compact() orders them by it, file modification times change when fragments are copied between machines.
+default_dataset = os.path.join(os.pardir, 'data', 'jobs')
+
+# columns of the scraped jobs (the partition columns are stored in the directory names)
+schema = pa.schema([
+    ('job_id', pa.string()),
+    ('job_title', pa.string()),
+    ('company_name', pa.string()),
+    ('location', pa.string()),
+    ('published_date', pa.date32()),
+    ('is_polish_required', pa.bool_()),
+    ('position', pa.string()),
+    ('description', pa.string())
+])
+partitioning = ds.partitioning(pa.schema([('source', pa.string()), ('scraped_date', pa.date32())]), flavor='hive')
+
+# a partition with more fragments than this is merged by compact()
+max_fragments = 1
+
+sequence_pattern = re.compile(r'^(?:part|compacted)-(\d{20})-')
+last_sequence = 0
+sequence_lock = threading.Lock()
+
+
+def to_date(value):
+    """Converts a date object or a "<year>-<month>-<day>" string (the formats of the scrapers) into a date, None if it isn't a date."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date(*map(int, str(value)[:10].split('-')))
+    except (TypeError, ValueError):
+        return None
+
+def to_table(d):
+    """Converts jobs_info (a dict of lists or a DataFrame) into a table with the dataset's columns and types."""
+    df = pd.DataFrame(d).astype(object)
+    # missing values are None or 'None' in the scrapers' output
+    df = df.where(df.notna() & (df != 'None'), None)
+    for column in ('published_date', 'scraped_date'):
+        # dates repeat a lot, so every distinct value is converted once
+        dates = {value: to_date(value) for value in df[column].dropna().unique()}
+        df[column] = [dates.get(value) for value in df[column]]
+    # booleans are strings in a CSV file with missing values
+    df['is_polish_required'] = df['is_polish_required'].replace({'True': True, 'False': False})
+    columns = {field.name: pa.array(df[field.name] if field.name in df else [None] * len(df), type=field.type, from_pandas=True)
+               for field in schema}
+    columns['source'] = pa.array(df['source'], type=pa.string())
+    columns['scraped_date'] = pa.array(df['scraped_date'], type=pa.date32())
+    return pa.table(columns)
+
+def get_next_sequence():
+    """Returns the write sequence of a new fragment: the current time in nanoseconds, greater than the previous one."""
+    global last_sequence
+    with sequence_lock:
+        last_sequence = max(last_sequence + 1, time.time_ns())
+        return last_sequence
+
+def get_sequence(path:str):
+    """Returns the write sequence of the fragment, fragments written before it was in their names get their modification time."""
+    match = sequence_pattern.match(os.path.basename(path))
+    return int(match.group(1)) if match else int(os.path.getmtime(path) * 1e9)
+
+def save_data(d, dataset_dir:str=None):
+    """
+    Adds the jobs (jobs_info of a scraper) to the dataset as new fragments, one per partition.
+    It's a replacement of pandas_csv.save_data.
+    """
+    dataset_dir = dataset_dir or default_dataset
+    table = to_table(d)
+    print(f"Saving {table.num_rows} rows to", dataset_dir)
+    if table.num_rows == 0:
+        return
+    ds.write_dataset(table, dataset_dir, format='parquet', partitioning=partitioning,
+                     basename_template=f"part-{get_next_sequence():020d}-{uuid.uuid4().hex}-{{i}}.parquet",
+                     existing_data_behavior='overwrite_or_ignore')
+
+def get_dataset(dataset_dir:str=None):
+    """Returns the dataset of the scraped jobs."""
+    return ds.dataset(dataset_dir or default_dataset, format='parquet', partitioning=partitioning)
+
+def get_filter(sources:list=None, since:datetime.date=None, until:datetime.date=None):
+    """Returns the filter of jobs from the sources scraped between since and until (inclusive), None means no filter."""
+    conditions = []
+    if sources:
+        conditions.append(ds.field('source').isin(sources))
+    if since:
+        conditions.append(ds.field('scraped_date') >= pa.scalar(since, pa.date32()))
+    if until:
+        conditions.append(ds.field('scraped_date') <= pa.scalar(until, pa.date32()))
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+    return condition
+
+def load_data(columns:list=None, sources:list=None, since:datetime.date=None, until:datetime.date=None, dataset_dir:str=None):
+    """
+    Returns the jobs as a DataFrame. Only the columns are read (all columns by default),
+    and only partitions of the sources scraped between since and until are opened.
+    """
+    table = get_dataset(dataset_dir).to_table(columns=columns, filter=get_filter(sources, since, until))
+    return table.to_pandas()
+
+def iterate_data(columns:list=None, sources:list=None, since:datetime.date=None, until:datetime.date=None,
+                 dataset_dir:str=None, batch_size:int=100000):
+    """Yields the jobs as DataFrames of up to batch_size rows, like load_data."""
+    scanner = get_dataset(dataset_dir).scanner(columns=columns, filter=get_filter(sources, since, until), batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+def compact(dataset_dir:str=None):
+    """
+    Merges the fragments of every partition that has more than max_fragments of them into one file.
+    The merged file is written before the fragments are deleted, so the jobs are never lost.
+    Returns the number of merged partitions.
+    """
+    dataset_dir = dataset_dir or default_dataset
+    merged = 0
+    for directory, subdirs, files in os.walk(dataset_dir):
+        # fragments are merged in the order they were written, so the latest copy of a job is kept
+        sequences = {f: get_sequence(os.path.join(directory, f)) for f in files if f.endswith('.parquet')}
+        fragments = sorted(sequences, key=lambda f: (sequences[f], f))
+        if len(fragments) <= max_fragments:
+            continue
+        table = pa.concat_tables([pq.read_table(os.path.join(directory, f), schema=schema) for f in fragments])
+        # duplicates come from runs that were resumed after a crash
+        table = table.take(pd.Series(table.column('job_id').to_pandas()).drop_duplicates(keep='last').index.to_numpy())
+        # the merged file keeps the sequence of its latest fragment, so fragments written after it are newer
+        temp_path = os.path.join(directory, f"compacted-{sequences[fragments[-1]]:020d}-{uuid.uuid4().hex}.parquet.tmp")
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, temp_path[:-len('.tmp')])
+        for f in fragments:
+            os.remove(os.path.join(directory, f))
+        merged += 1
+    return merged
+
+
+def benchmark(num_rows:int=200000, num_runs:int=30):
+    """
+    Compares reading all jobs from one CSV file with reading only the columns of the transformation step
+    and only the latest runs from the dataset, on synthetic jobs with long descriptions saved by num_runs runs.
+    """
+    import contextlib
+    import io
+    import tempfile
+
+    import pandas_csv
+
+    day = datetime.date(2024, 1, 1)
+    sources = ['linkedin', 'indeed', 'pracuj']
+    df = pd.DataFrame({
+        'job_id': [str(i) for i in range(num_rows)],
+        'job_title': 'Data Analyst',
+        'company_name': 'Acme',
+        'location': 'Warszawa, mazowieckie',
+        'published_date': [str(day + datetime.timedelta(days=i * num_runs // num_rows)) for i in range(num_rows)],
+        'scraped_date': [day + datetime.timedelta(days=i * num_runs // num_rows) for i in range(num_rows)],
+        'is_polish_required': [i % 3 == 0 for i in range(num_rows)],
+        'position': 'junior',
+        'source': [sources[i % 3] for i in range(num_rows)],
+        'description': [f"Requirements: SQL, Excel, Power BI, English. Job number {i}. " * 40 for i in range(num_rows)]
+    })
+    columns = ['job_id', 'location', 'company_name', 'position', 'source', 'scraped_date']
+    since = day + datetime.timedelta(days=num_runs - 7)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_path = os.path.join(temp_dir, 'uncleaned_jobs.csv')
+        dataset_dir = os.path.join(temp_dir, 'jobs')
+        for run in range(num_runs):
+            run_rows = df[df['scraped_date'] == day + datetime.timedelta(days=run)]
+            # a run saves its jobs in several batches
+            for batch_start in range(0, len(run_rows), max(1, len(run_rows) // 4)):
+                batch = run_rows.iloc[batch_start:batch_start + max(1, len(run_rows) // 4)]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    pandas_csv.save_data(batch.to_dict('list'), csv_path)
+                    save_data(batch, dataset_dir)
+
+        start = time.perf_counter()
+        csv_df = pd.read_csv(csv_path, index_col=None)
+        csv_df = csv_df[pd.to_datetime(csv_df['scraped_date']).dt.date >= since][columns]
+        csv_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        full_df = load_data(dataset_dir=dataset_dir)
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pruned_df = load_data(columns, since=since, dataset_dir=dataset_dir)
+        pruned_time = time.perf_counter() - start
+
+        fragments_before = sum(len(files) for _, _, files in os.walk(dataset_dir))
+        compact(dataset_dir)
+        fragments_after = sum(len(files) for _, _, files in os.walk(dataset_dir))
+        csv_size = os.path.getsize(csv_path)
+        dataset_size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(dataset_dir) for f in files)
+
+    print(f"CSV: {csv_size / 2**20:.0f} MB, read and filter {csv_time:.2f} s ({len(csv_df)} jobs of the last week)")
+    print(f"Parquet: {dataset_size / 2**20:.0f} MB, all columns {full_time:.2f} s ({len(full_df)} jobs), "
+          f"{len(columns)} columns of the last week {pruned_time:.2f} s ({len(pruned_df)} jobs), "
+          f"speed-up {csv_time / pruned_time:.0f}x")
+    print(f"compaction: {fragments_before} fragments -> {fragments_after}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manages the Parquet dataset of scraped jobs")
+    parser.add_argument('command', choices=['compact', 'convert', 'benchmark'],
+                        help="compact: merge small fragments, convert: add jobs from a CSV file, benchmark: compare with CSV")
+    parser.add_argument('--dataset', default=default_dataset, help="directory of the dataset")
+    parser.add_argument('--csv', help="CSV file with scraped jobs (for convert)")
+    parser.add_argument('--rows', type=int, default=200000, help="number of synthetic jobs (for benchmark)")
+    args = parser.parse_args()
+    if args.command == 'compact':
+        print(f"{compact(args.dataset)} partitions are compacted")
+    elif args.command == 'convert':
+        for chunk in pd.read_csv(args.csv, index_col=None, chunksize=100000, dtype={'job_id': str}):
+            save_data(chunk, args.dataset)
+    else:
+        benchmark(args.rows)
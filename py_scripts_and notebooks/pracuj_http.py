@@ -0,0 +1,145 @@
+import datetime
+import re
+
+import jobs_scraping
+import json_payloads
+import paginator
+
+# it.pracuj.pl is a Next.js site: listing and offer pages are rendered on the server
+# and embed all their data as JSON in the __NEXT_DATA__ script, so they can be read without a browser.
+# Fields are taken by paths (see json_payloads), a path that disappears is reported as schema drift
+# and the offer is scraped with Selenium instead. A listing page without its offer data (or with offer groups
+# whose URLs can't be found) can't be read over HTTP, which is different from a search without offers:
+# its page has the data with an empty list of offer groups.
+# Both backends take the job ID from the offer URL (".../<title>-<city>,oferta,<offer id>"),
+# so IDs of jobs scraped over HTTP and with Selenium are the same and are deduplicated against each other.
+
+next_data_pattern = re.compile(r'<script[^>]*\bid="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+offer_id_pattern = re.compile(r',oferta,(\d+)')
+queries_path = ('props', 'pageProps', 'dehydratedState', 'queries')
+
+# a group of offers on a listing page (one offer per location of the job)
+offer_group_schema = {
+    'job_title': ('jobTitle',),
+    'published': ('lastPublicated',),
+    'offer_url': ('offers', 0, 'offerAbsoluteUri')
+}
+# an offer page
+offer_schema = {
+    'job_title': ('attributes', 'jobTitle'),
+    'company_name': ('attributes', 'displayEmployerName'),
+    'location': ('attributes', 'workplaces', 0, 'displayAddress'),
+    'position_levels': ('attributes', 'employment', 'positionLevels'),
+    'text_sections': ('textSections',)
+}
+# the section of the offer that is scraped as its description
+requirements_section = 'requirements-expected'
+
+# maximum number of listing pages
+max_pages = 100
+
+
+def get_next_data(html:str):
+    """Returns the decoded __NEXT_DATA__ JSON of the page or None if the page doesn't have it."""
+    match = next_data_pattern.search(html)
+    return json_payloads.decode(match.group(1)) if match else None
+
+def get_query_data(next_data:dict, key:str):
+    """Returns the data of the page's query that contains key, None if there is no such query."""
+    for query in json_payloads.get_path(next_data, queries_path) or []:
+        data = json_payloads.get_path(query, ('state', 'data'))
+        if isinstance(data, dict) and key in data:
+            return data
+    return None
+
+def get_offer_id(offer_url:str):
+    """Returns the offer ID at the end of the offer URL, None if the URL doesn't have it."""
+    match = offer_id_pattern.search(offer_url) if isinstance(offer_url, str) else None
+    return match.group(1) if match else None
+
+def format_date(timestamp:str):
+    """Converts the ISO timestamp of the offer into the date format of the Selenium scraper ("<year>-<month>-<day>")."""
+    try:
+        date = datetime.date.fromisoformat(timestamp[:10])
+    except ValueError:
+        return None
+    return f'{date.year}-{date.month}-{date.day}'
+
+def parse_list_page(list_html:str):
+    """
+    Returns (group_ids, offers) of the listing page: IDs of all its offer groups
+    and the offers of data analyst jobs as {job_id: [job_title, offer_url, published_date]}.
+    group_ids is None if the page can't be read: it has no offer data or the format of its offer groups changed.
+    """
+    next_data = get_next_data(list_html)
+    data = get_query_data(next_data, 'groupedOffers') if next_data else None
+    if data is None or not isinstance(data['groupedOffers'], list):
+        return None, {}
+    group_ids = []
+    offers = {}
+    for group in data['groupedOffers']:
+        group_ids.append(group.get('groupId'))
+        fields = json_payloads.extract(group, 'pracuj offer group', offer_group_schema)
+        job_id = get_offer_id(fields['offer_url'])
+        if not job_id:
+            if fields['offer_url']:
+                json_payloads.count_drift('pracuj offer group', 'offer_id')
+            return None, {}
+        # If the title doesn't contain keywords that indicate Data Analyst job, skip it
+        if not isinstance(fields['job_title'], str) or not jobs_scraping.identify_analyst_job(fields['job_title']):
+            continue
+        published_date = format_date(fields['published']) if isinstance(fields['published'], str) else None
+        offers[job_id] = [fields['job_title'].strip(), fields['offer_url'], published_date]
+    return group_ids, offers
+
+def get_all_cards_info(base_url:str):
+    """
+    Returns the offers from all listing pages in the format of pracuj_scraping.get_all_cards_info
+    ({} if the search has no offers), or None if the listing can't be read over HTTP.
+    Next pages are requested while the current one is being parsed, until the results are exhausted.
+    """
+    list_urls = [base_url] + [f"{base_url}?pn={page}" for page in range(2, max_pages + 1)]
+    cards_info = {}
+    # the page that ends the results isn't yielded by the paginator, so every parsed page is recorded here
+    is_read = []
+
+    def parse_page(list_html:str):
+        page = parse_list_page(list_html)
+        is_read.append(page[0] is not None)
+        return page
+
+    # a page without data analyst jobs isn't the end of results, so the end is detected by all offer groups,
+    # an unreadable page has none of them, so it ends the pages too
+    for group_ids, offers in paginator.iterate_pages(list_urls, parse_page, lambda page: page[0] or []):
+        cards_info.update(offers)
+    # nothing is read if the first page can't be requested
+    return cards_info if is_read and all(is_read) else None
+
+def get_section_text(section:dict):
+    """Returns the text of the offer's section."""
+    if section.get('plainText'):
+        return section['plainText']
+    return '\n'.join(element for element in section.get('textElements') or [] if isinstance(element, str))
+
+def parse_offer(offer_html:str):
+    """
+    Returns the fields of the offer page: job_title, company_name, location, position and description,
+    or None if the page has no offer data or its title or requirements can't be found.
+    """
+    next_data = get_next_data(offer_html)
+    data = get_query_data(next_data, 'attributes') if next_data else None
+    if not data:
+        return None
+    fields = json_payloads.extract(data, 'pracuj offer', offer_schema)
+    description = next((get_section_text(section) for section in fields['text_sections'] or []
+                        if section.get('sectionType') == requirements_section), None)
+    if not fields['job_title'] or not description:
+        return None
+    position_levels = [level.get('name') for level in fields['position_levels'] or [] if level.get('name')]
+    return {
+        'job_title': fields['job_title'].strip(),
+        'company_name': fields['company_name'].strip() if fields['company_name'] else None,
+        'location': fields['location'].strip() if fields['location'] else None,
+        'position': ', '.join(position_levels),
+        'description': description.strip()
+    }
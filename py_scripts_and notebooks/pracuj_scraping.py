@@ -1,11 +1,20 @@
-import time
-import random 
+import argparse
 import datetime
 import os
 import pandas_csv as p_c 
 import job_database as db
+import job_id_index
 
 import jobs_scraping
+import keyword_classifier
+import rate_limiter
+import progress
+import crawl_frontier
+import checkpoint_journal
+import fetch_engine
+import pracuj_http
+import json_payloads
+import webdriver_pool
 
 from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
@@ -16,20 +25,8 @@ from selenium.common import exceptions
 from typing import Tuple, Union
 
 
-# Dictionary to store job information
-# from jobs_info dictionary DataFrame will be created
-jobs_info = {
-        'job_id': [],
-        'job_title': [],
-        'company_name': [],
-        'location': [],
-        'published_date': [],
-        'scraped_date': [],
-        'is_polish_required':  [],
-        'position': [],
-        'source' : [],
-        'description': []
-    }
+# Scraped jobs, they are saved to the sink in batches (see jobs_scraping.JobBuffer)
+jobs_info = jobs_scraping.JobBuffer('pracuj')
 
 
 # Locators for various elements on the job listing pages
@@ -46,6 +43,14 @@ company_name_loc = (By.CSS_SELECTOR, 'h2[data-test="text-employerName"]')
 position_loc = (By.CSS_SELECTOR, 'li[data-scroll-id="position-levels"]')
 location_loc = (By.CSS_SELECTOR, 'li[data-scroll-id="workplaces"]')
 requrements_loc = (By.CSS_SELECTOR, 'div[data-scroll-id="requirements-expected-1"]')
+# fields of the offer page and their locators
+offer_field_locs = {
+    'job_title': job_name_loc,
+    'company_name': company_name_loc,
+    'location': location_loc,
+    'position': position_loc,
+    'description': requrements_loc
+}
 
 def wait_presence(driver:webdriver, css_locator:Tuple[By, str], sec:int=5, all:Union[int, bool]=1):
     """Waits for the presence of elements located by css_locator within sec seconds."""
@@ -77,9 +82,9 @@ def get_href(card):
     except exceptions.NoSuchElementException:
         return None
     
-def get_job_id(card):
-    """Returns the job ID from the job card."""
-    return card.get_attribute("data-test-offerid")
+def get_job_id(card, href:str):
+    """Returns the job ID: the offer ID of the href (as in pracuj_http), or the one of the job card if the href has none."""
+    return pracuj_http.get_offer_id(href) or card.get_attribute("data-test-offerid")
 
 def get_date(card):
     """Returns the job's published date from the job card."""
@@ -95,8 +100,9 @@ def get_date(card):
 def get_cards(driver):
     """Returns the list of job cards from the page."""
     default_cards = wait_presence(driver, card_loc1)
+    # promoted cards can be rendered after the default ones (the page is loaded eagerly), so they are waited for a short time
     try:
-        promoted_cards = wait_presence(driver, card_loc2, sec=2)
+        promoted_cards = wait_presence(driver, card_loc2, sec=1)
     except exceptions.TimeoutException:
         promoted_cards = []
     return promoted_cards + default_cards
@@ -105,10 +111,6 @@ def get_card_title(card):
     """Returns the title of the job from the job card."""
     return card.find_element(*card_title_loc).text.strip()
     
-def rand_sleep(start, end):
-    """Sleeps for a random amount of time between start and end seconds."""
-    time.sleep(random.uniform(start, end))
-
 def get_cards_info(cards:list):    
     """Extracts information from the job cards."""
 
@@ -126,6 +128,7 @@ def get_cards_info(cards:list):
         # and the job card must be clicked to view all of them.
         if 'lokaliz' in loc_text:
             # tries to click the job card 10 times and retrieve the job description link.
+            href = None
             for i in range(10):
                 card.click()
                 try:
@@ -134,60 +137,26 @@ def get_cards_info(cards:list):
                     continue
                 else:
                     break
-            d[get_job_id(card)] = [card_title, href, get_date(card)]
         else:
-            d[get_job_id(card)] = [card_title, get_href(card), get_date(card)]
+            href = get_href(card)
+        d[get_job_id(card, href)] = [card_title, href, get_date(card)]
     return d
 
-def identify_polish_description(desc_text):
-    """Identifies if the job description contains Polish letters."""
-    polish_letters = "żśćźóąęłń"
-    for letter in polish_letters:
-        if letter in desc_text.lower():
-            return True
-    else:
-        return False
-
 def identify_polish(desc_text):
     """Identifies if the job requires Polish language"""
-    is_polish_description = identify_polish_description(desc_text)
-    is_english_required = False
-    
-    if 'Polish' in desc_text  \
-        or 'język polski' in desc_text.lower() or 'polskiego' in desc_text.lower():
-        return True
-    
-    if "English" in desc_text or "angielski" in desc_text.lower():
-        is_english_required = True
-    # If the description is written in Polish and English is not mentioned, it implies that Polish is required.
-    if is_polish_description and not is_english_required:
-            return True
-    return False
+    # the whole requirements text is checked as a single bullet point
+    is_polish_required, _ = jobs_scraping.identify_languages([desc_text], jobs_scraping.identify_polish_description(desc_text))
+    return is_polish_required
 
 def formate_position(position_str):
     """Formats the position string to standardize it."""
-    position_str = position_str.lower()
-    if "praktykant" in position_str or "stażysta" in position_str or "trainee" in position_str:
-        return "intern"
-    elif "junior" in position_str or "asystent" in position_str:
-        return "junior"
-    elif 'mid' in position_str:
-        return 'middle'
-    elif "senior" in position_str or "expert" in position_str or 'ekspert' in position_str or "kierownik" in position_str\
-        or "koordynator" in position_str or "menedżer" in position_str or 'manager' in position_str\
-        or "dyrektor" in position_str or 'director' in position_str:
-        return "senior"
-    else:
-        return position_str
+    return keyword_classifier.pracuj_positions.classify(position_str, default=position_str.lower())
 
 
-def get_from_description(driver, locator):
-    """Returns the text content of an element located by locator when description page is opened"""
-    sec=5
-    if locator == requrements_loc:
-        sec=10
-    element = wait_presence(driver, locator, sec=sec, all=False)
-    return element.text.strip()
+def get_offer_fields(driver):
+    """Returns the fields of the opened offer page, waits for all of them at once."""
+    elements = webdriver_pool.wait_all(driver, list(offer_field_locs.values()), sec=10)
+    return {field: element.text.strip() for field, element in zip(offer_field_locs, elements)}
 
 def get_all_cards_info(driver):
     """Returns information from all job cards on all pages."""
@@ -196,22 +165,10 @@ def get_all_cards_info(driver):
     while next_exists:
         cards = get_cards(driver)
         cards_info.update(get_cards_info(cards))
-        rand_sleep(1, 10)
+        rate_limiter.acquire(driver.current_url) # wait until the site allows the next page
         next_exists = go_next_page(driver)
     return cards_info
 
-def make_lists_same_length():
-    """Ensures all lists in jobs_info have the same length by truncating longer lists."""
-    global jobs_info
-    lens = []
-    for key in jobs_info:
-        lens.append(len(jobs_info[key]))
-    min_len = min(lens)
-    for key in jobs_info:
-        jobs_info[key] = jobs_info[key][:min_len]
-
-
-
 def get_prev_dir(dir:str):
     '''Returns previous directory path relatively to dir path'''
     prev_dir = dir[:dir.rfind("\\")+1]
@@ -255,53 +212,159 @@ def choose_time_period():
     else:
         return ''
     
-def main():
-    """Main function to run the scraping process and save the data."""
-    base_url = "https://it.pracuj.pl/praca/data%20analyst;kw/" + choose_time_period()
-    with open(get_prev_dir(os.getcwd()) + 'scraping_dates\\pracuj_last_scraping_date.txt', 'w') as f:
-        f.write(str(datetime.date.today()))
-    driver = webdriver.Chrome()
-    driver.maximize_window()
-    driver.get(base_url)
-
-    accept_cookies(driver)
-
-    cards_info = get_all_cards_info(driver)
-    # get ids of already scraped jobs from a database to avoid duplicating data
-    conn, cur = db.connect_to_db()
-    scraped_ids = db.select_job_ids(conn, cur, 'pracuj')
+def make_row(job_id:str, published_date:str, job_title:str, company_name:str, location:str, position:str, description:str):
+    """Returns the job's row of jobs_info from the fields of its offer page."""
+    return {
+        'job_id': job_id,
+        'published_date': published_date,
+        'scraped_date': datetime.date.today(),
+        'job_title': job_title,
+        'company_name': company_name,
+        'location': location,
+        'position': formate_position(position),
+        'description': description.strip(),
+        'is_polish_required': identify_polish(description),
+        'source': 'pracuj'
+    }
 
-    print("pracuj scraping is started")
-    for job_id in cards_info:
+def add_job(job_id:str, row:dict):
+    """Appends the scraped job to jobs_info and the journal."""
+    jobs_scraping.append_job(jobs_info, row)
+    checkpoint_journal.write_job('pracuj', row)
+    crawl_frontier.complete('job', 'pracuj', [job_id])
 
-        if job_id in scraped_ids:
+def start_driver(base_url:str):
+    """Starts the browser on the first listing page and accepts cookies."""
+    driver = webdriver_pool.start_driver()
+    driver.get(base_url)
+    accept_cookies(driver)
+    return driver
+
+def scrape_offers_http(cards_info:dict, job_ids:list):
+    """
+    Requests the offer pages concurrently and reads the jobs from their embedded JSON as soon as they arrive.
+    Returns IDs of the jobs that can't be read this way, they are scraped with Selenium.
+    """
+    offer_urls = {cards_info[job_id][1]: job_id for job_id in job_ids}
+    failed_ids = []
+    for offer_url, response in fetch_engine.iterate_all(offer_urls, 'pracuj'):
+        job_id = offer_urls[offer_url]
+        offer = pracuj_http.parse_offer(response.text) if response is not None and response.status_code == 200 else None
+        if offer is None:
+            failed_ids.append(job_id)
             continue
+        add_job(job_id, make_row(job_id, cards_info[job_id][2], **offer))
+        progress.add_done('pracuj')
+    return failed_ids
+
+def read_offer(driver, offer_url:str):
+    """
+    Opens the offer page in the browser and returns its fields.
+    Returns None if they don't appear in time, other errors are handled by the browser pool.
+    """
+    rate_limiter.acquire(offer_url)
+    try:
+        driver.get(offer_url)
+        fields = get_offer_fields(driver)
+    except exceptions.TimeoutException:
+        # a page that didn't load in time is a sign of throttling
+        rate_limiter.report(offer_url, timeout=True)
+        return None
+    except Exception:
+        rate_limiter.report(offer_url)
+        raise
+    rate_limiter.report(offer_url, 200)
+    return fields
+
+def scrape_offers_selenium(cards_info:dict, job_ids:list, num_workers:int=None):
+    """Opens the offer pages in a pool of headless browsers and reads the jobs from them."""
+    offer_urls = {cards_info[job_id][1]: job_id for job_id in job_ids}
+    for offer_url, fields in webdriver_pool.map_items(list(offer_urls), read_offer, num_workers):
+        job_id = offer_urls[offer_url]
+        # the job is appended to jobs_info only when all its fields are retrieved
+        if fields is None:
+            print(f"An error occured while parsing {offer_url}, the job is skipped")
+            crawl_frontier.release('job', 'pracuj', [job_id])
+        else:
+            add_job(job_id, make_row(job_id, cards_info[job_id][2], **fields))
+        progress.add_done('pracuj')
+
+def scrape(scraped_ids:job_id_index.JobIdIndex, resume:bool=False, backend:str='http', num_workers:int=None):
+    """
+    Scrapes new jobs (the ones that are not in scraped_ids) into jobs_info and returns it.
+    Every parsed job is written to the journal, if resume is True, the journal of the previous run is replayed first.
+    With the 'http' backend pages are read over plain HTTP, and Selenium is started only for the pages
+    that can't be read this way. The 'selenium' backend scrapes everything in the browser.
+    Offer pages are opened in num_workers headless browsers at the same time (one per core by default).
+    """
+    if resume:
+        jobs_info.restore(scraped_ids)
+    checkpoint_journal.open_journal('pracuj', resume)
 
-        try:
-            driver.get(cards_info[job_id][1])
-            jobs_info['job_id'].append(job_id)
-            jobs_info['published_date'].append(cards_info[job_id][2])
-            jobs_info['scraped_date']= datetime.date.today()
-
-            jobs_info['job_title'].append(get_from_description(driver, job_name_loc))
-            jobs_info['company_name'].append(get_from_description(driver, company_name_loc))
-            jobs_info['location'].append(get_from_description(driver, location_loc))
-            position = formate_position(get_from_description(driver, position_loc))
-            jobs_info['position'].append(position)
-
-            description = get_from_description(driver, requrements_loc)
-            jobs_info['description'].append(description.strip())
-            jobs_info['is_polish_required'].append(identify_polish(description))
-            jobs_info['source'].append('pracuj')
-            rand_sleep(1, 7)
-        except:
-            print(f"An error occured... Saving {len(jobs_info['job_id'])} jobs to csv")
-            make_lists_same_length()
+    base_url = "https://it.pracuj.pl/praca/data%20analyst;kw/" + choose_time_period()
+    with open(get_prev_dir(os.getcwd()) + 'scraping_dates\\pracuj_last_scraping_date.txt', 'w') as f:
+        f.write(str(datetime.date.today()))
+    driver = None
+    try:
+        cards_info = pracuj_http.get_all_cards_info(base_url) if backend == 'http' else None
+        # a search without offers is read over HTTP too, it doesn't start the browser
+        read_over_http = cards_info is not None
+        if not read_over_http: # the listing pages can't be read over HTTP (or the Selenium backend is chosen)
+            driver = start_driver(base_url)
+            cards_info = get_all_cards_info(driver)
+            # the listing browser isn't needed for the offers
+            driver.quit()
+            driver = None
+        new_ids = scraped_ids.filter_new(list(cards_info))
+        # if several workers split the scrape, only the jobs claimed by this worker are processed
+        new_ids = crawl_frontier.claim('job', 'pracuj', new_ids)
+        progress.add_found('pracuj', len(new_ids))
+
+        print("pracuj scraping is started")
+        if read_over_http:
+            new_ids = scrape_offers_http(cards_info, new_ids)
+            if new_ids:
+                print(f"{len(new_ids)} pracuj offers can't be read over HTTP, they are scraped with Selenium")
+        if new_ids:
+            scrape_offers_selenium(cards_info, new_ids, num_workers)
+    finally:
+        if driver:
+            driver.quit()
+        crawl_frontier.flush_completed()
+        checkpoint_journal.close_journal('pracuj')
     print("pracuj scraping is finished")
     # writing current date of scraping to a file
     with open(get_prev_dir(os.getcwd()) + "scraping_dates\\" + 'pracuj_last_scraping_date.txt', 'w') as f:
         f.write(str(datetime.date.today()))
-    # transforms jobs_info to a DataFrame object, then save it as csv file
-    p_c.save_data(jobs_info)
+    return jobs_info
+    
+def main():
+    """Main function to run the scraping process and save the data."""
+    parser = argparse.ArgumentParser(description="Scrapes jobs from Pracuj")
+    parser.add_argument('--resume', action='store_true', help="continue the run that crashed or was interrupted")
+    parser.add_argument('--backend', choices=['http', 'selenium'], default='http',
+                        help="read pages over plain HTTP (Selenium is used only for pages that can't be read) or only with Selenium")
+    parser.add_argument('--workers', type=int, default=webdriver_pool.default_workers,
+                        help="number of headless browsers that open offer pages at the same time")
+    parser.add_argument('--full-page-load', action='store_true',
+                        help="load pages with all images, fonts and third-party scripts (the fast profile is used by default)")
+    args = parser.parse_args()
+    webdriver_pool.set_fast_profile(not args.full_page_load)
+
+    # get ids of already scraped jobs from a database to avoid duplicating data
+    conn, cur = db.connect_to_db()
+    scraped_ids = job_id_index.load(conn, cur, 'pracuj')
+    cur.close()
+    conn.close()
+
+    # jobs are appended to the csv file in batches while scraping
+    jobs_info.set_sink(p_c)
+    scrape(scraped_ids, args.resume, args.backend, args.workers)
+    json_payloads.print_stats()
+    # saves the jobs that aren't saved yet to the csv file
+    jobs_info.flush()
+    # the jobs are saved, so the journal isn't needed anymore
+    checkpoint_journal.close_journal('pracuj', clear=True)
     
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
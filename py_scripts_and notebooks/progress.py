@@ -0,0 +1,51 @@
+import threading
+import time
+
+# source -> {'found': int, 'done': int, 'started': float, 'finished': float or None}
+# 'found' is the number of new jobs found so far, 'done' is the number of processed ones
+progress = {}
+progress_lock = threading.Lock()
+
+
+def start(source:str):
+    """Starts tracking the progress of the source."""
+    with progress_lock:
+        progress[source] = {'found': 0, 'done': 0, 'started': time.time(), 'finished': None}
+
+def get_source_progress(source:str):
+    """Returns the progress of the source, starting to track it if needed."""
+    if source not in progress:
+        progress[source] = {'found': 0, 'done': 0, 'started': time.time(), 'finished': None}
+    return progress[source]
+
+def add_found(source:str, number:int):
+    """Adds the number of new jobs found by the source."""
+    with progress_lock:
+        get_source_progress(source)['found'] += number
+
+def add_done(source:str, number:int=1):
+    """Adds the number of jobs processed by the source."""
+    with progress_lock:
+        get_source_progress(source)['done'] += number
+
+def finish(source:str):
+    """Marks the source as finished."""
+    with progress_lock:
+        get_source_progress(source)['finished'] = time.time()
+
+def get_report():
+    """Returns the progress report of every source: processed jobs, speed and the estimated time left."""
+    lines = []
+    now = time.time()
+    with progress_lock:
+        for source, p in progress.items():
+            elapsed = (p['finished'] or now) - p['started']
+            speed = p['done'] / elapsed if elapsed else 0
+            line = f"{source}: {p['done']}/{p['found']} jobs, {speed * 60:.1f} jobs/min"
+            if p['finished']:
+                line += f", finished in {elapsed:.0f} s"
+            elif speed:
+                # only jobs that are found so far are taken into account
+                line += f", ETA {(p['found'] - p['done']) / speed:.0f} s"
+            lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,176 @@
+import atexit
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# statistics of proxies are kept between runs in this file
+stats_file = 'proxy_stats.json'
+
+# a proxy is quarantined after this number of failures in a row
+failure_threshold = 3
+# quarantine time in seconds, it's doubled every time a proxy fails a re-probe
+quarantine_time = 300
+max_quarantine_time = 3600
+# number of the latest latencies kept for every proxy
+latency_window = 50
+# statistics of a proxy for a domain are taken into account after this number of requests
+min_domain_requests = 3
+
+# backoff before the next attempt (in seconds) grows exponentially with the attempt number
+backoff_base = 0.5
+max_backoff = 30
+
+# proxy -> statistics of the proxy, see new_stats()
+stats = {}
+stats_lock = threading.Lock()
+
+
+def new_stats():
+    """Returns empty statistics of a proxy."""
+    return {
+        'successes': 0,
+        'failures': 0,
+        'bans': 0,
+        'consecutive_failures': 0,
+        'latencies': [],
+        'quarantined_until': 0,
+        'quarantine_time': quarantine_time,
+        'domains': {} # domain -> {'successes': int, 'failures': int, 'bans': int}
+    }
+
+def load_stats(proxies:list):
+    """
+    Loads statistics of proxies from stats_file.
+    Proxies that are not in the file (or not in the proxies list anymore) start with empty statistics.
+    """
+    try:
+        with open(stats_file, 'r') as f:
+            saved_stats = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        saved_stats = {}
+    with stats_lock:
+        stats.clear()
+        for proxy in proxies or []:
+            stats[proxy] = {**new_stats(), **saved_stats.get(proxy, {})}
+
+def save_stats():
+    """Writes statistics of proxies to stats_file."""
+    with stats_lock:
+        if not stats:
+            return
+        with open(stats_file, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+atexit.register(save_stats)
+
+
+def get_domain(url:str):
+    """Returns the domain of the url, or None if url is None."""
+    return urlsplit(url).netloc if url else None
+
+def is_captcha(response):
+    """Identifies if the response is a captcha page instead of the requested one."""
+    return b'captcha' in response.content[:20000].lower()
+
+def is_ban(response):
+    """Identifies if the response means that the proxy is banned or throttled by the site."""
+    return response.status_code in (403, 429) or is_captcha(response)
+
+def get_success_rate(successes:int, failures:int, bans:int):
+    """Returns the smoothed success rate, so new proxies get a fair chance to be chosen."""
+    return (successes + 1) / (successes + failures + 2 * bans + 2)
+
+def get_score(proxy:str, domain:str=None):
+    """Returns the health score of the proxy for the domain: the more, the better."""
+    s = stats[proxy]
+    score = get_success_rate(s['successes'], s['failures'], s['bans'])
+    domain_stats = s['domains'].get(domain)
+    if domain_stats and sum(domain_stats.values()) >= min_domain_requests:
+        score *= get_success_rate(domain_stats['successes'], domain_stats['failures'], domain_stats['bans'])
+    latencies = s['latencies']
+    mean_latency = sum(latencies) / len(latencies) if latencies else 1
+    return score / (1 + mean_latency)
+
+def choose_proxy(url:str=None):
+    """
+    Returns a random proxy, proxies with higher health score for the url's domain are chosen more often.
+    Quarantined proxies are skipped until their quarantine ends, then they are re-probed.
+    If all proxies are quarantined, the one whose quarantine ends first is returned.
+    """
+    domain = get_domain(url)
+    now = time.time()
+    with stats_lock:
+        if not stats:
+            return None
+        available = [proxy for proxy in stats if stats[proxy]['quarantined_until'] <= now]
+        if not available:
+            return min(stats, key=lambda proxy: stats[proxy]['quarantined_until'])
+        weights = [get_score(proxy, domain) for proxy in available]
+        return random.choices(available, weights=weights)[0]
+
+def get_domain_stats(proxy:str, url:str):
+    """Returns statistics of the proxy for the url's domain, creating them if needed."""
+    return stats[proxy]['domains'].setdefault(get_domain(url), {'successes': 0, 'failures': 0, 'bans': 0})
+
+def add_latency(proxy:str, latency:float):
+    """Adds the latency to the latest latencies of the proxy."""
+    latencies = stats[proxy]['latencies']
+    latencies.append(round(latency, 3))
+    del latencies[:-latency_window]
+
+def report_success(proxy:str, url:str, latency:float):
+    """Records a successful request through the proxy and closes its circuit breaker."""
+    with stats_lock:
+        if proxy not in stats:
+            return
+        s = stats[proxy]
+        s['successes'] += 1
+        s['consecutive_failures'] = 0
+        s['quarantine_time'] = quarantine_time
+        get_domain_stats(proxy, url)['successes'] += 1
+        add_latency(proxy, latency)
+
+def report_failure(proxy:str, url:str, ban:bool=False, latency:float=None):
+    """
+    Records a failed request through the proxy.
+    After failure_threshold failures in a row the proxy is quarantined,
+    every next failure after the quarantine doubles the quarantine time.
+    """
+    with stats_lock:
+        if proxy not in stats:
+            return
+        s = stats[proxy]
+        key = 'bans' if ban else 'failures'
+        s[key] += 1
+        get_domain_stats(proxy, url)[key] += 1
+        if latency is not None:
+            add_latency(proxy, latency)
+        s['consecutive_failures'] += 1
+        if s['consecutive_failures'] == failure_threshold:
+            s['quarantined_until'] = time.time() + s['quarantine_time']
+        elif s['consecutive_failures'] > failure_threshold: # failed re-probe after the quarantine
+            s['quarantine_time'] = min(s['quarantine_time'] * 2, max_quarantine_time)
+            s['quarantined_until'] = time.time() + s['quarantine_time']
+
+def get_backoff(attempt:int):
+    """Returns the number of seconds to wait before the next attempt (exponential backoff with jitter)."""
+    return random.uniform(0, min(backoff_base * 2 ** attempt, max_backoff))
+
+def get_latency_percentile(percentile:float=95):
+    """Returns the latency percentile of the latest requests through all proxies."""
+    with stats_lock:
+        latencies = sorted(latency for s in stats.values() for latency in s['latencies'])
+    if not latencies:
+        return None
+    return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+def print_summary():
+    """Prints the health of every proxy."""
+    now = time.time()
+    with stats_lock:
+        for proxy, s in stats.items():
+            state = 'quarantined' if s['quarantined_until'] > now else 'available'
+            print(f"{proxy}: {s['successes']} successes, {s['failures']} failures, {s['bans']} bans, {state}")
+    print(f"p95 latency: {get_latency_percentile(95)} s")
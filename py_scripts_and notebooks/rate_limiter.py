@@ -0,0 +1,101 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+# requests per second allowed at the start of a run for every domain
+initial_rates = {
+    'www.linkedin.com': 1.0,
+    'pl.indeed.com': 0.3,
+    'it.pracuj.pl': 0.3
+}
+default_rate = 0.5
+# the rate never goes beyond these limits
+min_rate = 0.05
+max_rates = {
+    'www.linkedin.com': 5.0,
+    'pl.indeed.com': 2.0,
+    'it.pracuj.pl': 2.0
+}
+default_max_rate = 3.0
+
+# AIMD: the rate grows by increase_step after every successful request
+# and is multiplied by decrease_factor after every 429/403/timeout or captcha page
+increase_step = 0.02
+decrease_factor = 0.5
+throttle_status_codes = (403, 429)
+
+# number of requests that can be made in a row without waiting
+burst = 2
+
+# if True, requests through every proxy are also limited separately (with the same rates)
+per_proxy = False
+
+# (domain, proxy) -> {'rate': float, 'tokens': float, 'updated': float}
+# proxy is None for the bucket of the whole domain
+buckets = {}
+buckets_lock = threading.Lock()
+
+
+def get_domain(url:str):
+    """Returns the domain of the url."""
+    return urlsplit(url).netloc
+
+def get_bucket(key:tuple):
+    """Returns the token bucket for the key, creating it if needed."""
+    if key not in buckets:
+        buckets[key] = {
+            'rate': initial_rates.get(key[0], default_rate),
+            'tokens': burst,
+            'updated': time.monotonic()
+        }
+    return buckets[key]
+
+def get_keys(url:str, proxy:str=None):
+    """Returns keys of all buckets that limit the request to the url through the proxy."""
+    domain = get_domain(url)
+    if per_proxy and proxy:
+        return [(domain, None), (domain, proxy)]
+    return [(domain, None)]
+
+def take_token(key:tuple):
+    """Takes a token from the bucket if there is one, otherwise returns the number of seconds to wait for it."""
+    bucket = get_bucket(key)
+    now = time.monotonic()
+    bucket['tokens'] = min(burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+    bucket['updated'] = now
+    if bucket['tokens'] >= 1:
+        bucket['tokens'] -= 1
+        return 0
+    return (1 - bucket['tokens']) / bucket['rate']
+
+def acquire(url:str, proxy:str=None):
+    """Blocks until a request to the url (through the proxy) is allowed by the rate limits."""
+    for key in get_keys(url, proxy):
+        while True:
+            with buckets_lock:
+                wait = take_token(key)
+            if not wait:
+                break
+            time.sleep(wait)
+
+def report(url:str, status_code:int=None, timeout:bool=False, proxy:str=None, throttled:bool=False):
+    """
+    Adapts the rates for the url's domain (and the proxy) to the result of the request:
+    increases them additively after a successful (200 or 304) request,
+    decreases them multiplicatively after 429/403, a timeout or a block page the site served instead (throttled=True).
+    """
+    throttled = throttled or timeout or status_code in throttle_status_codes
+    if not throttled and status_code not in (200, 304):
+        return
+    with buckets_lock:
+        for key in get_keys(url, proxy):
+            bucket = get_bucket(key)
+            if throttled:
+                bucket['rate'] = max(min_rate, bucket['rate'] * decrease_factor)
+            else:
+                bucket['rate'] = min(max_rates.get(key[0], default_max_rate), bucket['rate'] + increase_step)
+
+def get_rate(url:str):
+    """Returns the current number of allowed requests per second for the url's domain."""
+    with buckets_lock:
+        return get_bucket((get_domain(url), None))['rate']
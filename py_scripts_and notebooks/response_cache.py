@@ -0,0 +1,184 @@
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# set to False to always go to the network
+enabled = True
+cache_dir = os.path.join(os.pardir, 'cache', 'responses')
+# when the cache grows beyond this size (in bytes), the least recently used responses are deleted
+max_size = 500 * 1024 * 1024
+
+hour = 3600
+day = 24 * hour
+# time to live of cached responses for every class of urls, the first matching pattern is used
+ttls = [
+    (re.compile(r'linkedin\.com/jobs-guest/jobs/api/jobPosting/'), 7 * day), # LinkedIn job description
+    (re.compile(r'indeed\.com/viewjob'), 7 * day), # Indeed job description
+    (re.compile(r'linkedin\.com/jobs-guest/jobs/api/seeMoreJobPostings/'), 6 * hour), # LinkedIn list page
+    (re.compile(r'indeed\.com/jobs\?'), 6 * hour), # Indeed list page
+]
+default_ttl = 6 * hour
+
+# the counters are changed by the threads of fetch_engine, so they have their own lock
+# (cache_lock is held while files are written)
+stats = {'hits': 0, 'misses': 0, 'revalidations': 0, 'stores': 0, 'evictions': 0}
+stats_lock = threading.Lock()
+
+cache_lock = threading.Lock()
+cache_size = None # total size of cached files, calculated on the first write
+
+
+def count(counter:str):
+    """Adds one to the counter of stats."""
+    with stats_lock:
+        stats[counter] += 1
+
+def normalize_url(url:str):
+    """Returns the url with lowercase scheme and host, sorted query parameters and without fragment."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+def get_path(url:str):
+    """Returns the path of the file where the response for the url is cached."""
+    key = hashlib.sha1(normalize_url(url).encode()).hexdigest()
+    return os.path.join(cache_dir, key[:2], key + '.pkl')
+
+def get_ttl(url:str):
+    """Returns the time to live of the cached response for the url in seconds."""
+    for pattern, ttl in ttls:
+        if pattern.search(url):
+            return ttl
+    return default_ttl
+
+def is_fresh(entry:dict):
+    """Identifies if the cached response can be used without going to the network."""
+    return time.time() - entry['fetched_at'] < get_ttl(entry['url'])
+
+def load_entry(url:str):
+    """Returns the cached entry for the url, or None if there is no such entry."""
+    path = get_path(url)
+    try:
+        with open(path, 'rb') as f:
+            entry = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    os.utime(path) # the modification time of a file is the time of its last use
+    return entry
+
+def to_response(entry:dict):
+    """Creates a requests.Response object from the cached entry."""
+    response = requests.models.Response()
+    response.status_code = entry['status_code']
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    response._content = entry['content']
+    response.encoding = entry['encoding']
+    response.url = entry['url']
+    return response
+
+def get(url:str):
+    """
+    Returns (response, stale_entry) pair.
+    If a fresh response for the url is cached, it's returned and stale_entry is None.
+    Otherwise response is None and stale_entry is the expired entry (if any) that can be revalidated.
+    """
+    if not enabled:
+        return None, None
+    entry = load_entry(url)
+    if entry and is_fresh(entry):
+        count('hits')
+        return to_response(entry), None
+    count('misses')
+    return None, entry
+
+def get_conditional_headers(entry:dict):
+    """Returns headers that ask the server to answer 304 if the cached response is still valid."""
+    if not entry:
+        return {}
+    headers = {}
+    if entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def write_entry(entry:dict):
+    """Writes the entry to the cache and evicts the least recently used entries if the cache is too big."""
+    global cache_size
+    path = get_path(entry['url'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with cache_lock:
+        if cache_size is None:
+            cache_size = sum(size for _, size, _ in scan_cache())
+        old_size = os.path.getsize(path) if os.path.isfile(path) else 0
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        cache_size += os.path.getsize(path) - old_size
+        if cache_size > max_size:
+            evict()
+
+def put(url:str, response):
+    """Caches the successful response for the url."""
+    if not enabled or response.status_code != 200:
+        return
+    write_entry({
+        'url': url,
+        'status_code': response.status_code,
+        'headers': dict(response.headers),
+        'content': response.content,
+        'encoding': response.encoding,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': time.time()
+    })
+    count('stores')
+
+def revalidated(entry:dict):
+    """Marks the stale entry as fresh after the server answered 304 and returns its response."""
+    entry['fetched_at'] = time.time()
+    write_entry(entry)
+    count('revalidations')
+    return to_response(entry)
+
+def scan_cache():
+    """Yields (path, size, last use time) of every cached file."""
+    if not os.path.isdir(cache_dir):
+        return
+    for subdir in os.scandir(cache_dir):
+        if not subdir.is_dir():
+            continue
+        for file in os.scandir(subdir.path):
+            if file.name.endswith('.pkl'):
+                file_stat = file.stat()
+                yield file.path, file_stat.st_size, file_stat.st_mtime
+
+def evict():
+    """Deletes the least recently used cached files until the cache fits in 90% of max_size."""
+    global cache_size
+    for path, size, _ in sorted(scan_cache(), key=lambda file: file[2]):
+        if cache_size <= max_size * 0.9:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        cache_size -= size
+        count('evictions')
+
+def print_stats():
+    """Prints hit/miss counters of the cache."""
+    with stats_lock:
+        counters = dict(stats)
+    requests_count = counters['hits'] + counters['misses']
+    hit_rate = counters['hits'] / requests_count if requests_count else 0
+    print(f"response cache: {counters['hits']} hits, {counters['misses']} misses ({hit_rate:.0%} hit rate), "
+          f"{counters['revalidations']} revalidations, {counters['stores']} stores, {counters['evictions']} evictions")
@@ -1,14 +1,113 @@
-# Run multiple scraping scripts concurrently
-import subprocess
-
-scripts = ["indeed_scraping.py", "linkedin_scraping.py", "pracuj_scraping.py"]
-
-# Run the scripts concurrently
-processes = []
-for script in scripts:
-    command = ["python", script]
-    processes.append(subprocess.Popen(command))
- 
-# Wait for all processes to finish
-for process in processes:
-    process.wait()
\ No newline at end of file
+# Run all scraping scripts as cooperating tasks in a single process
+# They share the fetch engine (with the global concurrency budget), proxies, rate limits, response cache,
+# one database connection and one output file
+import argparse
+import asyncio
+import traceback
+
+import job_database as db
+import job_id_index
+import pandas_csv
+import parquet_sink
+import fetch_engine
+import html_parsers
+import proxy_manager
+import response_cache
+import json_payloads
+import progress
+import crawl_frontier
+import checkpoint_journal
+import linkedin_scraping
+import indeed_scraping
+import pracuj_scraping
+
+sources = {
+    'linkedin': linkedin_scraping,
+    'indeed': indeed_scraping,
+    'pracuj': pracuj_scraping
+}
+
+# seconds between progress reports
+report_interval = 60
+
+
+def get_scraped_ids(source_names:list, bloom:bool=False):
+    """Returns indexes of already scraped jobs for every source, so the scrapers don't duplicate data."""
+    conn, cur = db.connect_to_db()
+    db.create_table_if_not_exists(conn, cur)
+    scraped_ids = {source: job_id_index.load(conn, cur, source, bloom) for source in source_names}
+    cur.close()
+    conn.close()
+    return scraped_ids
+
+async def report_progress():
+    """Prints the progress of every source every report_interval seconds."""
+    while True:
+        await asyncio.sleep(report_interval)
+        print(progress.get_report() + '\n')
+
+async def run_source(source:str, scraped_ids:job_id_index.JobIdIndex, resume:bool):
+    """Runs the scraper of the source in a worker thread, an error in one source doesn't stop the others."""
+    progress.start(source)
+    try:
+        await asyncio.to_thread(sources[source].scrape, scraped_ids, resume)
+    except Exception:
+        print(f"{source} scraping was ended because of error\n{traceback.format_exc()}")
+    finally:
+        progress.finish(source)
+
+async def run_all(scraped_ids:dict, resume:bool=False):
+    """Runs all scrapers concurrently and reports their progress until they finish."""
+    reporter = asyncio.create_task(report_progress())
+    try:
+        await asyncio.gather(*(run_source(source, scraped_ids[source], resume) for source in scraped_ids))
+    finally:
+        reporter.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs all scrapers in a single process")
+    parser.add_argument('--sources', nargs='+', choices=list(sources), default=list(sources))
+    parser.add_argument('--concurrency', type=int, default=fetch_engine.global_concurrency,
+                        help="maximum number of simultaneous requests for all sources together")
+    parser.add_argument('--html-parser', choices=list(html_parsers.backend_classes),
+                        help="library that parses the pages (html.parser by default, lxml and selectolax are faster)")
+    parser.add_argument('--resume', action='store_true', help="continue the run that crashed or was interrupted")
+    parser.add_argument('--frontier', help="split the scrape with other machines: 'postgres' or 'sqlite:<path>'")
+    parser.add_argument('--crawl-id', help="the same id for all machines that split the scrape (today's date by default)")
+    parser.add_argument('--worker-id', help="unique id of this worker (host name and process id by default)")
+    parser.add_argument('--database', default=db.database_url, help="'postgres' (db_credentials.txt) or 'sqlite:<path>'")
+    parser.add_argument('--output', choices=['csv', 'parquet'], default='csv',
+                        help="append the jobs to data/uncleaned_jobs.csv or add them to the Parquet dataset data/jobs")
+    parser.add_argument('--bloom-index', action='store_true',
+                        help="keep only a Bloom filter of scraped job ids in memory (shared between runs), instead of all ids")
+    args = parser.parse_args()
+
+    db.configure(args.database)
+    fetch_engine.set_global_concurrency(args.concurrency)
+    if args.html_parser:
+        html_parsers.set_backend(args.html_parser)
+    if args.frontier:
+        crawl_frontier.configure(crawl_frontier.create_store(args.frontier), args.crawl_id, args.worker_id)
+    scraped_ids = get_scraped_ids(args.sources, args.bloom_index)
+    # every scraper saves its jobs in batches while scraping, the sink is shared by all of them
+    sink = parquet_sink if args.output == 'parquet' else pandas_csv
+    for source in args.sources:
+        sources[source].jobs_info.set_sink(sink)
+    asyncio.run(run_all(scraped_ids, args.resume))
+    for index in scraped_ids.values():
+        index.save()
+
+    print(progress.get_report())
+    proxy_manager.print_summary()
+    response_cache.print_stats()
+    json_payloads.print_stats()
+    # the jobs that aren't saved yet
+    for source in args.sources:
+        sources[source].jobs_info.flush()
+    # the jobs are saved, so the journals aren't needed anymore
+    for source in args.sources:
+        checkpoint_journal.close_journal(source, clear=True)
+
+
+if __name__ == '__main__':
+    main()
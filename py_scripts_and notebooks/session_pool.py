@@ -0,0 +1,157 @@
+import random
+import socket
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from fake_useragent import UserAgent
+
+# maximum number of sessions (one per proxy) kept open at the same time,
+# the least recently used session is evicted when the limit is exceeded,
+# it's closed when no thread uses it for a request any more
+max_sessions = 20
+# maximum number of keep-alive connections kept by each session for a single host
+pool_maxsize = 10
+
+# Configure socket options for pooled connections to keep them alive longer
+socket_options = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    (socket.SOL_TCP, socket.TCP_KEEPIDLE, 45),
+    (socket.SOL_TCP, socket.TCP_KEEPINTVL, 10),
+    (socket.SOL_TCP, socket.TCP_KEEPCNT, 6)
+]
+
+# requests can decode brotli-compressed responses only if the brotli package is installed
+try:
+    import brotli
+    accept_encoding = 'gzip, deflate, br'
+except ImportError:
+    accept_encoding = 'gzip, deflate'
+
+# UserAgent() loads the user agents database, so it's done once and a set of them is kept in memory
+number_of_profiles = 20
+ua = UserAgent()
+user_agents = [ua.random for i in range(number_of_profiles)]
+
+# extra headers sent by every profile of the same kind
+# headers are important for indeed to avoid getting blocked
+profile_headers = {
+    'default': {},
+    'indeed': {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'pl-PL,pl;q=0.9',
+        'Referer': 'https://www.google.com/',
+        'Upgrade-Insecure-Requests': '1',
+        'DNT': '1',
+        'Cache-Control': 'max-age=0',
+        'Pragma': 'no-cache'
+    }
+}
+
+def create_header_profiles():
+    """Returns preloaded header sets for every kind of profile, one set per user agent."""
+    profiles = {}
+    for kind in profile_headers:
+        profiles[kind] = [
+            {
+                'User-Agent': user_agent,
+                'Accept-Encoding': accept_encoding,
+                'Connection': 'keep-alive',
+                **profile_headers[kind]
+            }
+            for user_agent in user_agents
+        ]
+    return profiles
+
+header_profiles = create_header_profiles()
+
+def get_random_user_agent():
+    """Returns a random user agent string from the preloaded ones."""
+    return random.choice(user_agents)
+
+def get_headers(profile:str='default'):
+    """Returns a random preloaded set of headers of the specified kind."""
+    return random.choice(header_profiles[profile])
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections (direct and proxied) use keep-alive socket options."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs['socket_options'] = socket_options
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+
+# proxy -> requests.Session, ordered from the least to the most recently used
+sessions = OrderedDict()
+# session -> number of requests that are being made with it
+users = {}
+# evicted sessions that are closed when their last request is finished
+evicted = set()
+sessions_lock = threading.Lock()
+
+def create_session(proxy:str):
+    """Creates a session whose connections go through the proxy and are reused between requests."""
+    session = requests.Session()
+    adapter = KeepAliveAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if proxy:
+        session.proxies = {'http': proxy, 'https': proxy}
+    return session
+
+def get_session(proxy:str=None):
+    """
+    Returns the session for the proxy, creating it if needed, and counts it as used until release_session is called.
+    All scrapers share these sessions, so the handshake with a proxy is paid once, not once per request.
+    """
+    with sessions_lock:
+        if proxy in sessions:
+            sessions.move_to_end(proxy)
+            session = sessions[proxy]
+        else:
+            session = create_session(proxy)
+            sessions[proxy] = session
+            if len(sessions) > max_sessions:
+                _, oldest_session = sessions.popitem(last=False)
+                if users.get(oldest_session):
+                    evicted.add(oldest_session) # another thread is making a request with it
+                else:
+                    oldest_session.close()
+        users[session] = users.get(session, 0) + 1
+        return session
+
+def release_session(session:requests.Session):
+    """Counts the request made with the session as finished, an evicted session is closed after its last request."""
+    with sessions_lock:
+        users[session] -= 1
+        if users[session]:
+            return
+        del users[session]
+        if session in evicted:
+            evicted.discard(session)
+            session.close()
+
+@contextmanager
+def use_session(proxy:str=None):
+    """Gives the session for the proxy for the requests made in the with block."""
+    session = get_session(proxy)
+    try:
+        yield session
+    finally:
+        release_session(session)
+
+def close_sessions():
+    """Closes all sessions and their pooled connections."""
+    with sessions_lock:
+        for session in list(sessions.values()) + list(evicted):
+            session.close()
+        sessions.clear()
+        evicted.clear()
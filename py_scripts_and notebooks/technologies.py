@@ -0,0 +1,194 @@
+import collections
+import time
+
+import pandas as pd
+
+import job_database as db
+from keyword_classifier import fold
+
+# Technologies found in job descriptions are canonicalized: different names of the same technology get one name.
+# Names are looked up in the alias index by their folded form (lowercase, without Polish diacritics),
+# so "JIRA", "jira" and "Jira" are the same alias. A batch of jobs is unpivoted with one explode
+# and one map over its distinct names instead of a replace of the whole DataFrame per alias.
+# The number of jobs per technology is kept in the technology_counts table: every loaded batch adds
+# the technologies it inserted into technologies_per_job, in the same transaction, so the counts aren't recomputed per batch.
+# An empty counts table of a database that already has technologies is seeded from the whole table once.
+counts_table = 'technology_counts'
+
+# different names of the same technology
+technology_aliases = {
+    'Power BI': ['PowerBI', 'Microsoft PowerBI', 'MS Power BI', 'MS PowerBI', 'Microsoft Power BI'],
+    'MS Office': ['Microsoft Office', 'Office 365'],
+    'Excel': ['MS Excel', 'Microsoft Excel'],
+    'Python': ['Pandas', 'PyTorch', 'TensorFlow', 'PySpark', 'Matplotlib', 'Seaborn', 'Dash'], # treat python libraries as just python
+    'PowerPoint': ['Power Point', 'MS Power Point', 'MS PowerPoint', 'Microsoft Power Point', 'Microsoft PowerPoint'],
+    'Jira': ['JIRA'],
+    'MS Word': ['Microsoft Word', 'Word']
+}
+
+
+def build_alias_index(aliases:dict):
+    """Returns {folded name: canonical name} of the canonical names and their aliases."""
+    index = {}
+    for technology, names in aliases.items():
+        for name in [technology] + names:
+            index[fold(name)] = technology
+    return index
+
+alias_index = build_alias_index(technology_aliases)
+
+
+def canonical_name(name:str):
+    """Returns the canonical name of the technology, a name that isn't an alias is returned stripped."""
+    name = name.strip()
+    return alias_index.get(fold(name), name)
+
+def canonicalize(technologies:pd.Series):
+    """Replaces the technology names with their canonical names, every distinct name is looked up once."""
+    names = {name: canonical_name(name) for name in technologies.dropna().unique()}
+    return technologies.map(names)
+
+def unpivot(df:pd.DataFrame):
+    """
+    Unpivots the technologies found in job descriptions ("tech1, tech2" in technologies_found)
+    into (job_id, technology) rows, a job without technologies gets a single row with None.
+    Technologies get their canonical names, so duplicates are dropped after that.
+    """
+    technologies = df['technologies_found'].astype(object).str.split(', ')
+    unpivoted = pd.DataFrame({'job_id': df['job_id'], 'technology': technologies}).explode('technology', ignore_index=True)
+    unpivoted['technology'] = canonicalize(unpivoted['technology'])
+    return unpivoted.drop_duplicates(subset=['job_id', 'technology'], ignore_index=True)
+
+
+def create_counts_table_if_not_exists(conn, cur, table_name=counts_table):
+    """Creates the table of the number of jobs per technology."""
+    cur.execute(f'''
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        technology TEXT PRIMARY KEY,
+        job_count INTEGER NOT NULL
+    );''')
+    conn.commit()
+
+def add_counts(conn, cur, rows:list, table_name=counts_table):
+    """
+    Adds the technologies of inserted technologies_per_job rows ((technology,) tuples) to the counts.
+    It doesn't commit, so the counts are committed together with the rows.
+    """
+    counts = collections.Counter(row[0] for row in rows if row[0] is not None)
+    cur.executemany(db.sql(f'''
+    INSERT INTO {table_name} (technology, job_count) VALUES (%s, %s)
+    ON CONFLICT (technology) DO UPDATE SET job_count = {table_name}.job_count + EXCLUDED.job_count;'''),
+                    list(counts.items()))
+
+def seed_counts(conn, cur, table_name='technologies_per_job', counts_name=counts_table):
+    """Recomputes the counts if they are empty while the table has technologies (the counts table is new)."""
+    cur.execute(f"SELECT 1 FROM {counts_name} LIMIT 1;")
+    if cur.fetchone():
+        return
+    cur.execute(f"SELECT 1 FROM {table_name} WHERE technology IS NOT NULL LIMIT 1;")
+    if cur.fetchone():
+        rebuild_counts(conn, cur, table_name, counts_name)
+        print(f"{counts_name} is seeded from {table_name}")
+
+def load(conn, cur, unpivoted, table_name='technologies_per_job', counts_name=counts_table, batch_size:int=db.bulk_batch_size):
+    """
+    Loads unpivoted technologies (a DataFrame or an iterable of DataFrames) into the table and adds
+    the newly inserted ones to the counts, rows that are already in the table aren't counted again.
+    Returns the number of inserted rows.
+    """
+    db.create_technologies_table_if_not_exists(conn, cur, table_name)
+    create_counts_table_if_not_exists(conn, cur, counts_name)
+    seed_counts(conn, cur, table_name, counts_name)
+    return db.bulk_upsert(conn, cur, unpivoted, table_name, update=False, batch_size=batch_size, returning='technology',
+                          on_merged=lambda conn, cur, rows: add_counts(conn, cur, rows, counts_name))
+
+def rebuild_counts(conn, cur, table_name='technologies_per_job', counts_name=counts_table):
+    """Recomputes the counts from the whole table, e.g. after rows were deleted from it."""
+    create_counts_table_if_not_exists(conn, cur, counts_name)
+    try:
+        cur.execute(f"DELETE FROM {counts_name};")
+        cur.execute(f'''
+        INSERT INTO {counts_name} (technology, job_count)
+        SELECT technology, COUNT(*) FROM {table_name} WHERE technology IS NOT NULL GROUP BY technology;''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def get_counts(conn, cur, counts_name=counts_table):
+    """Returns {technology: number of jobs}."""
+    cur.execute(f"SELECT technology, job_count FROM {counts_name};")
+    return dict(cur.fetchall())
+
+
+def benchmark(num_rows:int=200000, num_batches:int=20):
+    """
+    Loads synthetic jobs in num_batches batches into benchmark tables of the configured database
+    and compares adding the counts of every batch with recomputing them after every batch, checks the counts match.
+    """
+    import transformation
+
+    jobs = transformation.make_synthetic_jobs(num_rows)
+    conn, cur = db.connect_to_db()
+    table_name = 'technologies_per_job_benchmark'
+    counts_name = f"{counts_table}_benchmark"
+    db.conflict_keys[table_name] = db.conflict_keys['technologies_per_job']
+    try:
+        for name in (table_name, counts_name):
+            cur.execute(f"DROP TABLE IF EXISTS {name};")
+        conn.commit()
+        batch_rows = max(1, num_rows // num_batches)
+        batches = [jobs.iloc[start:start + batch_rows] for start in range(0, num_rows, batch_rows)]
+        unpivot_time = incremental_time = rebuild_time = 0
+        same = True
+        for batch in batches:
+            start = time.perf_counter()
+            unpivoted = unpivot(batch)
+            unpivot_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            load(conn, cur, unpivoted, table_name, counts_name)
+            incremental_time += time.perf_counter() - start
+            incremental = get_counts(conn, cur, counts_name)
+
+            start = time.perf_counter()
+            rebuild_counts(conn, cur, table_name, counts_name)
+            rebuild_time += time.perf_counter() - start
+            same = same and incremental == get_counts(conn, cur, counts_name)
+        # a batch that is loaded again mustn't change the counts
+        load(conn, cur, unpivot(batches[0]), table_name, counts_name)
+        same = same and incremental == get_counts(conn, cur, counts_name)
+    finally:
+        for name in (table_name, counts_name):
+            cur.execute(f"DROP TABLE IF EXISTS {name};")
+        conn.commit()
+        cur.close()
+        conn.close()
+    print(f"unpivot and canonicalize: {unpivot_time:.2f} s for {num_rows} jobs")
+    print(f"{len(batches)} batches: load with incremental counts {incremental_time:.2f} s, "
+          f"recomputing the counts after every batch {rebuild_time:.2f} s more, {'same' if same else 'DIFFERENT'} counts")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Loads unpivoted technologies into the database and keeps the counts of jobs per technology")
+    parser.add_argument('technologies_csv', nargs='?', help="CSV file with unpivoted technologies (names are canonicalized)")
+    parser.add_argument('--rebuild-counts', action='store_true', help="recompute the counts from the whole table")
+    parser.add_argument('--database', default=db.database_url, help="'postgres' (db_credentials.txt) or 'sqlite:<path>'")
+    parser.add_argument('--benchmark', type=int, metavar='ROWS', help="compare incremental counts with recomputing them on ROWS synthetic jobs instead")
+    args = parser.parse_args()
+    db.configure(args.database)
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        conn, cur = db.connect_to_db()
+        if args.technologies_csv:
+            chunks = pd.read_csv(args.technologies_csv, index_col=None, chunksize=db.bulk_batch_size, dtype={'job_id': str})
+            chunks = (chunk.assign(technology=canonicalize(chunk['technology'].where(chunk['technology'] != 'None')))
+                      .drop_duplicates(subset=['job_id', 'technology']) for chunk in chunks)
+            print(f"{load(conn, cur, chunks)} technologies are loaded")
+        if args.rebuild_counts:
+            rebuild_counts(conn, cur)
+        cur.close()
+        conn.close()
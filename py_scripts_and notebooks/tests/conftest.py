@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the scripts are run from their directory and import each other by name,
+# jobs_scraping reads proxies.txt and searching_parameters.txt from the working directory
+scripts_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, scripts_dir)
+os.chdir(scripts_dir)
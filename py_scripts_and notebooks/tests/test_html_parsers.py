@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+pytest.importorskip('bs4') # html.parser is the reference backend
+
+import html_parsers
+
+pages_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded_pages')
+reference = 'html.parser'
+
+
+@pytest.fixture(scope='module')
+def extractors():
+    return html_parsers.get_extractors()
+
+@pytest.fixture(scope='module')
+def pages(extractors):
+    return {kind: html_parsers.load_recorded_pages(pages_dir, kind) for kind in extractors}
+
+@pytest.fixture(scope='module')
+def expected(pages, extractors):
+    return html_parsers.extract_all(reference, pages, extractors)
+
+@pytest.fixture(autouse=True)
+def default_backend():
+    yield
+    html_parsers.parser = None # the next test starts with the default backend
+
+
+def test_every_kind_is_recorded(pages):
+    assert all(pages.values()), [kind for kind, kind_pages in pages.items() if not kind_pages]
+
+def test_reference_extracts_records(expected):
+    errors = {key: fields for key, fields in expected.items() if isinstance(fields, str)}
+    assert not errors
+    assert all(fields for fields in expected.values())
+
+def test_default_backend_is_html_parser():
+    assert html_parsers.get_parser().name == 'html.parser'
+
+@pytest.mark.parametrize('backend', [backend for backend in html_parsers.backend_classes if backend != reference])
+def test_backend_extracts_the_same_records(backend, pages, extractors, expected):
+    try:
+        html_parsers.create_parser(backend)
+    except ImportError:
+        pytest.skip(f"{backend} isn't installed")
+    assert html_parsers.extract_all(backend, pages, extractors) == expected
+
+def test_linkedin_list_fields(expected):
+    cards = expected['linkedin_list', 'data_analyst_past_week.html']
+    # the promoted learning card isn't a job card
+    assert [card['job_id'] for card in cards] == ['3912345678', '3909876543', '3911112222']
+    assert cards[0] == {
+        'job_id': '3912345678',
+        'job_title': 'Data Analyst',
+        'company_name': 'Acme Polska Sp. z o.o.',
+        'location': 'Warsaw, Mazowieckie, Poland',
+        'published_date': '2024-05-02'
+    }
+    assert cards[2]['job_title'] == 'Senior Data Analyst (R&D)'
+    assert cards[2]['published_date'] is None
+
+def test_indeed_list_job_ids(expected):
+    assert expected['indeed_list', 'data_analyst_start_0.html'] == ['4f2c1a9b8e7d6c5a', '0a1b2c3d4e5f6a7b', '9c8b7a6f5e4d3c2b']
+
+def test_description_languages(expected):
+    linkedin = expected['linkedin_description', '3909876543.html']
+    assert linkedin.is_polish_description and linkedin.is_polish_required and linkedin.is_english_required
+    assert linkedin.text.startswith('Twój zakres obowiązków:')
+    indeed = expected['indeed_description', '4f2c1a9b8e7d6c5a.json']
+    assert indeed.bullets[2] == 'Very good English (C1)'
+    assert indeed.is_english_required
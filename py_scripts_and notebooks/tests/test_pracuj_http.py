@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+# pracuj_http imports the scrapers' shared modules, the test is skipped if their dependencies aren't installed
+pracuj_http = pytest.importorskip('pracuj_http')
+
+pages_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded_pages')
+
+
+def read_page(kind:str, name:str):
+    with open(os.path.join(pages_dir, kind, name), encoding='utf-8') as f:
+        return f.read()
+
+def make_list_page(groups):
+    """Returns a listing page whose __NEXT_DATA__ has the offer groups."""
+    next_data = {'props': {'pageProps': {'dehydratedState': {'queries': [
+        {'state': {'data': {'groupedOffers': groups, 'groupedOffersTotalCount': len(groups)}}}]}}}}
+    return f'<html><body><script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script></body></html>'
+
+
+def test_list_page_job_ids_are_offer_ids_of_urls():
+    group_ids, offers = pracuj_http.parse_list_page(read_page('pracuj_list', 'data_analyst_page_1.html'))
+    assert group_ids == ['g-1003345678', 'g-1003311111', 'g-1003322222']
+    # the Java Developer offer isn't a data analyst job
+    assert offers == {
+        '1003345678': ['Data Analyst', 'https://www.pracuj.pl/praca/data-analyst-warszawa,oferta,1003345678', '2024-5-2'],
+        '1003311111': ['Junior Analityk Danych BI',
+                       'https://www.pracuj.pl/praca/junior-analityk-danych-bi-gdansk,oferta,1003311111', '2024-4-29']
+    }
+
+def test_search_without_offers_is_read():
+    assert pracuj_http.parse_list_page(make_list_page([])) == ([], {})
+
+def test_page_without_offer_data_is_unreadable():
+    assert pracuj_http.parse_list_page('<html><body><div id="__next"></div></body></html>') == (None, {})
+
+def test_offer_group_without_offer_id_is_unreadable():
+    group = {'groupId': 'g-1', 'jobTitle': 'Data Analyst', 'offers': [{'offerUri': 'data-analyst-warszawa'}]}
+    assert pracuj_http.parse_list_page(make_list_page([group])) == (None, {})
+
+@pytest.mark.parametrize('pages, expected', [
+    ([make_list_page([])], {}),
+    ([], None), # the first page can't be requested
+    (['<html></html>'], None)
+])
+def test_all_cards_info_tells_no_offers_from_unreadable_listing(monkeypatch, pages, expected):
+    def iterate_pages(list_urls, parse_page, get_ids):
+        for html in pages:
+            page = parse_page(html)
+            if not get_ids(page):
+                return
+            yield page
+
+    monkeypatch.setattr(pracuj_http.paginator, 'iterate_pages', iterate_pages)
+    assert pracuj_http.get_all_cards_info('https://it.pracuj.pl/praca/data%20analyst;kw/') == expected
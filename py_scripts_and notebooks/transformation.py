@@ -0,0 +1,292 @@
+import datetime
+import os
+import re
+import time
+
+import pandas as pd
+
+import technologies
+
+# Cleaning rules of transformation.ipynb as vectorized pandas operations.
+# Run it as a stage of the pipeline: python transformation.py [input_csv] [output_csv] [--technologies technologies_csv] [--analyze]
+# Scraped jobs don't have is_degree_required and technologies_found, they are added by the description analysis
+# of the notebook (description_analysis, a request to ChatGPT per job), which runs per chunk with --analyze.
+# Large CSV files are processed in chunks. The input can also be the Parquet dataset of parquet_sink
+# (a directory), then only the partitions scraped since --since are read. Jobs of a CSV file are filtered by --since chunk by chunk.
+
+default_input = os.path.join(os.pardir, 'data', 'uncleaned_jobs.csv')
+default_output = os.path.join(os.pardir, 'data', 'cleaned_jobs.csv')
+default_chunksize = 100000
+
+# a location that mentions the voivodship or one of its cities is replaced with the voivodship
+voivodships = {
+    "dolnośląskie": ["wrocław", "wroclaw", "lower silesian", "lower silesia"],
+    "kujawskopomorskie": ["bydgoszcz", "bydgoszcz", "cuyavian-pomeranian"],
+    "lubelskie": ["lublin", "lublin", "lublin"],
+    "lubuskie": ["zielona góra", "zielona gora", "lubusz"],
+    "łódzkie": ["łódź", "lodz", "łódź"],
+    "małopolskie": ["kraków", "krakow", "cracow", "lesser poland"],
+    "mazowieckie": ["warszawa", "warsaw", "masovian"],
+    "opolskie": ["opole"],
+    "podkarpackie": ["rzeszów", "rzeszow", "subcarpathian"],
+    "podlaskie": ["białystok", "bialystok"],
+    "pomorskie": ["gdańsk", "gdansk", "pomeranian"],
+    "śląskie": ["katowice", "katowice", "silesian", "silesia"],
+    "świętokrzyskie": ["kielce", "kielce", "świętokrzyskie"],
+    "warmińskomazurskie": ["olsztyn", "olsztyn", "warmian-masurian"],
+    "wielkopolskie": ["poznań", "poznan", "greater poland"],
+    "zachodniopomorskie": ["szczecin", "szczecin", "west pomeranian"]
+}
+voivodship_patterns = {voivodship: '|'.join(re.escape(name) for name in [voivodship] + cities)
+                       for voivodship, cities in voivodships.items()}
+remote_pattern = 'zdalnie|hybrydowo|remote'
+# characters that are removed from both ends of every word of a location
+location_strip_chars = ", \n\t;."
+
+# company names of jobs from Pracuj end with one of these suffixes
+pracuj_company_suffixes = ["O firmie", "About the company"]
+
+# position values are standardized into 4 groups: intern, junior, middle and senior
+position_replacements = {
+    "experienced": "middle",
+    "manager": "senior",
+    "entry professional": "middle",
+    "professional": "middle",
+    "supervisor": "senior",
+    "intermediate": "middle",
+    "expert": "senior",
+    "entry level": "junior",
+    "lead": "senior",
+    "principal": "senior",
+    "analyst": "middle",
+    "entry": "junior",
+    "mid": "middle",
+    "associate": "middle"
+}
+
+
+def normalize_locations(locations:pd.Series):
+    """
+    Lowercases the locations and standardizes them:
+    remote and hybrid jobs get 'remote', "<postal code> <city>" gets the city,
+    a location with a voivodship or one of its cities gets the voivodship (the first one in voivodships).
+    """
+    locations = locations.astype(object).str.lower()
+    normalized = locations.copy()
+    # rules with lower priority are applied first and overwritten by the ones with higher priority
+    for voivodship, pattern in reversed(voivodship_patterns.items()):
+        normalized[locations.str.contains(pattern, na=False)] = voivodship
+
+    words = locations.str.split()
+    first_word = words.str[0].str.strip(location_strip_chars)
+    is_postal = (words.str.len() == 2) & first_word.str[:1].str.isdigit().fillna(False).astype(bool)
+    normalized[is_postal] = words[is_postal].str[1].str.strip(location_strip_chars)
+
+    normalized[locations.str.contains(remote_pattern, na=False)] = 'remote'
+    return normalized
+
+def normalize_pracuj_locations(locations:pd.Series):
+    """
+    Retrieves the city or the voivodship from Pracuj locations like
+    "company location\\nsłubicka 18, stare miasto, wrocław\\nwrocław, lower silesia": the first part of their last line.
+    """
+    return locations.astype(object).str.split('\n').str[-1].str.split(', ').str[0]
+
+def strip_company_suffixes(company_names:pd.Series, suffixes:list=pracuj_company_suffixes):
+    """Truncates company names that contain one of the suffixes by the length of the first such suffix."""
+    company_names = company_names.astype(object)
+    stripped = company_names.copy()
+    for suffix in reversed(suffixes):
+        has_suffix = company_names.str.contains(suffix, regex=False, na=False)
+        stripped[has_suffix] = company_names[has_suffix].str[:-len(suffix)]
+    return stripped
+
+def normalize_positions(positions:pd.Series):
+    """Standardizes the positions into intern, junior, middle and senior, 'none' becomes None."""
+    positions = positions.astype(object).str.strip().str.lower()
+    positions = positions.replace(position_replacements)
+    return positions.where(positions != 'none', None)
+
+def transform_jobs(df:pd.DataFrame):
+    """Returns the cleaned copy of the scraped jobs DataFrame."""
+    df = df.drop_duplicates(subset='job_id', ignore_index=True)
+    df['location'] = normalize_locations(df['location'])
+    is_pracuj = df['source'] == 'pracuj'
+    df.loc[is_pracuj, 'location'] = normalize_pracuj_locations(df.loc[is_pracuj, 'location'])
+    df.loc[is_pracuj, 'company_name'] = strip_company_suffixes(df.loc[is_pracuj, 'company_name'])
+    df['position'] = normalize_positions(df['position'])
+    return df
+
+def unpivot_technologies(df:pd.DataFrame):
+    """
+    Unpivots the technologies found in job descriptions ("tech1, tech2" in technologies_found)
+    into (job_id, technology) rows with canonical names of the technologies (see technologies.unpivot).
+    """
+    return technologies.unpivot(df)
+
+def is_scraped_since(scraped_dates:pd.Series, since:datetime.date):
+    """Returns the boolean Series of jobs scraped since the date, scraped dates are "<year>-<month>-<day>" strings or dates."""
+    def to_date(value):
+        try:
+            return datetime.date(*map(int, str(value)[:10].split('-')))
+        except (TypeError, ValueError):
+            return None
+    # dates repeat a lot, so every distinct value is checked once
+    is_since = {value: (to_date(value) or datetime.date.min) >= since for value in scraped_dates.dropna().unique()}
+    return scraped_dates.map(is_since).fillna(False).astype(bool)
+
+def analyze_jobs(df:pd.DataFrame):
+    """Adds is_degree_required and technologies_found of the cleaned jobs by analyzing their descriptions, as the notebook does."""
+    import description_analysis as da
+
+    for column in ('is_degree_required', 'technologies_found'):
+        if column not in df:
+            df[column] = pd.Series(dtype=str)
+    da.analyze_descriptions(df)
+    # the analysis fills in missing positions
+    df['position'] = df['position'].str.lower()
+    return df
+
+def transform_csv(input_path:str=default_input, output_path:str=default_output, technologies_path:str=None,
+                  chunksize:int=default_chunksize, since=None, analyze:bool=False):
+    """
+    Cleans the jobs from the input CSV file (or the Parquet dataset directory) chunk by chunk and writes them to the output CSV file.
+    If analyze is True, the descriptions of every chunk are analyzed (see analyze_jobs).
+    If technologies_path is passed and the jobs have technologies_found, unpivoted technologies are written there.
+    If since is passed, only jobs scraped since the date are cleaned: the dataset reads only their partitions
+    and the chunks of a CSV file are filtered.
+    """
+    if os.path.isdir(input_path):
+        import parquet_sink
+        chunks = parquet_sink.iterate_data(since=since, dataset_dir=input_path, batch_size=chunksize)
+    else:
+        # every chunk guesses its types on its own, so IDs are always read as text
+        chunks = pd.read_csv(input_path, index_col=None, chunksize=chunksize, dtype={'job_id': str})
+        if since:
+            chunks = (chunk[is_scraped_since(chunk['scraped_date'], since)] for chunk in chunks)
+    seen_ids = set() # duplicates can be in different chunks
+    rows_count = 0
+    for i, chunk in enumerate(chunks):
+        chunk = chunk[~chunk['job_id'].isin(seen_ids)]
+        seen_ids.update(chunk['job_id'])
+        chunk = transform_jobs(chunk)
+        if analyze:
+            chunk = analyze_jobs(chunk)
+        elif i == 0 and technologies_path and 'technologies_found' not in chunk:
+            print(f"the jobs have no technologies_found, {technologies_path} isn't written: run with --analyze to analyze their descriptions")
+        chunk.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        if technologies_path and 'technologies_found' in chunk:
+            unpivot_technologies(chunk).to_csv(technologies_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        rows_count += len(chunk)
+    print(f"{rows_count} cleaned jobs are saved to {output_path}")
+
+
+def notebook_transform(df:pd.DataFrame):
+    """The row-by-row cleaning of transformation.ipynb, it's the reference for the benchmark."""
+    df = df.drop_duplicates(subset='job_id', ignore_index=True)
+    df.location = df.location.str.lower()
+    for i in df.index:
+        location = df.loc[i, 'location']
+        if not location or type(location) != str:
+            continue
+        if 'zdalnie' in location or 'hybrydowo' in location or 'remote' in location:
+            df.loc[i, 'location'] = 'remote'
+            continue
+        splitted_loc = [s.strip(location_strip_chars) for s in location.split()]
+        if len(splitted_loc) == 2 and splitted_loc[0][:1].isdigit():
+            df.loc[i, 'location'] = splitted_loc[1]
+            continue
+        for voivodship in voivodships:
+            if voivodship in location or any(capital in location for capital in voivodships[voivodship]):
+                df.loc[i, 'location'] = voivodship
+                break
+    for i in df[df['source'] == 'pracuj'].index:
+        location = df.loc[i, 'location']
+        if type(location) == str:
+            df.loc[i, 'location'] = location.split('\n')[-1].split(', ')[0]
+        company_name = df.loc[i, 'company_name']
+        if type(company_name) != str:
+            continue
+        for suffix in pracuj_company_suffixes:
+            if suffix in company_name:
+                df.loc[i, 'company_name'] = company_name[:-len(suffix)]
+                break
+    positions = df.position.str.strip().str.lower()
+    for old, new in position_replacements.items():
+        positions = positions.replace(old, new)
+    df.position = positions.where(positions != 'none', None)
+    return df
+
+def notebook_unpivot(df:pd.DataFrame):
+    """The row-by-row unpivoting of technologies of transformation.ipynb."""
+    splitted_techologies = df.technologies_found.str.split(', ')
+    rows = []
+    for i in splitted_techologies.index:
+        if not isinstance(splitted_techologies[i], list):
+            rows.append((df.loc[i, 'job_id'], None))
+            continue
+        for technology in splitted_techologies[i]:
+            rows.append((df.loc[i, 'job_id'], technology))
+    unpivoted = pd.DataFrame(rows, columns=['job_id', 'technology'])
+    for key in technologies.technology_aliases:
+        for val in technologies.technology_aliases[key]:
+            if val in unpivoted.technology.values:
+                unpivoted.replace(val, key, inplace=True)
+    return unpivoted.drop_duplicates(subset=['job_id', 'technology'], ignore_index=True)
+
+def make_synthetic_jobs(num_rows:int):
+    """Returns a DataFrame of num_rows random jobs with the values the scrapers produce."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    locations = ['Warszawa, mazowieckie', 'Kraków, Lesser Poland, Poland', '00-001 Warszawa', 'Praca zdalna, zdalnie',
+                 'Remote', 'Wrocław', 'company location\nsłubicka 18, stare miasto, wrocław\nwrocław, lower silesia',
+                 'Gdańsk, pomorskie', 'Poland', None, 'Łódź', 'hybrydowo; Poznań']
+    companies = ['Acme', 'Acme SA O firmie', 'Data Corp About the company', None]
+    positions = ['junior', 'Senior ', 'Mid', 'entry level', 'None', 'manager', 'intern', 'lead', None]
+    technologies = ['SQL, Excel', 'Python, Pandas, Power BI', 'MS Excel, PowerBI, Jira', 'JIRA', None, 'Tableau, SQL, Microsoft Word']
+    return pd.DataFrame({
+        'job_id': np.arange(num_rows).astype(str),
+        'location': rng.choice(np.array(locations, dtype=object), num_rows),
+        'company_name': rng.choice(np.array(companies, dtype=object), num_rows),
+        'position': rng.choice(np.array(positions, dtype=object), num_rows),
+        'source': rng.choice(['linkedin', 'indeed', 'pracuj'], num_rows),
+        'technologies_found': rng.choice(np.array(technologies, dtype=object), num_rows)
+    })
+
+def benchmark(num_rows:int=1000000):
+    """Compares the vectorized cleaning with the row-by-row notebook logic on synthetic jobs and checks their results match."""
+    df = make_synthetic_jobs(num_rows)
+    for name, vectorized_func, notebook_func in (('jobs', transform_jobs, notebook_transform),
+                                                ('technologies', unpivot_technologies, notebook_unpivot)):
+        start = time.perf_counter()
+        vectorized = vectorized_func(df.copy())
+        vectorized_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = notebook_func(df.copy())
+        notebook_time = time.perf_counter() - start
+
+        same = vectorized.fillna('').astype(str).equals(expected.fillna('').astype(str))
+        print(f"{name}: notebook {notebook_time:.1f} s, vectorized {vectorized_time:.1f} s, "
+              f"speed-up {notebook_time / vectorized_time:.0f}x, {'same' if same else 'DIFFERENT'} results")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cleans scraped jobs (the rules of transformation.ipynb)")
+    parser.add_argument('input', nargs='?', default=default_input, help="CSV file or Parquet dataset directory with scraped jobs")
+    parser.add_argument('output', nargs='?', default=default_output, help="CSV file for cleaned jobs")
+    parser.add_argument('--technologies', help="CSV file for unpivoted technologies (if jobs have technologies_found)")
+    parser.add_argument('--analyze', action='store_true',
+                        help="find technologies and degree requirements in the descriptions with ChatGPT (OPENAI_API_KEY)")
+    parser.add_argument('--chunksize', type=int, default=default_chunksize, help="number of rows processed at once")
+    parser.add_argument('--since', type=lambda date: datetime.date.fromisoformat(date),
+                        help="clean only jobs scraped since the date (YYYY-MM-DD)")
+    parser.add_argument('--benchmark', type=int, metavar='ROWS', help="compare with the notebook logic on ROWS synthetic jobs instead")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        transform_csv(args.input, args.output, args.technologies, args.chunksize, args.since, args.analyze)
@@ -0,0 +1,195 @@
+import os
+import queue
+import threading
+import traceback
+
+from selenium import webdriver
+from selenium.webdriver.support.ui import WebDriverWait
+
+# psutil measures the memory of the browsers, it's optional: without it workers are restarted only by the number of pages
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Offer pages are processed by a pool of headless browsers. Every worker thread owns one browser
+# and takes offers from a shared queue, results are returned to the calling thread in the order they complete,
+# so the scraper appends them to jobs_info and the journal in one place.
+# A browser that crashed is restarted and its offer is tried once more. Browsers leak memory on long runs,
+# so they are restarted after max_pages pages or when their processes take more than max_memory_mb.
+
+# number of browsers in a pool (one per core by default)
+default_workers = os.cpu_count() or 1
+# pages that one browser opens before it's restarted
+max_pages = 200
+# memory of the browser (driver and all browser processes) after which it's restarted
+max_memory_mb = 1500
+
+# marks the end of the queue for a worker
+stop = object()
+
+# The fast profile: the scrapers read only the text of pages, so pages are considered loaded when their HTML is parsed
+# (eager page load strategy) and images, media, fonts and third-party scripts (analytics, ads, chats) aren't loaded.
+fast_profile = True
+blocked_urls = [
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.mp4', '*.webm', '*.mp3',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*googletagmanager.com*', '*google-analytics.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*facebook.net*', '*connect.facebook.com*', '*hotjar.com*', '*clarity.ms*', '*bing.com/bat*',
+    '*criteo.com*', '*tiktok.com*', '*linkedin.com/px*'
+]
+
+
+def set_fast_profile(enabled:bool):
+    """Turns the fast profile on or off for browsers that are started after it."""
+    global fast_profile
+    fast_profile = enabled
+
+def get_options(browser:str='chrome'):
+    """Returns the options of a headless browser."""
+    options = webdriver.EdgeOptions() if browser == 'edge' else webdriver.ChromeOptions()
+    if fast_profile:
+        options.page_load_strategy = 'eager'
+        # 2 means "block", it stops images even if the URL blocking below misses them
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_argument('--headless=new')
+    # the layout of the sites depends on the window size, so it's the same as in a maximized window
+    options.add_argument('--window-size=1920,1080')
+    options.add_argument('--disable-gpu')
+    # /dev/shm is small in containers, the browser crashes if it's used for shared memory
+    options.add_argument('--disable-dev-shm-usage')
+    return options
+
+def start_driver(browser:str='chrome'):
+    """Starts a headless browser."""
+    if browser == 'edge':
+        driver = webdriver.Edge(options=get_options(browser))
+    else:
+        driver = webdriver.Chrome(options=get_options(browser))
+    if fast_profile:
+        # both browsers are Chromium, requests are blocked through the DevTools protocol
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+    return driver
+
+def wait_all(driver, locators:list, sec:int=10):
+    """
+    Waits until elements of all locators are present (one wait for all of them instead of one wait per locator)
+    and returns them in the order of locators. Raises TimeoutException if some of them don't appear within sec seconds.
+    """
+    def all_present(driver):
+        elements = []
+        for locator in locators:
+            found = driver.find_elements(*locator)
+            if not found:
+                return False
+            elements.append(found[0])
+        return elements
+    return WebDriverWait(driver, sec, poll_frequency=0.1).until(all_present)
+
+def quit_driver(driver):
+    """Quits the browser, a browser that already crashed is ignored."""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def is_alive(driver):
+    """Identifies if the browser still responds."""
+    try:
+        driver.current_url
+    except Exception:
+        return False
+    return True
+
+def get_memory_mb(driver):
+    """Returns the memory of the driver and all its browser processes in MB, None if it can't be measured."""
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / 2**20
+    except (AttributeError, psutil.Error):
+        return None
+
+def needs_restart(driver, pages:int):
+    """Identifies if the browser opened too many pages or takes too much memory."""
+    if pages >= max_pages:
+        return True
+    memory = get_memory_mb(driver)
+    return memory is not None and memory > max_memory_mb
+
+def work(tasks:queue.Queue, results:queue.Queue, process, browser:str):
+    """
+    Takes items from tasks and puts (item, process(driver, item)) into results until it gets stop.
+    The result is None if the item can't be processed.
+    """
+    driver = None
+    pages = 0
+    try:
+        while True:
+            item = tasks.get()
+            if item is stop:
+                break
+            result = None
+            # the second attempt is made only if the browser crashed on the first one
+            for attempt in range(2):
+                try:
+                    if driver is None:
+                        driver = start_driver(browser)
+                        pages = 0
+                    pages += 1
+                    result = process(driver, item)
+                except Exception:
+                    if driver is not None and is_alive(driver):
+                        print(f"An error occured while processing {item}\n{traceback.format_exc()}")
+                        break
+                    print(f"The browser crashed while processing {item}, it's restarted")
+                    if driver is not None:
+                        quit_driver(driver)
+                    driver = None
+                else:
+                    break
+            results.put((item, result))
+            if driver is not None and needs_restart(driver, pages):
+                quit_driver(driver)
+                driver = None
+    finally:
+        if driver is not None:
+            quit_driver(driver)
+
+def map_items(items:list, process, num_workers:int=None, browser:str='chrome'):
+    """
+    Processes items with process(driver, item) in a pool of headless browsers.
+    Yields (item, result) pairs in the order they complete, result is None if the item can't be processed.
+    """
+    num_workers = min(num_workers or default_workers, len(items))
+    if not num_workers:
+        return
+    tasks = queue.Queue()
+    results = queue.Queue()
+    for item in items:
+        tasks.put(item)
+    for i in range(num_workers):
+        tasks.put(stop)
+    workers = [threading.Thread(target=work, args=(tasks, results, process, browser), daemon=True)
+               for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for i in range(len(items)):
+            yield results.get()
+    finally:
+        # if the caller stopped early, the remaining items are dropped and the browsers are closed
+        while True:
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                break
+        for worker in workers:
+            tasks.put(stop)
+        for worker in workers:
+            worker.join()